@@ -26,9 +26,12 @@ def _reload():
     from pyseas import maps, cm, styles, util, props
     from pyseas.contrib import plot_tracks
     from pyseas.maps import (
+        animate,
+        basemap,
         scalebar,
         core,
         extent,
+        features,
         rasters,
         ticks,
         projection,
@@ -36,6 +39,7 @@ def _reload():
         rasterize,
         colorbar,
         bivariate,
+        renderer,
     )
     from pyseas import contrib
     from importlib import reload
@@ -43,6 +47,7 @@ def _reload():
     reload(pyseas)
     reload(util)
     reload(projection)
+    reload(features)
     reload(ticks)
     reload(scalebar)
     reload(props)
@@ -53,6 +58,9 @@ def _reload():
     reload(colorbar)
     reload(bivariate)
     reload(core)
+    reload(basemap)
+    reload(renderer)
+    reload(animate)
     reload(maps)
     reload(extent)
 
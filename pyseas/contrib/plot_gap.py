@@ -4,7 +4,12 @@ Author: Jenn Van Osdel
 Date: 2020-11-06
 '''
 
+import logging
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
@@ -23,6 +28,66 @@ custom_artist_cycler = cycler(edgecolor=colors, \
                               facecolor=[(0, 0, 0, 0)]*len(colors))
 
 
+def _hourly_timestamps(hourly_data):
+    # Combine the date and hour columns into naive datetimes
+    dates = pd.to_datetime(hourly_data.date)
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    return dates.dt.normalize() + pd.to_timedelta(hourly_data.hour, unit='h')
+
+
+def _hourly_window(gap):
+    # Whole hours from 2 days before the gap starts to 2 days after it ends
+    query_start = gap.gap_start - pd.to_timedelta(2, unit='d')
+    query_end = gap.gap_end + pd.to_timedelta(2, unit='d')
+    return tuple((ts.tz_localize(None) if ts.tzinfo is not None else ts).floor('h')
+                 for ts in (query_start, query_end))
+
+
+class HourlyIndex:
+    '''
+    Hourly positions indexed for fast extraction of the rows around each gap.
+
+    The rows are sorted by ssvid, gap_id and time once, with the date and hour
+    combined into a single datetime, so each gap's rows are found with a dictionary
+    lookup and a binary search rather than by scanning the whole table. Build one and
+    pass it as `hourly_data` to `get_hourly_positions`, `plot_gap` or `plot_gaps`
+    when plotting many gaps.
+
+    Parameters
+    ----------
+    hourly_data: dataframe with raw hourly positions
+    '''
+
+    def __init__(self, hourly_data):
+        timestamps = _hourly_timestamps(hourly_data)
+        self.data = (hourly_data.assign(_timestamp=timestamps.values)
+                     .sort_values(['ssvid', 'gap_id', '_timestamp'], kind='stable')
+                     .reset_index(drop=True))
+        self._timestamps = self.data.pop('_timestamp').values
+        if len(self.data) == 0:
+            self._bounds = {}
+            return
+        ssvids = self.data.ssvid.values
+        gap_ids = self.data.gap_id.values
+        changed = (ssvids[1:] != ssvids[:-1]) | (gap_ids[1:] != gap_ids[:-1])
+        starts = np.flatnonzero(np.r_[True, changed])
+        stops = np.r_[starts[1:], len(self.data)]
+        keys = zip(ssvids[starts], gap_ids[starts])
+        self._bounds = dict(zip(keys, zip(starts, stops)))
+
+    def window(self, ssvid, gap_id, start, end):
+        '''
+        Returns the rows for `ssvid` and `gap_id` with times from `start` to `end`
+        inclusive, sorted by time. `start` and `end` are naive datetimes.
+        '''
+        i0, i1 = self._bounds.get((ssvid, gap_id), (0, 0))
+        timestamps = self._timestamps[i0:i1]
+        lo = i0 + np.searchsorted(timestamps, np.datetime64(start), side='left')
+        hi = i0 + np.searchsorted(timestamps, np.datetime64(end), side='right')
+        return self.data.iloc[lo:hi].reset_index(drop=True)
+
+
 ### Transforms hourly data into 
 def get_hourly_positions(gap_id, gaps_data, hourly_data):
     '''
@@ -32,7 +97,8 @@ def get_hourly_positions(gap_id, gaps_data, hourly_data):
     ----------
     gap_id: gap_id being plotted
     gaps_data: dataframe with gap information
-    hourly_data: dataframe with raw hourly positions
+    hourly_data: dataframe with raw hourly positions, or a `HourlyIndex` of them, which
+        is much faster when extracting the positions for many gaps
     
     Note
     ----
@@ -46,19 +112,16 @@ def get_hourly_positions(gap_id, gaps_data, hourly_data):
     '''
     
     gap = gaps_data[gaps_data.gap_id == gap_id].iloc[0]
-    query_start = gap.gap_start - pd.to_timedelta(2, unit='d')
-    query_end = gap.gap_end + pd.to_timedelta(2, unit='d')
-
-    df = hourly_data[(hourly_data.ssvid == gap.ssvid) \
-                   & (hourly_data.gap_id == gap_id)
-                   & (hourly_data.date.dt.date >= query_start.date()) \
-                   & (hourly_data.date.dt.date <= query_end.date())].copy()
-    df.drop(df[(df.date.dt.date == query_start.date()) & (df.hour < query_start.hour)].index, inplace=True)
-    df.drop(df[(df.date.dt.date == query_end.date()) & (df.hour > query_end.hour)].index, inplace=True)
-    df.reset_index(drop=True, inplace=True)
-    df.sort_values(['date', 'hour'], inplace=True)
+    query_start, query_end = _hourly_window(gap)
+    if isinstance(hourly_data, HourlyIndex):
+        return hourly_data.window(gap.ssvid, gap_id, query_start, query_end)
+
+    df = hourly_data[(hourly_data.ssvid == gap.ssvid) & (hourly_data.gap_id == gap_id)]
+    timestamps = _hourly_timestamps(df).values
+    in_window = (timestamps >= np.datetime64(query_start)) & (timestamps <= np.datetime64(query_end))
+    df = df[in_window].iloc[np.argsort(timestamps[in_window], kind='stable')]
     
-    return df
+    return df.reset_index(drop=True)
 
 
 '''
@@ -166,7 +229,7 @@ def plot_table_ee(all_gaps):
 ##############################
 '''
 
-def plot_gap(gap_id, gaps_data, positions_gfw, hourly_data, positions_ee=None, performance_data=None, show_all_gaps=False, table_type="basic", out_filepath=None):
+def plot_gap(gap_id, gaps_data, positions_gfw, hourly_data, positions_ee=None, performance_data=None, show_all_gaps=False, table_type="basic", out_filepath=None, show=True):
     '''
     Creates table for use with Exact Earth gaps including attributes 
     relevant for the gap classification modeling
@@ -178,7 +241,8 @@ def plot_gap(gap_id, gaps_data, positions_gfw, hourly_data, positions_ee=None, p
         (if using table_type == 'none' or 'basic') or `proj_ais_gaps_catena.raw_gaps_with_ee_stats_v` 
         (if using table_type == 'ee')
     positions_gfw: AIS positions from `gfw_research.pipe_v` or `gfw_research.pipe_vYYYYMMDD_fishing`
-    hourly_data: hourly positions data from `gfw_research_precursors.ais_positions_byssvid_hourly_v`
+    hourly_data: hourly positions data from `gfw_research_precursors.ais_positions_byssvid_hourly_v`, 
+        or a `HourlyIndex` of it
     positions_ee: Exact Earth positions from `world-fishing-827.ais_exact_earth.XXXX_csv_data_formated_and_partitioned` 
         (where XXXX is 2017, 2018, or 2019) (optional - if excluded, cannot use table_type == 'ee')
     performance_data: performance metrics calculated from by the query available in doc/Examples.py
@@ -186,53 +250,88 @@ def plot_gap(gap_id, gaps_data, positions_gfw, hourly_data, positions_ee=None, p
     show_all_gaps: True if all gaps in the visualized time period should be marked or False if only the gap 
         represented by gap_id should be marked (note: will only include gaps represented in gaps_data)
     table_type: "none", "basic", or "ee" (see doc/Examples.py)
-    out_dir: location to save image to (if None, no image will be exported)
+    out_filepath: location to save image to (if None, no image will be exported)
+    show: True if the figure should be shown with `plt.show()`
     
     Returns
     -------
     Figure, (GridSpec axes)
     '''
-    
-    if table_type not in ["none", "basic", "ee"]:
-        raise("%s is not a valid model type. Choose from 'none', basic', or 'ee'.")
-        
-    # Set boolean based on if positions_ee is non-empty.
-    has_ee = False
-    if positions_ee is not None and positions_ee.shape[0] > 0:
-        has_ee = True
-    
+    _check_table_type(table_type)
+
     # Filter to positions for this gap_id
     # If there are no positions, print an error message
     # This is most likely because the vessel is not in the version of
     # `pipe_vYYYYMMDD_fishing` that is being used.
     df_positions_gfw = positions_gfw[positions_gfw.gap_id == gap_id]
-    if df_positions_gfw.empty:
-        raise("An image cannot be produced for gap %s because there are no Spire/Orbcomm positions for this dataset. This is usually do to vessels being left out of the `pipe_vYYYYMMDD_fishing` database." % gap_id)
+    _check_positions(gap_id, df_positions_gfw)
     
-    # Get information for this gap and print out ssvid and gap_id
-    gap_info = gaps_data[gaps_data.gap_id == gap_id].iloc[0]
-    print(gap_info.ssvid)
-    print(gap_id)
+    # Get information for this gap and log its ssvid and gap_id
+    df_gap = gaps_data[gaps_data.gap_id == gap_id]
+    gap_info = df_gap.iloc[0]
+    logging.debug(f"Plotting gap {gap_id} for ssvid {gap_info.ssvid}")
     
-    # If show_all_gaps=True, then get information for ALL gaps from df_gaps between query_start and query_end because there may be more than the one of interest.
-    # ELSE, set df_all_gaps to single gap
-    # TODO: extend to include gaps that are partially within the query timeframe. Right now they are ignored
     if show_all_gaps:
-        df_all_gaps = gaps_data[(gaps_data.ssvid == gap_info.ssvid) \
-                              & (gaps_data.gap_start >= df_positions_gfw.timestamp.min()) \
-                              & (gaps_data.gap_end <= df_positions_gfw.timestamp.max())].sort_values('gap_start').reset_index(drop=True)
+        df_all_gaps = _gaps_within(gaps_data[gaps_data.ssvid == gap_info.ssvid], df_positions_gfw)
     else:
-        df_all_gaps = gaps_data[gaps_data.gap_id == gap_id]
+        df_all_gaps = df_gap
+
+    df_positions_ee = None
+    if positions_ee is not None and positions_ee.shape[0] > 0:
+        df_positions_ee = positions_ee[(positions_ee.gap_id == gap_id)]
+
+    vessel_perf = None
+    if performance_data is not None:
+        vessel_perf = performance_data[performance_data.ssvid == gap_info.ssvid].iloc[0]
+
+    df_gap_hourly = get_hourly_positions(gap_id, gaps_data, hourly_data)
+
+    fig, axes = _draw_gap(gap_id, gap_info, df_all_gaps, df_positions_gfw, df_positions_ee,
+                          df_gap_hourly, vessel_perf, table_type)
+    if out_filepath:
+        plt.savefig(out_filepath, bbox_inches='tight', dpi=150)
+    if show:
+        plt.show()
+    return fig, axes
+
+
+def _check_table_type(table_type):
+    if table_type not in ["none", "basic", "ee"]:
+        raise ValueError("%s is not a valid table type. Choose from 'none', basic', or 'ee'." % table_type)
+
+
+def _check_positions(gap_id, df_positions_gfw):
+    if df_positions_gfw.empty:
+        raise ValueError("An image cannot be produced for gap %s because there are no Spire/Orbcomm positions for this dataset. This is usually do to vessels being left out of the `pipe_vYYYYMMDD_fishing` database." % gap_id)
+
+
+def _gaps_within(vessel_gaps, df_positions_gfw):
+    # Get information for ALL gaps of the vessel between the first and last position because
+    # there may be more than the one of interest.
+    # TODO: extend to include gaps that are partially within the query timeframe. Right now they are ignored
+    return vessel_gaps[(vessel_gaps.gap_start >= df_positions_gfw.timestamp.min()) \
+                     & (vessel_gaps.gap_end <= df_positions_gfw.timestamp.max())].sort_values('gap_start').reset_index(drop=True)
+
+
+def _draw_gap(gap_id, gap_info, df_all_gaps, df_positions_gfw, df_positions_ee, df_gap_hourly, vessel_perf, table_type):
+    '''
+    Draws the gap visualization from the data already selected for `gap_id`
+    
+    Returns
+    -------
+    Figure, (GridSpec axes)
+    '''
+    # Set boolean based on if positions_ee is non-empty.
+    has_ee = df_positions_ee is not None
 
     # If this gap has EE data, merge and sort the GFW and EE positions by timestamp.
+    columns = ['ssvid', 'timestamp', 'lat', 'lon', 'receiver_type']
     if (has_ee):
-        df_positions_ee = positions_ee[(positions_ee.gap_id == gap_id)]
         df_positions_ee = df_positions_ee.assign(receiver_type = 'exactearth')
-        df_positions_all = df_positions_gfw[['ssvid', 'timestamp', 'lat', 'lon', 'receiver_type']].append(df_positions_ee[['ssvid', 'timestamp', 'lat', 'lon', 'receiver_type']], ignore_index=True)
-        df_positions_all = df_positions_all.sort_values('timestamp').reset_index(drop=True)
+        df_positions_all = pd.concat([df_positions_gfw[columns], df_positions_ee[columns]], ignore_index=True)
     else:
-        df_positions_all = df_positions_gfw[['ssvid', 'timestamp', 'lat', 'lon', 'receiver_type']]
-        df_positions_all = df_positions_all.sort_values('timestamp').reset_index(drop=True)
+        df_positions_all = df_positions_gfw[columns]
+    df_positions_all = df_positions_all.sort_values('timestamp').reset_index(drop=True)
 
         
     with pyseas.context(pyseas.styles.light):
@@ -283,7 +382,7 @@ def plot_gap(gap_id, gaps_data, positions_gfw, hourly_data, positions_ee=None, p
             ### Add the inset where it's working currently
             try:
                 inset = maps.add_miniglobe(loc='lower left', offset="outside", central_marker='*', marker_size=9, marker_color='#0c276c')
-            except:
+            except Exception:
                 inset = None
     
             ### Plot the starting point.
@@ -319,10 +418,9 @@ def plot_gap(gap_id, gaps_data, positions_gfw, hourly_data, positions_ee=None, p
             plt.title(plot_title, size=20)
 
 
-            ### Get hourly positions for GFW and create a timestamp column that combines date and hour.
-            df_gap_hourly = get_hourly_positions(gap_id, gaps_data, hourly_data)
+            ### Create a timestamp column for the hourly positions that combines date and hour.
             df_gap_hourly = df_gap_hourly.assign(timestamp = pd.to_datetime(df_gap_hourly.date, format='%Y%m%d %H%M%S') + pd.to_timedelta(df_gap_hourly.hour, unit='h'))
-            df_gap_hourly.timestamp = df_gap_hourly.timestamp.apply(lambda ts: ts.tz_localize(tz='UTC'))
+            df_gap_hourly.timestamp = df_gap_hourly.timestamp.dt.tz_localize('UTC')
 
             ### Graph hourly positions by type
             ax1 = fig.add_subplot(gs[1])
@@ -373,17 +471,128 @@ def plot_gap(gap_id, gaps_data, positions_gfw, hourly_data, positions_ee=None, p
                 y_offsets = [0.95, 0.75, 0.55, 0.35, 0.15, -0.05] if table_type == 'none' else [1.2, 1.0, 0.8, 0.6, 0.4, 0.2]
                 plt.text(x_offset, y_offsets[0], 'Vessel: %s' % gap_info.vessel_class, transform=plt.gca().transAxes, fontsize='14')
                 plt.text(x_offset, y_offsets[1], 'Flag: %s' % gap_info.flag, transform=plt.gca().transAxes, fontsize='14')
-                if performance_data is not None:
-                    vessel_perf = performance_data[performance_data.ssvid == gap_info.ssvid].iloc[0] 
+                if vessel_perf is not None:
                     plt.text(x_offset, y_offsets[2], 'Actual Class: %s' % vessel_perf.actual_class, transform=plt.gca().transAxes, fontsize='14')
                     plt.text(x_offset, y_offsets[3], 'Avg Sat. PPD: %0.2f' % vessel_perf.avg_sat_positions_per_day, transform=plt.gca().transAxes, fontsize='14')
                     plt.text(x_offset, y_offsets[4], 'Avg Expected PPD: %0.2f' % vessel_perf.avg_expected_positions_per_day, transform=plt.gca().transAxes, fontsize='14')
                     plt.text(x_offset, y_offsets[5], 'Ratio actual/exp.: %0.2f' % vessel_perf.ratio_actual_to_expected, transform=plt.gca().transAxes, fontsize='14')
 
-            if out_filepath:
-                plt.savefig(out_filepath, bbox_inches='tight', dpi=150)
-                
-            plt.show()
-            
             return fig, (gs[0], gs[1], gs[2])
 
+
+
+'''
+#########################
+### BATCH GAP REPORTS ###
+#########################
+'''
+
+def _rows(df, groups, key):
+    # Rows of `df` in the group `key` of a `groupby(...).indices` dict
+    index = groups.get(key)
+    return df.iloc[:0] if index is None else df.iloc[index]
+
+
+def _gap_tasks(gap_ids, gaps_data, positions_gfw, hourly_data, positions_ee, performance_data, 
+               show_all_gaps, table_type, out_dir, fmt):
+    '''
+    Yields the data needed to draw each gap, indexing each input once rather than filtering 
+    the full tables for every gap
+    '''
+    gaps_by_id = gaps_data.groupby('gap_id').indices
+    gaps_by_ssvid = gaps_data.groupby('ssvid').indices if show_all_gaps else None
+    gfw_by_id = positions_gfw.groupby('gap_id').indices
+    if not isinstance(hourly_data, HourlyIndex):
+        hourly_data = HourlyIndex(hourly_data)
+    has_ee = positions_ee is not None and positions_ee.shape[0] > 0
+    ee_by_id = positions_ee.groupby('gap_id').indices if has_ee else None
+    perf_by_ssvid = performance_data.groupby('ssvid').indices if performance_data is not None else None
+
+    for gap_id in gap_ids:
+        df_gap = _rows(gaps_data, gaps_by_id, gap_id)
+        df_positions_gfw = _rows(positions_gfw, gfw_by_id, gap_id)
+        if df_gap.empty or df_positions_gfw.empty:
+            logging.warning(f"Skipping gap {gap_id}, which has no gap information or positions")
+            continue
+        gap_info = df_gap.iloc[0]
+        if show_all_gaps:
+            df_all_gaps = _gaps_within(_rows(gaps_data, gaps_by_ssvid, gap_info.ssvid), df_positions_gfw)
+        else:
+            df_all_gaps = df_gap
+        df_positions_ee = _rows(positions_ee, ee_by_id, gap_id) if has_ee else None
+        vessel_perf = None
+        if perf_by_ssvid is not None:
+            df_perf = _rows(performance_data, perf_by_ssvid, gap_info.ssvid)
+            if df_perf.empty:
+                logging.warning(f"No performance data for vessel {gap_info.ssvid}, plotting gap {gap_id} without it")
+            else:
+                vessel_perf = df_perf.iloc[0]
+        df_gap_hourly = get_hourly_positions(gap_id, df_gap, hourly_data)
+        out_filepath = os.path.join(out_dir, f'{gap_id}.{fmt}')
+        yield (gap_id, gap_info, df_all_gaps, df_positions_gfw, df_positions_ee, 
+               df_gap_hourly, vessel_perf, table_type, out_filepath)
+
+
+def _init_worker():
+    # Workers only save figures, so never use an interactive backend
+    plt.switch_backend('agg')
+
+
+def _save_gap(task):
+    gap_id, *args, out_filepath = task
+    fig, _ = _draw_gap(gap_id, *args)
+    try:
+        fig.savefig(out_filepath, bbox_inches='tight', dpi=150)
+    finally:
+        plt.close(fig)
+    return gap_id, out_filepath
+
+
+def plot_gaps(gap_ids, gaps_data, positions_gfw, hourly_data, out_dir, positions_ee=None, performance_data=None, 
+              show_all_gaps=False, table_type="basic", fmt="png", max_workers=None):
+    '''
+    Saves the visualization of many gaps, one file per gap
+
+    Each input table is indexed by gap_id or ssvid once, so the time to find the data for 
+    a gap doesn't grow with the size of the tables as it does when calling `plot_gap` 
+    for every gap. Figures are drawn in several processes and closed once saved, and only 
+    a few gaps are prepared ahead of the ones being drawn, so memory use stays bounded.
+    
+    Parameters
+    ----------
+    gap_ids: iterable of gap_ids to plot
+    gaps_data, positions_gfw, hourly_data, positions_ee, performance_data, show_all_gaps, table_type:
+        see `plot_gap`
+    out_dir: directory to save images to, as `{out_dir}/{gap_id}.{fmt}`
+    fmt: image format, such as 'png' or 'pdf'
+    max_workers: number of processes used to draw figures
+    
+    Returns
+    -------
+    Dictionary mapping each gap_id plotted to the path of its image. Gaps without
+    positions, or that fail to plot, are skipped and logged. Gaps of vessels without 
+    performance data are plotted without the performance metrics.
+    '''
+    _check_table_type(table_type)
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = _gap_tasks(gap_ids, gaps_data, positions_gfw, hourly_data, positions_ee, performance_data, 
+                       show_all_gaps, table_type, out_dir, fmt)
+    max_workers = max_workers or os.cpu_count() or 1
+    paths = {}
+
+    def collect(gap_id, future):
+        # A gap that fails to draw is logged rather than aborting the whole batch
+        try:
+            paths[gap_id] = future.result()[1]
+        except Exception:
+            logging.exception(f"Skipping gap {gap_id}, which could not be plotted")
+
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append((task[0], executor.submit(_save_gap, task)))
+            if len(pending) >= 2 * max_workers:
+                collect(*pending.popleft())
+        while pending:
+            collect(*pending.popleft())
+    return paths
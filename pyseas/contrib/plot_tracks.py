@@ -25,6 +25,11 @@ from ..maps.core import _build_mask
 # Matplotlib uses days rather than seconds for its timestamps
 S_PER_DAY = 24 * 60 * 60
 
+def _params(style):
+    # Style parameters to read: a MapStyle if given, otherwise the global rcParams
+    return plt.rcParams if (style is None) else style
+
+
 def _find_y_range(y, min_y, max_y):
     if min_y is None and max_y is None:
         miny0, maxy0 = np.percentile(y, [0.1, 99]) 
@@ -40,7 +45,8 @@ def _find_y_range(y, min_y, max_y):
 
 
 def _add_subpanel(gs, timestamp, values, kind, label, prop_map, break_on_change, 
-                    min_y=None, max_y=None, show_xticks=True, offset=None, label_angle=45):
+                    min_y=None, max_y=None, show_xticks=True, offset=None, label_angle=45,
+                    style=None):
     ax = plt.subplot(gs)
 
     x = mdates.date2num(timestamp)
@@ -79,11 +85,12 @@ def _add_subpanel(gs, timestamp, values, kind, label, prop_map, break_on_change,
             alignment = 'right'
         ax.set_xticklabels(lbls, rotation=label_angle, ha=alignment)
 
-    ax.set_facecolor(plt.rcParams.get('pyseas.ocean.color', props.dark.ocean.color))
+    ax.set_facecolor(_params(style).get('pyseas.ocean.color', props.dark.ocean.color))
     return ax
 
 
-def _add_annotations(map_axes, time_axes, timestamp, lon, lat, n_annotations, y_loc, y_align):
+def _add_annotations(map_axes, time_axes, timestamp, lon, lat, n_annotations, y_loc, y_align,
+                     style=None):
     assert n_annotations > 1
     time_range = (timestamp[-1] - timestamp[0])
     dts = [(x - timestamp[0]) / time_range for x in timestamp]
@@ -91,8 +98,9 @@ def _add_annotations(map_axes, time_axes, timestamp, lon, lat, n_annotations, y_
     time_as_num = mdates.date2num(timestamp[indices[0]])
     display_coords = time_axes.transAxes.transform([time_as_num, y_loc])
     _, y_coord = time_axes.transData.inverted().transform(display_coords)
-    mapprops = plt.rcParams.get('pyseas.map.annotationmapprops', styles._annotationmapprops)
-    plotprops = plt.rcParams.get('pyseas.map.annotationplotprops', styles._annotationmapprops)
+    params = _params(style)
+    mapprops = params.get('pyseas.map.annotationmapprops', styles._annotationmapprops)
+    plotprops = params.get('pyseas.map.annotationplotprops', styles._annotationmapprops)
     for i, ndx in enumerate(indices):
         map_axes.text(lon[ndx], lat[ndx], str(i + 1), transform=maps.identity, **mapprops)
         time_axes.text(timestamp[ndx], y_coord, str(i + 1), horizontalalignment='center',
@@ -137,7 +145,7 @@ def plot_panel(timestamp, lon, lat, kind, plots,
                 annotations=0, annotation_y_loc=1.0, annotation_y_align='bottom',
                 annotation_axes_ndx=0, add_night_shades=False, projection_info=None,
                 shift_by_cent_lon={'longitude'},
-                label_angle=30, gs=None):
+                label_angle=30, gs=None, style=None):
     """Plot a panel with a map and associated time-value plots
 
     Parameters
@@ -179,6 +187,9 @@ def plot_panel(timestamp, lon, lat, kind, plots,
     label_angle : float, optional
         Angle to use for date values. Helps avoid dates crashing into each other.
     gs : GridSpec, optional
+    style : MapStyle, optional
+        Style used for the panel instead of the global `plt.rcParams`. See
+        `maps.create_map`.
 
     Note
     ----
@@ -199,12 +210,12 @@ def plot_panel(timestamp, lon, lat, kind, plots,
         projection_info = find_projection(lon, lat)
 
     if prop_map is None or isinstance(prop_map, Cycler):
-        prop_map = styles.create_props(np.unique(kind), prop_map)
+        prop_map = styles.create_props(np.unique(kind), prop_map, style=style)
 
     gs = _get_gs(gs, len(plots), map_ratio)
 
     ax1 = maps.create_map(gs[0], projection=projection_info.projection, 
-                                 extent=projection_info.extent)
+                                 extent=projection_info.extent, style=style)
     ax1.set_anchor("S")
 
     maps.add_land(ax1)
@@ -221,15 +232,15 @@ def plot_panel(timestamp, lon, lat, kind, plots,
         ax = _add_subpanel(gs[i + 1], timestamp,  kind=kind, 
                                  prop_map=prop_map, break_on_change=break_on_change,
                                  show_xticks=show_xticks, offset = offset, 
-                                 label_angle=label_angle, **plot_descr)
+                                 label_angle=label_angle, style=style, **plot_descr)
         axes.append(ax)
 
   
     if annotations and axes:
         _add_annotations(ax1, axes[annotation_axes_ndx], timestamp, lon, lat, 
-                         annotations, annotation_y_loc, annotation_y_align)
+                         annotations, annotation_y_loc, annotation_y_align, style=style)
 
-    maps.add_figure_background(color=plt.rcParams['pyseas.ocean.color'])
+    maps.add_figure_background(color=_params(style)['pyseas.ocean.color'], style=style)
     plt.sca(ax1)
     return PlotPanelInfo(ax1, axes, projection_info, handles)
 
@@ -241,15 +252,15 @@ def track_state_panel(timestamp, lon, lat, state, plots=(), prop_map=None,
                       annotation_y_loc=1.0, annotation_y_align='bottom',
                       annotation_axes_ndx=0, add_night_shades=False,
                       projection_info=None, shift_by_cent_lon={'longitude'},
-                      label_angle=30, gs=None):
+                      label_angle=30, gs=None, style=None):
     if isinstance(prop_map, str):
-        prop_map = plt.rcParams.get(prop_map)
+        prop_map = _params(style).get(prop_map)
     return plot_panel(timestamp, lon, lat, state, plots, prop_map,
                       break_on_change=True, map_ratio=map_ratio, annotations=annotations, 
                       annotation_y_loc=annotation_y_loc, annotation_y_align=annotation_y_align,
                       annotation_axes_ndx=annotation_axes_ndx, add_night_shades=add_night_shades,
                       projection_info=projection_info, shift_by_cent_lon=shift_by_cent_lon,
-                      label_angle=label_angle, gs=gs)
+                      label_angle=label_angle, gs=gs, style=style)
 
 
 # Backward compatibility
@@ -258,15 +269,15 @@ def plot_fishing_panel(timestamp, lon, lat, is_fishing, plots=(), prop_map=None,
                       annotation_y_loc=1.0, annotation_y_align='bottom',
                       annotation_axes_ndx=0, add_night_shades=False,
                       projection_info=None, shift_by_cent_lon={'longitude'},
-                      label_angle=30, gs=None):    
+                      label_angle=30, gs=None, style=None):
     if prop_map is None:
-        prop_map = plt.rcParams.get('pyseas.map.fishingprops', styles._fishing_props)
+        prop_map = _params(style).get('pyseas.map.fishingprops', styles._fishing_props)
     return plot_panel(timestamp, lon, lat, is_fishing, plots, prop_map,
                       break_on_change=True, map_ratio=map_ratio, annotations=annotations, 
                       annotation_y_loc=annotation_y_loc, annotation_y_align=annotation_y_align,
                       annotation_axes_ndx=annotation_axes_ndx, add_night_shades=add_night_shades,
                       projection_info=projection_info, shift_by_cent_lon=shift_by_cent_lon,
-                      label_angle=label_angle, gs=gs)
+                      label_angle=label_angle, gs=gs, style=style)
 
 
 def multi_track_panel(timestamp, lon, lat, track_id=None, plots=(), prop_map=None,
@@ -274,12 +285,12 @@ def multi_track_panel(timestamp, lon, lat, track_id=None, plots=(), prop_map=Non
                       annotation_y_loc=1.0, annotation_y_align='bottom',
                       annotation_axes_ndx=0, add_night_shades=False,
                       projection_info=None, shift_by_cent_lon={'longitude'},
-                      label_angle=30, gs=None): 
+                      label_angle=30, gs=None, style=None):
     if track_id is None:
         track_id = np.ones(len(lon))
     if prop_map is None:
         if isinstance(prop_map, str):
-            prop_map = plt.rcParams.get(prop_map)
+            prop_map = _params(style).get(prop_map)
             if isinstance(prop_map, Cycler):
                 prop_map = styles.get_props(prop_map, interstitial_color=None)
     return plot_panel(timestamp, lon, lat, track_id, plots, prop_map,
@@ -287,7 +298,7 @@ def multi_track_panel(timestamp, lon, lat, track_id=None, plots=(), prop_map=Non
                       annotation_y_loc=annotation_y_loc, annotation_y_align=annotation_y_align,
                       annotation_axes_ndx=annotation_axes_ndx, add_night_shades=add_night_shades,
                       projection_info=projection_info, shift_by_cent_lon=shift_by_cent_lon,
-                      label_angle=label_angle, gs=gs)
+                      label_angle=label_angle, gs=gs, style=style)
 
 # Backward compatibility
 def plot_tracks_panel(timestamp, lon, lat, track_id=None, plots=None, prop_map=None,
@@ -295,11 +306,11 @@ def plot_tracks_panel(timestamp, lon, lat, track_id=None, plots=None, prop_map=N
                       annotation_y_loc=1.0, annotation_y_align='bottom',
                       annotation_axes_ndx=0, add_night_shades=False,
                       projection_info=None, shift_by_cent_lon={'longitude'}, 
-                      label_angle=30, gs=None): 
+                      label_angle=30, gs=None, style=None):
     if track_id is None:
         track_id = np.ones(len(lon))
     if prop_map is None:
-        prop_cycle = plt.rcParams.get('pyseas.map.trackprops', styles._dark_artist_cycler)()
+        prop_cycle = _params(style).get('pyseas.map.trackprops', styles._dark_artist_cycler)()
         prop_map = {(k, k) : next(prop_cycle) for k in set(track_id)}
     if plots is None:
         plots = [{'label' : 'longitude', 'values' : lon},
@@ -309,4 +320,4 @@ def plot_tracks_panel(timestamp, lon, lat, track_id=None, plots=None, prop_map=N
                       annotation_y_loc=annotation_y_loc, annotation_y_align=annotation_y_align,
                       annotation_axes_ndx=annotation_axes_ndx, add_night_shades=add_night_shades,
                       projection_info=projection_info, shift_by_cent_lon=shift_by_cent_lon,
-                      label_angle=label_angle, gs=gs)
\ No newline at end of file
+                      label_angle=label_angle, gs=gs, style=style)
\ No newline at end of file
@@ -25,6 +25,8 @@ pyseas._reload()
 
 # +
 # Set the global style for the notebook to the GFW chart style
+# Charts don't go through `create_map`, so load the bundled fonts first
+psm.styles.register_fonts()
 psm.use(psm.styles.chart_style)
 
 # Plot a figure
@@ -0,0 +1,330 @@
+"""Export rasters and H3 data as a Web Mercator XYZ tile pyramid
+
+Tiles are rendered with the same resampling used for maps (see
+`maps.rasterize.raster_to_raster` and `maps.rasterize.h3_to_raster`) and
+colored directly with a colormap, without going through matplotlib figures.
+They are written to `{directory}/{z}/{x}/{y}.{fmt}`, so the output can be
+served as is to web maps.
+
+Tiles that contain no data are not written and, since their descendants
+cannot contain data either, are not visited at finer zooms. Re-running an
+export with `bounds` set only renders the tiles within those bounds, so a
+pyramid can be updated in place where the data has changed.
+"""
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from matplotlib import colormaps
+from matplotlib.colors import Normalize
+from PIL import Image
+
+from .. import cm
+from ..maps import rasterize
+from ..maps.rasters import KM_PER_DEG_LAT
+from .tiles import (
+    MAX_LAT,
+    lat_to_y,
+    split_extent,
+    tile_edges,
+    tile_range,
+    y_to_lat_edges,
+)
+
+FORMATS = {"png": "PNG", "webp": "WEBP"}
+
+# Source data for the tiles rendered in this process. Set by `_init_worker`
+# so that the data is only sent to each worker process once.
+_source = None
+
+
+def _resolve_cmap(cmap):
+    if isinstance(cmap, str):
+        return getattr(cm.dark, cmap, None) or colormaps[cmap]
+    return cmap
+
+
+def _masked(values, fill):
+    values = np.asarray(values, dtype=float)
+    return np.ma.masked_where(~np.isfinite(values) | (values == fill), values)
+
+
+def _data_bounds(source, extent, origin, fill):
+    """Lon/lat bounds of every cell of `source` that contains data"""
+    if isinstance(source, dict):
+        import h3.api.memview_int as h3
+
+        cells = [k for (k, v) in source.items() if np.any(v != fill)]
+        if not cells:
+            return [np.zeros(0)] * 4
+        lats, lons = np.array([h3.cell_to_latlng(c) for c in cells]).T
+        # A hexagon's circumradius equals its edge length
+        radii = np.array(
+            [
+                h3.average_hexagon_edge_length(h3.get_resolution(c), unit="km")
+                for c in cells
+            ]
+        )
+        dlat = radii / KM_PER_DEG_LAT
+        dlon = dlat / np.maximum(np.cos(np.radians(lats)), 0.01)
+    else:
+        raster = np.asarray(source)
+        has_data = np.isfinite(raster) & (raster != fill)
+        if raster.ndim == 3:
+            has_data = has_data.any(axis=-1)
+        lon0, lon1, lat0, lat1 = extent
+        n_rows, n_cols = has_data.shape
+        rows, cols = np.nonzero(has_data)
+        dlat = abs(lat1 - lat0) / n_rows / 2
+        dlon = abs(lon1 - lon0) / n_cols / 2
+        if origin == "upper":
+            lats = max(lat0, lat1) - (rows + 0.5) * 2 * dlat
+        else:
+            lats = min(lat0, lat1) + (rows + 0.5) * 2 * dlat
+        lons = min(lon0, lon1) + (cols + 0.5) * 2 * dlon
+    return (
+        np.clip(lons - dlon, -180, 180),
+        np.clip(lons + dlon, -180, 180),
+        np.clip(lats - dlat, -MAX_LAT, MAX_LAT),
+        np.clip(lats + dlat, -MAX_LAT, MAX_LAT),
+    )
+
+
+def occupied_tiles(lon0, lon1, lat0, lat1, zoom):
+    """Find the tiles that intersect any of a set of lon/lat boxes
+
+    Parameters
+    ----------
+    lon0, lon1, lat0, lat1 : arrays of float
+        Bounds of each box.
+    zoom : int
+
+    Returns
+    -------
+    array of int
+        Has shape (n, 2) with one (x, y) row per tile.
+    """
+    tile_count = 2**zoom
+    x0 = np.floor((lon0 + 180) / 360 * tile_count)
+    x1 = np.ceil((lon1 + 180) / 360 * tile_count) - 1
+    y0 = np.floor(lat_to_y(lat1, zoom))
+    y1 = np.ceil(lat_to_y(lat0, zoom)) - 1
+    x0, y0 = np.clip(x0, 0, tile_count - 1), np.clip(y0, 0, tile_count - 1)
+    x1, y1 = np.clip(x1, x0, tile_count - 1), np.clip(y1, y0, tile_count - 1)
+    x0, x1, y0, y1 = (v.astype(int) for v in (x0, x1, y0, y1))
+    # Loop over offsets within each box rather than over the boxes, since
+    # boxes rarely span more than a couple of tiles.
+    found = [np.zeros([0, 2], dtype=int)]
+    for dx in range(int((x1 - x0).max(initial=0)) + 1):
+        for dy in range(int((y1 - y0).max(initial=0)) + 1):
+            mask = (x0 + dx <= x1) & (y0 + dy <= y1)
+            found.append(np.stack([x0[mask] + dx, y0[mask] + dy], axis=1))
+    return np.unique(np.concatenate(found), axis=0)
+
+
+def _tile_transform(x, y, zoom, tile_size):
+    lon0, _, lon1, _ = tile_edges(x, y, zoom)
+
+    def transform(rows, cols):
+        rows = np.asarray(rows, dtype=float)
+        cols = np.asarray(cols, dtype=float)
+        lons = lon0 + (cols + 0.5) / tile_size * (lon1 - lon0)
+        lats, _ = y_to_lat_edges(y + (rows + 0.5) / tile_size, zoom)
+        return lons, lats
+
+    return transform
+
+
+def _atomic_save(img, path, fmt):
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            img.save(f, format=fmt)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _init_worker(source):
+    global _source
+    _source = source
+
+
+def render_tile(
+    x,
+    y,
+    zoom,
+    source,
+    extent=(-180, 180, -90, 90),
+    origin="upper",
+    cmap=None,
+    norm=None,
+    fill=0.0,
+    tile_size=256,
+):
+    """Render a single tile to an RGBA array of uint8
+
+    See `export_pyramid` for a description of the parameters.
+    """
+    locs = np.arange(tile_size, dtype=float)
+    transform = _tile_transform(x, y, zoom, tile_size)
+    if isinstance(source, dict):
+        data = rasterize.h3_to_raster(source, locs, locs, transform, fill=fill)
+    else:
+        data = rasterize.raster_to_raster(source, extent, locs, locs, transform, origin)
+    if data.ndim == 3:
+        rgba = data
+        if rgba.shape[-1] == 3:
+            rgba = np.dstack([rgba, np.ones(rgba.shape[:2])])
+    else:
+        masked = _masked(data, fill)
+        rgba = _resolve_cmap(cmap)(norm(masked))
+        # Cells without data are transparent
+        rgba[np.ma.getmaskarray(masked)] = 0
+    return (np.clip(rgba, 0, 1) * 255).round().astype(np.uint8)
+
+
+def _render_and_save(task):
+    x, y, zoom, path, kwargs = task
+    rgba = render_tile(x, y, zoom, _source, **kwargs)
+    if not rgba[..., 3].any():
+        # The data may have been removed since the tile was last written
+        if path.exists():
+            path.unlink()
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _atomic_save(Image.fromarray(rgba), path, FORMATS[path.suffix[1:]])
+    return True
+
+
+def export_pyramid(
+    source,
+    directory,
+    zooms,
+    extent=(-180, 180, -90, 90),
+    origin="upper",
+    cmap="fishing",
+    norm=None,
+    vmin=None,
+    vmax=None,
+    fill=0.0,
+    fmt="png",
+    tile_size=256,
+    bounds=None,
+    skip_existing=False,
+    max_workers=None,
+):
+    """Write a Web Mercator XYZ tile pyramid
+
+    Parameters
+    ----------
+    source : 2D or 3D array, or dict mapping H3 ids to values
+        Either a lat/lon raster, as used by `maps.add_raster`, or H3 data as
+        used by `maps.add_h3_data`.
+    directory : str or Path
+        Tiles are written to `{directory}/{z}/{x}/{y}.{fmt}`.
+    zooms : int or iterable of int
+        Zoom levels to write. An int `n` is equivalent to `range(n + 1)`.
+    extent : tuple of float, optional
+        (lon0, lon1, lat0, lat1) of a raster `source`.
+    origin : 'upper' or 'lower', optional
+        Origin of a raster `source`.
+    cmap : str or Colormap, optional
+        Names are looked up in `pyseas.cm.dark`, then in matplotlib.
+    norm : Normalize, optional
+        Defaults to `Normalize(vmin, vmax)`. If `vmin` or `vmax` are not given,
+        they are taken from the data, so pass them when exporting in pieces.
+    vmin, vmax : float, optional
+    fill : float, optional
+        Value marking cells without data. Tiles containing only this value
+        are skipped.
+    fmt : 'png' or 'webp', optional
+    tile_size : int, optional
+    bounds : tuple of float, optional
+        (lon0, lon1, lat0, lat1), where lon1 < lon0 indicates bounds that
+        cross the dateline. If given, only tiles intersecting these
+        bounds are written and existing tiles within them that no longer
+        contain data are removed. Use this to update a pyramid after the
+        data changes in a region.
+    skip_existing : bool, optional
+        Don't re-render tiles that already exist. Use this to resume an
+        interrupted export, since tiles are written atomically.
+    max_workers : int, optional
+        Number of processes used to render tiles.
+
+    Returns
+    -------
+    int
+        Number of tiles written.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"fmt must be 'png' or 'webp', got {fmt!r}")
+    if isinstance(zooms, int):
+        zooms = range(zooms + 1)
+    directory = Path(directory)
+    if norm is None:
+        norm = Normalize(vmin, vmax)
+        values = list(source.values()) if isinstance(source, dict) else source
+        norm.autoscale_None(_masked(values, fill))
+    kwargs = dict(
+        extent=extent,
+        origin=origin,
+        cmap=_resolve_cmap(cmap),
+        norm=norm,
+        fill=fill,
+        tile_size=tile_size,
+    )
+
+    boxes = _data_bounds(source, extent, origin, fill)
+    max_workers = max_workers or os.cpu_count() or 1
+    n_written = 0
+    with ProcessPoolExecutor(
+        max_workers, initializer=_init_worker, initargs=(source,)
+    ) as executor:
+        for zoom in zooms:
+            occupied = occupied_tiles(*boxes, zoom)
+            if bounds is not None:
+                in_bounds = np.zeros(len(occupied), dtype=bool)
+                # Bounds that cross the dateline are handled as two boxes
+                for box in split_extent(bounds):
+                    box_range = x_min, x_max, y_min, y_max = tile_range(box, zoom)
+                    in_box = (
+                        (occupied[:, 0] >= x_min)
+                        & (occupied[:, 0] <= x_max)
+                        & (occupied[:, 1] >= y_min)
+                        & (occupied[:, 1] <= y_max)
+                    )
+                    _remove_stale(directory, zoom, fmt, box_range, occupied[in_box])
+                    in_bounds |= in_box
+                occupied = occupied[in_bounds]
+            tasks = []
+            for x, y in occupied.tolist():
+                path = directory / str(zoom) / str(x) / f"{y}.{fmt}"
+                if skip_existing and path.exists():
+                    continue
+                tasks.append((x, y, zoom, path, kwargs))
+            logging.info(f"Rendering {len(tasks)} tiles at zoom {zoom}")
+            chunksize = max(1, len(tasks) // (4 * max_workers))
+            n_written += sum(executor.map(_render_and_save, tasks, chunksize=chunksize))
+    return n_written
+
+
+def _remove_stale(directory, zoom, fmt, tile_range, occupied):
+    # Remove tiles within `tile_range` that no longer contain data
+    x_min, x_max, y_min, y_max = tile_range
+    keep = set(map(tuple, occupied.tolist()))
+    zoom_dir = directory / str(zoom)
+    if not zoom_dir.is_dir():
+        return
+    for x_dir in zoom_dir.iterdir():
+        if not (x_dir.name.isdigit() and x_min <= int(x_dir.name) <= x_max):
+            continue
+        x = int(x_dir.name)
+        for path in x_dir.glob(f"*.{fmt}"):
+            if path.stem.isdigit() and y_min <= int(path.stem) <= y_max:
+                if (x, int(path.stem)) not in keep:
+                    path.unlink()
@@ -1,96 +1,759 @@
-"""Download tiles from a tile server then merge using gdal
+"""Download tiles from a tile server and merge them into a single image
+
+Tiles are decoded and mosaicked in memory. GDAL is only needed to write
+the result to a GeoTIFF.
 
 Based on https://github.com/jimutt/tiles-to-tiff but extensively modified
 """
 import glob
+import hashlib
+import http.client
+import io
+import json
 import logging
 import os
 import tempfile
-import urllib.request
-from math import atan, ceil, cos, degrees, floor, log, pi, radians, sinh, tan
+import threading
+import time
+import urllib.error
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from ..util import LRUCache, cache_dir
 
-from numpy import clip
-from osgeo import gdal
-from osgeo.gdalconst import GA_ReadOnly
+
+# Latitude of the edges of Web Mercator tiles
+MAX_LAT = 85.0511287798066
 
 
 def latlonzoom_to_xy(lat, lon, z):
-    eps = 2 ** -20
-    lat = clip(lat, -90 + eps, 90 - eps)
-    lon = clip(lon, -180, 180)
-    tile_count = pow(2, z)
+    """Convert lat/lon to fractional tile coordinates
+
+    Accepts scalars or arrays. Results are clipped to the valid tile range.
+    """
+    eps = 2**-20
+    lat = np.clip(lat, -90 + eps, 90 - eps)
+    lon = np.clip(lon, -180, 180)
+    tile_count = 2**z
     x = (lon + 180) / 360
-    rads = radians(lat)
-    y = (1 - log(tan(rads) + 1 / cos(rads)) / pi) / 2
+    rads = np.radians(lat)
+    y = (1 - np.log(np.tan(rads) + 1 / np.cos(rads)) / np.pi) / 2
     return (
-        clip(tile_count * x, 0, tile_count - 1),
-        clip(tile_count * y, 0, tile_count - 1),
+        np.clip(tile_count * x, 0, tile_count - 1),
+        np.clip(tile_count * y, 0, tile_count - 1),
     )
 
 
 def bbox_and_zoom_to_xy(lon_min, lon_max, lat_min, lat_max, zoom):
     x_min, y_max = latlonzoom_to_xy(lat_min, lon_min, zoom)
     x_max, y_min = latlonzoom_to_xy(lat_max, lon_max, zoom)
-    return (floor(x_min), ceil(x_max), floor(y_min), ceil(y_max))
+    return (
+        np.floor(x_min).astype(int),
+        np.ceil(x_max).astype(int),
+        np.floor(y_min).astype(int),
+        np.ceil(y_max).astype(int),
+    )
 
 
 def x_to_lon_edges(x, z):
-    tile_count = pow(2, z)
+    tile_count = 2**z
     unit = 360 / tile_count
-    lon1 = -180 + x * unit
+    lon1 = -180 + np.asarray(x) * unit
     lon2 = lon1 + unit
     return (lon1, lon2)
 
 
 def mercator_y_to_lat(mercator_y):
-    return degrees(atan(sinh(mercator_y)))
+    return np.degrees(np.arctan(np.sinh(mercator_y)))
 
 
 def y_to_lat_edges(y, zoom):
-    tile_count = pow(2, zoom)
+    tile_count = 2**zoom
     unit = 1 / tile_count
-    relative_y1 = y * unit
+    relative_y1 = np.asarray(y) * unit
     relative_y2 = relative_y1 + unit
-    lat1 = mercator_y_to_lat(pi * (1 - 2 * relative_y1))
-    lat2 = mercator_y_to_lat(pi * (1 - 2 * relative_y2))
+    lat1 = mercator_y_to_lat(np.pi * (1 - 2 * relative_y1))
+    lat2 = mercator_y_to_lat(np.pi * (1 - 2 * relative_y2))
     return (lat1, lat2)
 
 
 def tile_edges(x, y, zoom):
+    """Return [lon1, lat1, lon2, lat2] of tiles, where lat1 is the top edge
+
+    `x` and `y` may be scalars or arrays.
+    """
     lat1, lat2 = y_to_lat_edges(y, zoom)
     lon1, lon2 = x_to_lon_edges(x, zoom)
     return [lon1, lat1, lon2, lat2]
 
 
+def _unwrapped_x(lon, zoom):
+    # Like latlonzoom_to_xy, but longitudes outside [-180, 180] map to tile
+    # columns outside [0, 2**zoom) so that geometries that cross the dateline
+    # stay contiguous.
+    return (np.asarray(lon) + 180) / 360 * 2**zoom
+
+
+def lat_to_y(lat, zoom):
+    """Convert latitudes to fractional tile rows
+
+    Unlike `latlonzoom_to_xy`, rows are not clipped to the last tile, so the
+    bottom edge of the map maps to 2**zoom. Accepts scalars or arrays.
+    """
+    rads = np.radians(np.clip(lat, -MAX_LAT, MAX_LAT))
+    return 2**zoom * (1 - np.log(np.tan(rads) + 1 / np.cos(rads)) / np.pi) / 2
+
+
+def _unwrap_extent(extent):
+    # Extents that cross the dateline have lon1 < lon0. Move lon1 past 180 so
+    # that the extent covers a contiguous range of unwrapped tile columns.
+    lon0, lon1, lat0, lat1 = extent
+    if lon1 < lon0:
+        lon1 += 360
+    return (lon0, lon1, lat0, lat1)
+
+
+def split_extent(extent):
+    """Split an extent that crosses the dateline in two
+
+    Parameters
+    ----------
+    extent : tuple of float
+        (lon0, lon1, lat0, lat1), where lon1 < lon0 indicates an extent that
+        crosses the dateline.
+
+    Returns
+    -------
+    list of tuple of float
+        Extents that do not cross the dateline.
+    """
+    lon0, lon1, lat0, lat1 = extent
+    if lon1 < lon0:
+        # Crosses the dateline
+        return [(lon0, 180, lat0, lat1), (-180, lon1, lat0, lat1)]
+    return [(lon0, lon1, lat0, lat1)]
+
+
+def tiles_covering(region, zoom):
+    """Find the minimal set of tiles covering a region
+
+    Parameters
+    ----------
+    region : tuple of float or shapely geometry
+        Either an extent (lon0, lon1, lat0, lat1), where lon1 < lon0 indicates
+        an extent that crosses the dateline, or a geometry in lon/lat. Geometry
+        longitudes may extend beyond +/-180 where they cross the dateline.
+    zoom : int
+
+    Returns
+    -------
+    array of int
+        Has shape (n, 2) with one (x, y) row per tile, sorted by x then y.
+    """
+    if isinstance(region, (tuple, list)):
+        xy = []
+        for box in split_extent(region):
+            x_min, x_max, y_min, y_max = tile_range(box, zoom)
+            xs, ys = np.meshgrid(
+                np.arange(x_min, x_max + 1),
+                np.arange(y_min, y_max + 1),
+                indexing="ij",
+            )
+            xy.append(np.stack([xs.ravel(), ys.ravel()], axis=1))
+        xy = np.concatenate(xy)
+    else:
+        import shapely
+
+        shapely.prepare(region)
+        lon_min, _, lon_max, _ = region.bounds
+        # Refine from zoom 0, only subdividing the tiles that intersect the
+        # region, so long thin regions such as tracks stay cheap.
+        xs = np.arange(
+            np.floor(_unwrapped_x(lon_min, 0)), np.floor(_unwrapped_x(lon_max, 0)) + 1
+        ).astype(int)
+        ys = np.zeros_like(xs)
+        for z in range(zoom + 1):
+            if z > 0:
+                xs = (2 * xs[:, None] + [0, 1, 0, 1]).ravel()
+                ys = (2 * ys[:, None] + [0, 0, 1, 1]).ravel()
+            lon1, lat1, lon2, lat2 = tile_edges(xs, ys, z)
+            boxes = shapely.box(lon1, lat2, lon2, lat1)
+            mask = shapely.intersects(boxes, region)
+            xs, ys = xs[mask], ys[mask]
+        xy = np.stack([xs % 2**zoom, ys], axis=1)
+    return np.unique(xy, axis=0)
+
+
+def _gdal():
+    # GDAL is only required for file output, so import it lazily
+    from osgeo import gdal
+
+    return gdal
+
+
 def georeference_raster_tile(x, y, zoom, path):
+    gdal = _gdal()
     bounds = tile_edges(x, y, zoom)
     filename, extension = os.path.splitext(path)
     gdal.Translate(filename + ".tiff", path, outputSRS="EPSG:4326", outputBounds=bounds)
 
 
 def merge_tiles(input_pattern, output_path):
+    gdal = _gdal()
     with tempfile.TemporaryDirectory() as temp_dir:
         vrt_path = temp_dir + "/tiles.vrt"
         gdal.BuildVRT(vrt_path, glob.glob(input_pattern))
         gdal.Translate(output_path, vrt_path)
 
 
+def decode_tile(data):
+    """Decode an encoded tile image to an RGBA array of uint8"""
+    with Image.open(io.BytesIO(data)) as img:
+        return np.asarray(img.convert("RGBA"))
+
+
+def _resample(img, size):
+    # Nearest neighbour resampling of a square tile to `size` pixels
+    idx = np.arange(size) * len(img) // size
+    return img[idx][:, idx]
+
+
+def mosaic_tiles(
+    tiles, x_min, x_max, y_min, y_max, zoom, reproject=True, max_pixels=None
+):
+    """Assemble encoded tiles into a single array
+
+    Parameters
+    ----------
+    tiles : dict mapping (x, y, zoom) to bytes or None
+        Missing tiles are left transparent. Tiles coarser than `zoom` are
+        upsampled to `zoom` by repeating pixels.
+    x_min, x_max, y_min, y_max : int
+        Inclusive range of tiles at `zoom` to assemble.
+    zoom : int
+    reproject : bool, optional
+        If True, resample the rows from Web Mercator so that they are evenly
+        spaced in latitude, which is what `add_raster` expects.
+    max_pixels : int, optional
+        Limit on the number of pixels in the mosaic. If assembling it at the
+        full resolution of `zoom` would exceed this, the resolution is halved
+        until it fits and finer tiles are downsampled.
+
+    Returns
+    -------
+    array of uint8
+        Has shape (rows, columns, 4).
+    tuple of float
+        (lon0, lon1, lat0, lat1) extent of the array.
+    """
+    decoded = {k: decode_tile(v) for (k, v) in tiles.items() if v is not None}
+    tile_size = next(iter(decoded.values())).shape[0] if decoded else 256
+    n_x = x_max - x_min + 1
+    n_y = y_max - y_min + 1
+    # Pixels per tile at `zoom`
+    px = tile_size
+    if max_pixels is not None:
+        while px > 1 and n_x * n_y * px**2 > max_pixels:
+            px //= 2
+    mosaic = np.zeros([n_y * px, n_x * px, 4], dtype=np.uint8)
+    for (x, y, z), img in decoded.items():
+        scale = 2 ** (zoom - z)
+        if scale * px != len(img):
+            img = _resample(img, scale * px)
+        i0 = (y * scale - y_min) * px
+        j0 = (x * scale - x_min) * px
+        # Coarse tiles may extend past the edges of the mosaic
+        img = img[max(-i0, 0) :, max(-j0, 0) :]
+        i0, j0 = max(i0, 0), max(j0, 0)
+        target = mosaic[i0 : i0 + len(img), j0 : j0 + img.shape[1]]
+        target[...] = img[: target.shape[0], : target.shape[1]]
+
+    lon0, lat1, _, _ = tile_edges(x_min, y_min, zoom)
+    _, _, lon1, lat0 = tile_edges(x_max, y_max, zoom)
+    extent = (lon0, lon1, lat0, lat1)
+
+    if reproject:
+        n_rows = len(mosaic)
+        lats = lat1 - (np.arange(n_rows) + 0.5) * (lat1 - lat0) / n_rows
+        y = lat_to_y(lats, zoom)
+        rows = np.clip(((y - y_min) * px).astype(int), 0, n_rows - 1)
+        mosaic = mosaic[rows]
+
+    return mosaic, extent
+
+
+def _zoom_for(px_per_deg, tile_size, max_zoom):
+    # A tile at zoom z has tile_size * 2**z / 360 pixels per degree of longitude
+    with np.errstate(divide="ignore"):
+        zoom = np.ceil(np.log2(360 * np.asarray(px_per_deg) / tile_size))
+    return np.clip(zoom, 0, max_zoom).astype(int)
+
+
+def select_zoom(extent, width, height, tile_size=256, max_zoom=19):
+    """Find the coarsest zoom that resolves an extent at a given size
+
+    Assumes the extent is displayed with longitude and latitude evenly spaced,
+    as with `PlateCarree`. For other projections see `display_zooms`.
+
+    Parameters
+    ----------
+    extent : tuple of float
+        (lon0, lon1, lat0, lat1)
+    width, height : float
+        Size of the displayed extent in pixels.
+    tile_size : int, optional
+    max_zoom : int, optional
+
+    Returns
+    -------
+    int
+    """
+    lon0, lon1, lat0, lat1 = _unwrap_extent(extent)
+    # Mercator tiles have the fewest pixels per degree of latitude nearest
+    # the equator.
+    min_abs_lat = 0 if lat0 <= 0 <= lat1 else min(abs(lat0), abs(lat1))
+    px_per_deg = max(
+        width / (lon1 - lon0),
+        height / (lat1 - lat0) * np.cos(np.radians(min_abs_lat)),
+    )
+    return int(_zoom_for(px_per_deg, tile_size, max_zoom))
+
+
+def display_zooms(ax, samples=32, tile_size=256, max_zoom=19):
+    """Find the zoom needed to resolve each part of a projected map
+
+    The axes are sampled on a grid of display pixels and the lon/lat span of
+    a single pixel is used to find the zoom needed at each sample.
+
+    Parameters
+    ----------
+    ax : GeoAxes
+    samples : int, optional
+        Number of samples along each side of the axes.
+    tile_size : int, optional
+    max_zoom : int, optional
+
+    Returns
+    -------
+    lons, lats : arrays of float
+    zooms : array of int
+        Only samples that lie within the projection's domain are returned.
+    """
+    from cartopy import crs
+
+    x0, y0, width, height = ax.bbox.bounds
+    px, py = np.meshgrid(
+        x0 + (np.arange(samples) + 0.5) * width / samples,
+        y0 + (np.arange(samples) + 0.5) * height / samples,
+    )
+    to_data = ax.transData.inverted()
+    identity = crs.PlateCarree()
+
+    def lonlat(dx, dy):
+        xy = to_data.transform(np.column_stack([px.ravel() + dx, py.ravel() + dy]))
+        lonlat = identity.transform_points(ax.projection, xy[:, 0], xy[:, 1])
+        return lonlat[:, 0], lonlat[:, 1]
+
+    lons, lats = lonlat(0, 0)
+    dlons, dlats = [], []
+    for dx, dy in [(1, 0), (0, 1)]:
+        lons_1, lats_1 = lonlat(dx, dy)
+        dlons.append(abs((lons_1 - lons + 180) % 360 - 180))
+        dlats.append(abs(lats_1 - lats))
+    # Use the bounding box of each pixel's footprint
+    dlon = np.maximum(*dlons)
+    dlat = np.maximum(*dlats)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        px_per_deg = np.fmax(1 / dlon, np.cos(np.radians(lats)) / dlat)
+    mask = np.isfinite(lons) & np.isfinite(lats) & np.isfinite(px_per_deg)
+    return lons[mask], lats[mask], _zoom_for(px_per_deg[mask], tile_size, max_zoom)
+
+
+# Decoded tiles keyed by (server_url, x, y, zoom), shared by `sample_tiles`
+_decoded = LRUCache(128)
+_missing = object()
+
+
+def _pixel_zooms(lons, lats, tile_size, max_zoom):
+    # Zoom needed to resolve each pixel of a grid of lon/lat locations
+    spans = []
+    for values, wrap in [(lons, True), (lats, False)]:
+        span = np.zeros_like(values)
+        for axis in (0, 1):
+            if values.shape[axis] < 2:
+                continue
+            delta = np.diff(values, axis=axis)
+            if wrap:
+                delta = (delta + 180) % 360 - 180
+            delta = np.abs(delta)
+            delta = np.concatenate([delta, delta.take([-1], axis=axis)], axis=axis)
+            span = np.fmax(span, delta)
+        spans.append(span)
+    dlon, dlat = spans
+    with np.errstate(divide="ignore", invalid="ignore"):
+        px_per_deg = np.fmax(1 / dlon, np.cos(np.radians(lats)) / dlat)
+    px_per_deg = np.nan_to_num(px_per_deg, nan=0, posinf=np.finfo(float).max)
+    return _zoom_for(px_per_deg, tile_size, max_zoom)
+
+
+def sample_tiles(downloader, lons, lats, max_zoom=19, tile_size=256):
+    """Sample tiles at a grid of locations, such as the pixels of a map
+
+    Each location is sampled from a tile at the zoom needed to resolve the
+    spacing of the grid there, so no mosaic is assembled. Tiles are fetched
+    through `downloader` and decoded tiles are kept in memory, so repeated
+    calls only fetch tiles that are new. If more than `downloader.max_tiles`
+    tiles would be needed, coarser zooms are used.
+
+    Parameters
+    ----------
+    downloader : TileDownloader
+    lons, lats : 2D arrays of float
+        Locations to sample. Non-finite locations are left transparent.
+    max_zoom : int, optional
+    tile_size : int, optional
+        Size of the server's tiles in pixels, used to choose zooms. Tiles of
+        other sizes, such as 512 pixel "retina" tiles, are resampled to it.
+
+    Returns
+    -------
+    array of uint8
+        RGBA values with shape `lons.shape + (4,)`.
+    """
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    result = np.zeros(lons.shape + (4,), dtype=np.uint8)
+    valid = np.isfinite(lons) & np.isfinite(lats) & (np.abs(lats) < MAX_LAT)
+    if not valid.any():
+        return result
+    zooms = _pixel_zooms(lons, lats, tile_size, max_zoom)[valid]
+    lons, lats = lons[valid], lats[valid]
+
+    while True:
+        x = _unwrapped_x(lons, zooms) % 2**zooms
+        y = lat_to_y(lats, zooms)
+        keys, inverse = np.unique(
+            np.stack([np.floor(x), np.floor(y), zooms], axis=1).astype(int),
+            axis=0,
+            return_inverse=True,
+        )
+        if len(keys) <= downloader.max_tiles or zooms.max() == 0:
+            break
+        zooms = np.maximum(zooms - 1, 0)
+
+    keys = [tuple(int(v) for v in k) for k in keys]
+    images = {}
+    for k in keys:
+        img = _decoded.get((downloader.server_url,) + k, _missing)
+        if img is not _missing:
+            images[k] = img
+    missing = [k for k in keys if k not in images]
+    for k, data in downloader.fetch_tiles(missing).items():
+        images[k] = None if (data is None) else decode_tile(data)
+        _decoded[(downloader.server_url,) + k] = images[k]
+
+    atlas = np.zeros([len(keys), tile_size, tile_size, 4], dtype=np.uint8)
+    for i, k in enumerate(keys):
+        img = images.get(k)
+        if img is not None:
+            atlas[i] = img if (len(img) == tile_size) else _resample(img, tile_size)
+    inverse = inverse.ravel()
+    cols = np.clip(((x - np.floor(x)) * tile_size).astype(int), 0, tile_size - 1)
+    rows = np.clip(((y - np.floor(y)) * tile_size).astype(int), 0, tile_size - 1)
+    result[valid] = atlas[inverse, rows, cols]
+    return result
+
+
+def tile_range(extent, zoom):
+    """Find the range of tiles covering an extent
+
+    Unlike `bbox_and_zoom_to_xy`, tiles that only touch the edges of the
+    extent are excluded.
+
+    Parameters
+    ----------
+    extent : tuple of float
+        (lon0, lon1, lat0, lat1), where lon1 < lon0 indicates an extent that
+        crosses the dateline.
+    zoom : int
+
+    Returns
+    -------
+    tuple of int
+        Inclusive (x_min, x_max, y_min, y_max). Where the extent crosses the
+        dateline, x_max is past the last column, so columns must be wrapped
+        before fetching. Use `split_extent` first to avoid this.
+    """
+    lon0, lon1, lat0, lat1 = _unwrap_extent(extent)
+    tile_count = 2**zoom
+    x0, x1 = _unwrapped_x([lon0, lon1], zoom)
+    y0, y1 = lat_to_y(np.array([lat1, lat0]), zoom)
+    lower = np.clip(np.floor([x0, y0]), 0, tile_count - 1)
+    limit = [lower[0] + tile_count - 1, tile_count - 1]
+    upper = np.clip(np.ceil([x1, y1]) - 1, lower, limit)
+    (x_min, y_min), (x_max, y_max) = lower.astype(int), upper.astype(int)
+    return int(x_min), int(x_max), int(y_min), int(y_max)
+
+
+def plan_tiles(extent, zoom, lons=None, lats=None, zooms=None, max_zoom=None):
+    """Choose the tiles needed to display an extent
+
+    Parameters
+    ----------
+    extent : tuple of float
+        (lon0, lon1, lat0, lat1), where lon1 < lon0 indicates an extent that
+        crosses the dateline.
+    zoom : int
+        Coarsest zoom to use.
+    lons, lats, zooms : arrays, optional
+        Zoom needed at sample locations, as returned by `display_zooms`. Tiles
+        at `zoom` that contain samples needing finer zooms are replaced by
+        their descendants at the finest zoom needed within them.
+    max_zoom : int, optional
+        Limit on the zoom of any tile.
+
+    Returns
+    -------
+    list of (x, y, zoom) tuples
+        Columns east of the dateline are numbered from 2**zoom onwards, so
+        the plan is contiguous. Wrap them before fetching.
+    int
+        The finest zoom in the plan.
+    """
+    if max_zoom is not None:
+        zoom = min(zoom, max_zoom)
+    x_min, x_max, y_min, y_max = tile_range(extent, zoom)
+    needed = np.full([x_max - x_min + 1, y_max - y_min + 1], zoom)
+    if zooms is not None and len(zooms):
+        xs, ys = latlonzoom_to_xy(lats, lons, zoom)
+        xs = (np.floor(xs).astype(int) - x_min) % 2**zoom
+        ys = np.floor(ys).astype(int) - y_min
+        mask = (xs >= 0) & (xs < needed.shape[0]) & (ys >= 0) & (ys < needed.shape[1])
+        np.maximum.at(needed, (xs[mask], ys[mask]), zooms[mask])
+        if max_zoom is not None:
+            needed = np.minimum(needed, max_zoom)
+
+    plan = []
+    for i, j in np.ndindex(*needed.shape):
+        x, y, z = x_min + i, y_min + j, int(needed[i, j])
+        scale = 2 ** (z - zoom)
+        # Restrict descendants to the extent
+        cx_min, cx_max, cy_min, cy_max = tile_range(extent, z)
+        cx_range = range(max(x * scale, cx_min), min((x + 1) * scale - 1, cx_max) + 1)
+        cy_range = range(max(y * scale, cy_min), min((y + 1) * scale - 1, cy_max) + 1)
+        plan.extend((cx, cy, z) for cx in cx_range for cy in cy_range)
+    return plan, int(needed.max())
+
+
+def write_geotiff(path, data, extent):
+    """Write an RGBA array with a lon/lat `extent` to a GeoTIFF"""
+    gdal = _gdal()
+    from osgeo import osr
+
+    lon0, lon1, lat0, lat1 = extent
+    n_rows, n_cols, n_bands = data.shape
+    dataset = gdal.GetDriverByName("GTiff").Create(
+        str(path), n_cols, n_rows, n_bands, gdal.GDT_Byte
+    )
+    dataset.SetGeoTransform(
+        (lon0, (lon1 - lon0) / n_cols, 0, lat1, 0, -(lat1 - lat0) / n_rows)
+    )
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    dataset.SetProjection(srs.ExportToWkt())
+    for i in range(n_bands):
+        dataset.GetRasterBand(i + 1).WriteArray(data[:, :, i])
+    dataset.FlushCache()
+
+
+class _RateLimiter:
+    """Limit the rate of requests to each host, shared across threads"""
+
+    def __init__(self, rate):
+        self.interval = 0 if not rate else 1.0 / rate
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next.get(host, now))
+            self._next[host] = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class TileCache:
+    """Persistent on-disk cache of downloaded tiles
+
+    Entries are addressed by a hash of (server template, z, x, y) and each
+    is stored in a single file holding a small JSON header and the tile.
+    Files are written atomically and reads tolerate files disappearing, so
+    several processes can safely share one cache. When the cache grows past
+    `max_bytes`, the least recently used entries are removed.
+
+    Args:
+        directory (str or Path, optional): where to store tiles. Defaults to
+            `tiles` in the pyseas cache directory (see `util.cache_dir`).
+        max_bytes (int, optional): approximate maximum size of the cache.
+        ttl (float, optional): age in seconds after which entries must be
+            revalidated with the server. By default entries never expire.
+
+    """
+
+    def __init__(self, directory=None, max_bytes=2**30, ttl=None):
+        self.directory = cache_dir("tiles") if (directory is None) else Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._size = sum(size for (_, _, size) in self._entries())
+
+    def _path(self, key):
+        digest = hashlib.sha256(repr(key).encode("utf8")).hexdigest()
+        return self.directory / digest[:2] / f"{digest}.tile"
+
+    def _entries(self):
+        for path in self.directory.glob("*/*.tile"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            yield stat.st_mtime, path, stat.st_size
+
+    def get(self, key):
+        """Look up a tile
+
+        Returns:
+            tuple[dict, bytes or None] or None: None if the tile is not
+            cached, otherwise the entry header and the tile data. The data is
+            None if the server reported that the tile does not exist.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                data = f.read()
+            # Mark as recently used
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            return None
+        return header, (None if header.get("missing") else data)
+
+    def is_fresh(self, header):
+        """Whether an entry can be used without revalidating it"""
+        return self.ttl is None or time.time() - header["fetched"] < self.ttl
+
+    def put(self, key, data, etag=None):
+        """Store a tile; `data` is None for tiles that do not exist"""
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        header = {"fetched": time.time(), "etag": etag, "missing": data is None}
+        blob = json.dumps(header).encode("utf8") + b"\n" + (data or b"")
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            # Overwriting an entry (e.g. after revalidating) replaces its size
+            try:
+                old_size = path.stat().st_size
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        with self._lock:
+            self._size += len(blob) - old_size
+            needs_eviction = self._size > self.max_bytes
+        if needs_eviction:
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until below 90% of `max_bytes`"""
+        with self._lock:
+            # Rescan since other processes may have changed the cache
+            entries = sorted(self._entries())
+            size = sum(x[2] for x in entries)
+            target = 0.9 * self.max_bytes
+            for _, path, n_bytes in entries:
+                if size <= target:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                size -= n_bytes
+            self._size = size
+
+
 class TileDownloader:
     """Downloads geographic tiles from a web server
 
+    Tiles are fetched concurrently by a pool of threads. Each thread keeps
+    its HTTP connections alive between requests. Failed requests are retried
+    with exponential backoff.
+
     Args:
         server_url (str): template for server url. The x, y, and z (zoom)
             location should be included in the template using `{x}`, etc.
         headers (list[tuple[str, str]]], optional): headers needed for authentication
         max_tiles (int, optional): If your query would result in more than this
             number of tiles being downloaded, an error is raised.
+            `download_for_display` reduces the zoom instead.
+        max_workers (int, optional): Maximum number of concurrent downloads.
+        retries (int, optional): How many times to retry a failed request.
+        backoff (float, optional): Delay in seconds before the first retry. The
+            delay doubles on each subsequent retry.
+        max_backoff (float, optional): Longest delay in seconds before a retry,
+            including delays requested by the server with `Retry-After`.
+        rate_limit (float, optional): Maximum requests per second to each host.
+        timeout (float, optional): Socket timeout in seconds.
+        cache (TileCache or bool, optional): cache to serve repeated requests
+            from. If True, a `TileCache` with default settings is used.
 
     """
 
-    def __init__(self, server_url, headers=None, max_tiles=64):
+    retry_statuses = frozenset([429, 500, 502, 503, 504])
+    max_redirects = 5
+
+    def __init__(
+        self,
+        server_url,
+        headers=None,
+        max_tiles=64,
+        max_workers=8,
+        retries=3,
+        backoff=0.5,
+        max_backoff=60,
+        rate_limit=None,
+        timeout=30,
+        cache=None,
+    ):
+        if cache is True:
+            cache = TileCache()
         self.server_url = server_url
+        self.cache = cache or None
         self.headers = headers
         self.max_tiles = max_tiles
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self._limiter = _RateLimiter(rate_limit)
+        self._local = threading.local()
+        # Every thread's connections, so that `close` can reach them
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._executor = None
+        self._executor_lock = threading.Lock()
 
     def check_tile_count(self, x_min, x_max, y_min, y_max):
         n_tiles = (x_max - x_min + 1) * (y_max - y_min + 1)
@@ -101,58 +764,269 @@ class TileDownloader:
             )
         return n_tiles
 
-    def download_tile(self, x, y, zoom, destination):
+    def _connection(self, scheme, netloc):
+        """Return this thread's persistent connection to `netloc`"""
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        key = (scheme, netloc)
+        if key not in connections:
+            cls = (
+                http.client.HTTPSConnection
+                if (scheme == "https")
+                else http.client.HTTPConnection
+            )
+            connections[key] = cls(netloc, timeout=self.timeout)
+            with self._connections_lock:
+                self._connections.append(connections[key])
+        return connections[key]
+
+    def _drop_connection(self, scheme, netloc):
+        connection = self._local.connections.pop((scheme, netloc), None)
+        if connection is not None:
+            connection.close()
+            with self._connections_lock:
+                # May already be gone if `close` was called meanwhile
+                if connection in self._connections:
+                    self._connections.remove(connection)
+
+    def _request_once(self, url, extra_headers):
+        for _ in range(self.max_redirects + 1):
+            parts = urllib.parse.urlsplit(url)
+            path = parts.path or "/"
+            if parts.query:
+                path += "?" + parts.query
+            headers = dict(self.headers or ())
+            headers.update(extra_headers)
+            self._limiter.wait(parts.netloc)
+            connection = self._connection(parts.scheme, parts.netloc)
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException):
+                # Stale keep-alive connections show up here, so start fresh
+                self._drop_connection(parts.scheme, parts.netloc)
+                raise
+            if response.will_close:
+                self._drop_connection(parts.scheme, parts.netloc)
+            if response.status in (301, 302, 303, 307, 308):
+                url = urllib.parse.urljoin(url, response.getheader("Location"))
+                continue
+            return response.status, response.msg, body
+        raise urllib.error.URLError(f"too many redirects fetching {url}")
+
+    def request(self, url, extra_headers=()):
+        """GET `url`, retrying transient failures
+
+        Returns:
+            tuple[int, http.client.HTTPMessage, bytes]: status, headers and body
+        """
+        extra_headers = dict(extra_headers)
+        for attempt in range(self.retries + 1):
+            delay = self.backoff * 2**attempt
+            try:
+                status, headers, body = self._request_once(url, extra_headers)
+            except (OSError, http.client.HTTPException) as err:
+                if attempt == self.retries:
+                    raise
+                logging.debug(f"retrying {url} after error: {err}")
+            else:
+                if status not in self.retry_statuses or attempt == self.retries:
+                    return status, headers, body
+                retry_after = headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+                logging.debug(f"retrying {url} after HTTP status {status}")
+            time.sleep(min(delay, self.max_backoff))
+
+    def fetch_tile(self, x, y, zoom):
+        """Download a single tile
+
+        Returns:
+            bytes or None: the encoded tile, or None if it does not exist
+        """
+        key = (self.server_url, zoom, x, y)
+        entry = None if (self.cache is None) else self.cache.get(key)
+        extra_headers = {}
+        if entry is not None:
+            header, data = entry
+            if self.cache.is_fresh(header):
+                return data
+            if header["etag"]:
+                extra_headers["If-None-Match"] = header["etag"]
+
         url = self.server_url.format(x=x, y=y, z=zoom)
+        status, headers, body = self.request(url, extra_headers)
+        if status == 304 and entry is not None:
+            self.cache.put(key, data, header["etag"])
+            return data
+        if status == 404:
+            # This is expected since not all tiles exist
+            body = None
+        elif status != 200:
+            logging.error(f"failed to download {url} due to HTTPError({status})")
+            reason = http.client.responses.get(status, "")
+            raise urllib.error.HTTPError(url, status, reason, headers, None)
+        if self.cache is not None:
+            self.cache.put(key, body, headers.get("ETag"))
+        return body
+
+    def fetch_tiles(self, tiles):
+        """Download tiles concurrently
+
+        Args:
+            tiles (iterable[tuple[int, int, int]]): (x, y, zoom) of each tile
+
+        Returns:
+            dict: maps (x, y, zoom) to the encoded tile, or None if the tile does
+            not exist
+        """
+        tiles = list(tiles)
+        # The pool is kept between calls so its threads' connections are reused
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        data = self._executor.map(lambda xyz: self.fetch_tile(*xyz), tiles)
+        return dict(zip(tiles, data))
+
+    def _fetch_unwrapped(self, tiles):
+        # Fetch tiles whose columns may run past the dateline, as planned by
+        # plan_tiles, keeping their unwrapped keys for mosaic_tiles
+        tiles = list(tiles)
+        fetched = self.fetch_tiles({(x % 2**z, y, z) for (x, y, z) in tiles})
+        return {(x, y, z): fetched[x % 2**z, y, z] for (x, y, z) in tiles}
+
+    def close(self):
+        """Shut down the download threads and their connections"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+
+    def download_tile(self, x, y, zoom, destination):
+        data = self.fetch_tile(x, y, zoom)
+        if data is None:
+            return None
         path = f"{destination}/download_{x}_{y}_{zoom}.png"
-        opener = urllib.request.build_opener()
-        if self.headers is not None:
-            opener.addheaders = self.headers
-        urllib.request.install_opener(opener)
-        try:
-            urllib.request.urlretrieve(url, path)
-        except urllib.error.HTTPError as err:
-            if err.code == 404:
-                # This is expected since not all tiles exist
-                return None
-            else:
-                logging.error(f"failed to download {url} due to HTTPError({err.code})")
-                raise
-        else:
-            return path
-
-    def _compute_extent(self, gdal_img):
-        gt = gdal_img.GetGeoTransform()
-        proj = gdal_img.GetProjection()
-        return (
-            gt[0],
-            gt[0] + gdal_img.RasterXSize * gt[1],
-            gt[3] + gdal_img.RasterYSize * gt[5],
-            gt[3],
-        )
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def download(self, extent, zoom, path=None, reproject=True):
+        """Download the tiles covering `extent` and merge them
 
-    def download(self, extent, zoom, path=None):
-        x_min, x_max, y_min, y_max = bbox_and_zoom_to_xy(*extent, zoom)
+        Args:
+            extent (tuple[float]): (lon0, lon1, lat0, lat1) of the area to
+                download, where lon1 < lon0 indicates an extent that crosses
+                the dateline.
+            zoom (int): zoom level of the tiles.
+            path (str, optional): If given, write the image to this GeoTIFF.
+            reproject (bool, optional): Resample rows so that they are evenly
+                spaced in latitude. See `mosaic_tiles`.
+
+        Returns:
+            tuple: (image, extent) if path is None, otherwise the extent. The
+            image is an RGBA array of uint8 and the extent is
+            (lon0, lon1, lat0, lat1). Where the area crosses the dateline,
+            lon1 is greater than 180 so that the image is contiguous.
+        """
+        x_min, x_max, y_min, y_max = tile_range(extent, zoom)
         n_tiles = self.check_tile_count(x_min, x_max, y_min, y_max)
 
-        with tempfile.TemporaryDirectory() as temp_dir:
-            logging.info(f"Downloading {n_tiles} tiles")
-            for x in range(x_min, x_max + 1):
-                for y in range(y_min, y_max + 1):
-                    logging.debug(f"downloading: {x},{y}")
-                    png_path = self.download_tile(x, y, zoom, temp_dir)
-                    if png_path is not None:
-                        georeference_raster_tile(x, y, zoom, png_path)
-            logging.info("Download complete")
-
-            output_path = f"{temp_dir}/output.tiff" if (path is None) else path
-            logging.info(f"Merging tiles to {output_path}")
-            merge_tiles(f"{temp_dir}/download_*.tiff", output_path)
-            logging.info("Computing extent")
-            gdal_img = gdal.Open(output_path, GA_ReadOnly)
-            extent = self._compute_extent(gdal_img)
-
-            if path is None:
-                data = gdal_img.ReadAsArray().transpose(1, 2, 0)
-                return data, extent
-            else:
-                return extent
+        logging.info(f"Downloading {n_tiles} tiles")
+        x_range, y_range = range(x_min, x_max + 1), range(y_min, y_max + 1)
+        fetched = self._fetch_unwrapped((x, y, zoom) for x in x_range for y in y_range)
+        logging.info("Download complete")
+
+        data, extent = mosaic_tiles(
+            fetched, x_min, x_max, y_min, y_max, zoom, reproject=reproject
+        )
+        if path is None:
+            return data, extent
+        logging.info(f"Writing tiles to {path}")
+        write_geotiff(path, data, extent)
+        return extent
+
+    def download_for_display(
+        self,
+        ax=None,
+        extent=None,
+        width=None,
+        height=None,
+        max_zoom=19,
+        tile_size=256,
+        reproject=True,
+    ):
+        """Download just enough tiles to display an area at full resolution
+
+        The coarsest zoom that resolves the display is chosen automatically.
+        For projected axes the resolution needed varies across the map, so
+        tiles are fetched at the zoom needed locally and coarser tiles are
+        upsampled to match the finest. If the plan needs more than
+        `max_tiles` tiles, the finest zoom is reduced until it fits. The
+        returned image is limited to the pixels of `max_tiles` tiles.
+
+        Args:
+            ax (GeoAxes, optional): Axes the tiles will be displayed on. Used
+                to find the extent and size if they are not given.
+            extent (tuple[float], optional): (lon0, lon1, lat0, lat1) to fetch,
+                where lon1 < lon0 indicates an extent that crosses the dateline.
+            width, height (float, optional): Display size in pixels. Required
+                if `ax` is not given.
+            max_zoom (int, optional): Finest zoom the server provides.
+            tile_size (int, optional): Size of the server's tiles in pixels.
+            reproject (bool, optional): See `mosaic_tiles`.
+
+        Returns:
+            tuple: (image, extent) suitable for `maps.add_raster`. The image
+            is an RGBA array of uint8 and the extent is (lon0, lon1, lat0, lat1).
+            Where the area crosses the dateline, lon1 is greater than 180.
+        """
+        from cartopy import crs
+
+        lons = lats = zooms = None
+        if ax is not None:
+            if extent is None:
+                extent = ax.get_extent(crs=crs.PlateCarree())
+            width, height = ax.bbox.width, ax.bbox.height
+            if not isinstance(ax.projection, crs.PlateCarree):
+                lons, lats, zooms = display_zooms(
+                    ax, tile_size=tile_size, max_zoom=max_zoom
+                )
+        elif width is None or height is None or extent is None:
+            raise ValueError(
+                "either `ax` or `extent`, `width` and `height` are required"
+            )
+
+        if zooms is not None and len(zooms):
+            zoom = int(zooms.min())
+            finest = int(zooms.max())
+        else:
+            zoom = finest = select_zoom(extent, width, height, tile_size, max_zoom)
+
+        for cap in range(finest, -1, -1):
+            plan, out_zoom = plan_tiles(extent, zoom, lons, lats, zooms, max_zoom=cap)
+            if len(plan) <= self.max_tiles:
+                break
+        if cap < finest:
+            logging.info(f"Reduced zoom from {finest} to {cap} to respect max_tiles")
+
+        logging.info(f"Downloading {len(plan)} tiles")
+        fetched = self._fetch_unwrapped(plan)
+        logging.info("Download complete")
+        x_min, x_max, y_min, y_max = tile_range(extent, out_zoom)
+        return mosaic_tiles(
+            fetched,
+            x_min,
+            x_max,
+            y_min,
+            y_max,
+            out_zoom,
+            reproject=reproject,
+            max_pixels=self.max_tiles * tile_size**2,
+        )
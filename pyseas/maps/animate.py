@@ -0,0 +1,248 @@
+"""Animate rasters, H3 data and tracks on a fixed map
+
+Looping over `plot_raster` and `savefig` rebuilds the whole map for every
+frame. `animate` instead draws onto a single existing map, updating only the
+data layer between frames. The pixel grid used to rasterize the data is
+computed once (see `rasterize.cache_composite_tx`), and frames are written
+to the output as they are drawn, so memory use doesn't grow with the number
+of frames. Rasterizing frames, usually the slowest part, can be spread over
+several processes with `max_workers`.
+
+Set up the static parts of the map first. `add_basemap` is the cheapest way
+to draw land and other static layers on every frame:
+
+    ax = maps.create_map(projection="regional.pacific")
+    maps.add_basemap(ax=ax, countries=True, logo=True)
+
+    def update(ax, i):
+        ax.set_title(str(dates[i]))
+
+    maps.animate.animate(
+        "effort.mp4", daily_rasters, ax=ax, vmin=0, vmax=10, update=update
+    )
+"""
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import chain
+
+import matplotlib.pyplot as plt
+from matplotlib.animation import AbstractMovieWriter, FFMpegWriter, PillowWriter
+
+from . import core, rasterize
+
+KINDS = ("raster", "h3", "track")
+
+# Pixel grid used by `_rasterize_in_worker`. Set by `_init_worker` so that it
+# is only sent to each worker process once.
+_grid = None
+
+
+class PNGSequenceWriter(AbstractMovieWriter):
+    """Write each frame to its own PNG file
+
+    `outfile` is a format string such as "frames/{:05d}.png", which is
+    formatted with the frame number.
+    """
+
+    def setup(self, fig, outfile, dpi=None):
+        super().setup(fig, outfile, dpi=dpi)
+        self._frame_number = 0
+
+    def grab_frame(self, **savefig_kwargs):
+        path = self.outfile.format(self._frame_number)
+        self.fig.savefig(path, format="png", dpi=self.dpi, **savefig_kwargs)
+        self._frame_number += 1
+
+    def finish(self):
+        pass
+
+
+def _writer_for(path, fps):
+    path = str(path)
+    if "{" in path:
+        return PNGSequenceWriter(fps=fps)
+    if path.lower().endswith(".gif") and not FFMpegWriter.isAvailable():
+        # Pillow keeps every frame in memory until the GIF is written, so it is
+        # only used when frames can't be streamed to ffmpeg
+        return PillowWriter(fps=fps)
+    return FFMpegWriter(fps=fps)
+
+
+def _rasterize(kind, source, grid, options):
+    row_locs, col_locs, transform, display_extent = grid
+    if kind == "raster":
+        A = rasterize.raster_to_raster(
+            source,
+            options["extent"],
+            row_locs,
+            col_locs,
+            transform,
+            origin=options["origin"],
+        )
+    else:
+        A = rasterize.h3_to_raster(
+            source, row_locs, col_locs, transform, fill=options["fill"]
+        )
+    return A, display_extent
+
+
+def _init_worker(grid):
+    global _grid
+    _grid = grid
+
+
+def _rasterize_in_worker(task):
+    kind, source, options = task
+    return _rasterize(kind, source, _grid, options)
+
+
+def _rasterized_frames(kind, frames, grid, options, max_workers):
+    """Yield (source, rasterized) pairs, rasterizing a bounded number ahead"""
+    if kind == "track":
+        for source in frames:
+            yield source, None
+    elif not max_workers:
+        for source in frames:
+            yield source, _rasterize(kind, source, grid, options)
+    else:
+        with ProcessPoolExecutor(
+            max_workers, initializer=_init_worker, initargs=(grid,)
+        ) as executor:
+            pending = deque()
+            for source in frames:
+                task = (kind, source, options)
+                pending.append((source, executor.submit(_rasterize_in_worker, task)))
+                if len(pending) >= 2 * max_workers:
+                    source, future = pending.popleft()
+                    yield source, future.result()
+            while pending:
+                source, future = pending.popleft()
+                yield source, future.result()
+
+
+def _resolved(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def animate(
+    path,
+    frames,
+    ax=None,
+    kind="raster",
+    extent=None,
+    origin="upper",
+    fill=0.0,
+    track_props=None,
+    update=None,
+    fps=10,
+    dpi=None,
+    writer=None,
+    max_workers=None,
+    **kwargs,
+):
+    """Write an animation of data drawn on an existing map
+
+    Parameters
+    ----------
+    path : str or Path
+        Output file. A format string such as "frames/{:05d}.png" is written
+        as a sequence of PNGs. Anything else, typically a '.mp4' or '.gif'
+        file, is written with ffmpeg, which receives frames as they are
+        drawn. If ffmpeg isn't installed, GIFs are written with Pillow
+        instead, which keeps every frame in memory until the end.
+    frames : iterable
+        One item per frame, depending on `kind`:
+            'raster' : a 2D or 3D lat/lon raster, as for `add_raster`
+            'h3' : a dict mapping H3 ids to values, as for `add_h3_data`
+            'track' : a (lons, lats) pair of arrays
+        May be a generator, in which case frames are only loaded as needed.
+    ax : GeoAxes, optional
+    kind : str, optional
+        One of 'raster', 'h3' or 'track'.
+    extent : tuple of float, optional
+        (lon_min, lon_max, lat_min, lat_max) of rasters.
+    origin : str, optional
+        Location of the raster origin ['upper' or 'lower'].
+    fill : float, optional
+        Value for areas without H3 data.
+    track_props : dict, optional
+        Passed to `Axes.plot` when drawing tracks.
+    update : callable, optional
+        Called as `update(ax, i)` before frame `i` is drawn, for example to
+        update a title. It should not change the extent of the map.
+    fps : float, optional
+    dpi : float, optional
+        Changes the dpi of the figure. Defaults to its current dpi.
+    writer : matplotlib.animation.AbstractMovieWriter, optional
+        Overrides the writer selected from `path`.
+    max_workers : int, optional
+        If given, rasters and H3 data are rasterized ahead of time in this
+        many processes.
+
+    Other Parameters
+    ----------------
+    Keyword args are passed on to `add_raster` or `add_h3_data`. If the
+    normalization is not specified with `norm` or `vmin` and `vmax`, it is
+    taken from the first frame.
+
+    Returns
+    -------
+    int
+        Number of frames written.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of {KINDS}, got {kind!r}")
+    if ax is None:
+        ax = plt.gca()
+    fig = ax.figure
+    if dpi is not None:
+        fig.set_dpi(dpi)
+    frames = iter(frames)
+    try:
+        first = next(frames)
+    except StopIteration:
+        return 0
+    frames = chain([first], frames)
+
+    if kind == "raster":
+        artist = core.add_raster(first, ax=ax, extent=extent, origin=origin, **kwargs)
+    elif kind == "h3":
+        artist = core.add_h3_data(first, ax=ax, fill=fill, **kwargs)
+    else:
+        (artist,) = ax.plot(*first, transform=core.identity, **(track_props or {}))
+
+    options = {
+        "extent": (-180, 180, -90, 90) if (extent is None) else extent,
+        "origin": origin,
+        "fill": fill,
+    }
+
+    if writer is None:
+        writer = _writer_for(path, fps)
+    n_frames = 0
+    with writer.saving(fig, str(path), fig.dpi):
+        grid = view_key = None
+        if kind != "track":
+            # Both adding the image and setting up the writer can change the
+            # layout (ffmpeg needs even frame sizes), so find the grid last
+            ax.apply_aspect()
+            grid = rasterize.cache_composite_tx(rasterize.setup_composite_tx(ax))
+            view_key = artist._view_key()
+        for source, rasterized in _rasterized_frames(
+            kind, frames, grid, options, max_workers
+        ):
+            if kind == "track":
+                artist.set_data(*source)
+            elif kind == "raster":
+                artist.set_data((source, options["extent"], origin))
+            else:
+                artist.set_data((source, fill))
+            if update is not None:
+                update(ax, n_frames)
+            if rasterized is not None and artist._view_key() == view_key:
+                artist.set_pending(_resolved(rasterized))
+            writer.grab_frame()
+            n_frames += 1
+    return n_frames
@@ -0,0 +1,213 @@
+"""Cache the static layers of maps that share a projection and extent
+
+Reports often contain many maps that differ only in their data. `add_basemap`
+renders land, countries, EEZs, gridlines and the logo once for each
+combination of projection, extent, style, figure size and dpi, and reuses
+the resulting RGBA image for later maps. The image is placed above rasters
+(zorder 0) and below tracks (zorder 2), matching where these layers are
+drawn by `add_land` and friends, while the ocean is drawn as the axes
+background as usual.
+
+The image is rendered for the axes position at the time `add_basemap` is
+called, so call it after the figure layout is final and save the figure at
+the same dpi. The logo is cheap to draw and may extend outside the axes, so
+it is added directly to the map rather than to the cached image.
+
+    ax = maps.create_map(projection="regional.mediterranean")
+    maps.add_raster(raster, ax=ax)
+    maps.add_basemap(ax=ax, countries=True, logo=True)
+"""
+import matplotlib.pyplot as plt
+import numpy as np
+from cycler import Cycler
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import Colormap, is_color_like, to_hex
+from matplotlib.figure import Figure
+from matplotlib.image import BboxImage
+
+from ..util import LRUCache
+from . import core
+
+_templates = LRUCache(16)
+
+# Layers in the order they are drawn, with the functions that draw them
+LAYERS = [
+    ("gridlines", core.add_gridlines),
+    ("land", core.add_land),
+    ("countries", core.add_countries),
+    ("eezs", core.add_eezs),
+]
+
+
+def _freeze(value):
+    # Make option values usable in cache keys
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for (k, v) in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(x) for x in value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(x) for x in value)
+    if isinstance(value, np.ndarray):
+        return (value.dtype.str, value.shape, value.tobytes())
+    return value
+
+
+def _as_kwargs(value):
+    return {} if (value is True) else value
+
+
+def _layer_options(layers):
+    options = []
+    for name, _ in LAYERS:
+        value = layers[name]
+        if value not in (False, None):
+            options.append((name, _freeze(_as_kwargs(value))))
+    return tuple(options)
+
+
+def _style_value(value):
+    # Normalize style values so that equal styles give equal keys, however
+    # their colors are spelled and whether or not they share objects
+    if isinstance(value, Cycler):
+        return ("cycler", _style_value(list(value)))
+    if isinstance(value, Colormap):
+        return ("cmap", value.name, _freeze(value(np.linspace(0, 1, value.N))))
+    if isinstance(value, (str, tuple)) and is_color_like(value):
+        return to_hex(value, keep_alpha=True)
+    if isinstance(value, dict):
+        return tuple(sorted((repr(k), _style_value(v)) for (k, v) in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_style_value(x) for x in value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_style_value(x) for x in value)
+    if isinstance(value, np.ndarray):
+        return _freeze(value)
+    try:
+        hash(value)
+    except TypeError:
+        raise TypeError(
+            f"cannot cache basemaps for styles containing {type(value).__name__}"
+        ) from None
+    return value
+
+
+def _style_key(style):
+    # Anything in the style can change how the static layers look
+    return tuple(
+        sorted(
+            (k, _style_value(v))
+            for (k, v) in style.items()
+            if k.startswith(("pyseas.", "grid.", "font.", "text."))
+        )
+    )
+
+
+def _template_key(ax, options):
+    fig = ax.figure
+    return (
+        type(ax.projection).__name__,
+        ax.projection.proj4_init,
+        tuple(np.round(ax.get_xlim(), 6)),
+        tuple(np.round(ax.get_ylim(), 6)),
+        tuple(np.round(ax.get_position().bounds, 6)),
+        tuple(fig.get_size_inches()),
+        fig.dpi,
+        _style_key(core.map_style(ax)),
+        options,
+    )
+
+
+def render_template(ax, options):
+    """Render static layers matching `ax` to an RGBA array
+
+    The layers are drawn on a transparent offscreen figure with the same size,
+    dpi, axes position and view limits as `ax`, without using pyplot.
+
+    Parameters
+    ----------
+    ax : GeoAxes
+    options : dict
+        Maps layer names to keyword arguments for the function drawing them.
+
+    Returns
+    -------
+    array of uint8
+        Has shape (rows, columns, 4) covering the bounding box of `ax`.
+    """
+    fig = Figure(figsize=ax.figure.get_size_inches(), dpi=ax.figure.dpi)
+    canvas = FigureCanvasAgg(fig)
+    fig.patch.set_alpha(0)
+    template_ax = fig.add_axes(ax.get_position().bounds, projection=ax.projection)
+    template_ax.set_xlim(ax.get_xlim())
+    template_ax.set_ylim(ax.get_ylim())
+    template_ax.set_aspect(ax.get_aspect())
+    template_ax.set_facecolor((0, 0, 0, 0))
+    template_ax._pyseas_state = dict(core.map_state(ax), gridlines=None)
+    template_ax.spines["geo"].set_visible(False)
+    template_ax.get_xaxis().set_visible(False)
+    template_ax.get_yaxis().set_visible(False)
+
+    for name, add_layer in LAYERS:
+        if name in options:
+            add_layer(ax=template_ax, **options[name])
+
+    canvas.draw()
+    buffer = np.asarray(canvas.buffer_rgba())
+    x0, y0, x1, y1 = np.round(template_ax.bbox.extents).astype(int)
+    # Buffer rows run from the top of the figure
+    n_rows = buffer.shape[0]
+    return buffer[n_rows - y1 : n_rows - y0, x0:x1].copy()
+
+
+def add_basemap(
+    ax=None,
+    land=True,
+    countries=False,
+    eezs=False,
+    gridlines=False,
+    logo=False,
+    zorder=1.5,
+):
+    """Add cached static layers to an existing map
+
+    Each layer may be True to draw it with default settings, False to omit
+    it, or a dict of keyword arguments for the function that draws it
+    (`add_land`, `add_countries`, `add_eezs`, `add_gridlines` or `add_logo`).
+    Gridlines are registered with the map as if drawn by `add_gridlines`, so
+    `add_gridlabels` can be used afterwards.
+
+    Parameters
+    ----------
+    ax : GeoAxes, optional
+    land, countries, eezs, gridlines, logo : bool or dict, optional
+    zorder : float, optional
+        By default the layers are drawn over rasters but under tracks.
+
+    Returns
+    -------
+    BboxImage
+    """
+    if ax is None:
+        ax = plt.gca()
+    ax.apply_aspect()
+    layers = dict(land=land, countries=countries, eezs=eezs, gridlines=gridlines)
+    key = _template_key(ax, _layer_options(layers))
+    template = _templates.get(key)
+    if template is None:
+        options = {
+            name: _as_kwargs(value)
+            for (name, value) in layers.items()
+            if value not in (False, None)
+        }
+        template = render_template(ax, options)
+        _templates[key] = template
+    image = BboxImage(ax.bbox, origin="upper", interpolation="nearest", zorder=zorder)
+    image.set_data(template)
+    ax.add_artist(image)
+    if gridlines not in (False, None):
+        # The lines are in the image, but `add_gridlabels` needs the locators
+        gl = core.add_gridlines(ax=ax, **_as_kwargs(gridlines))
+        gl.xlines = gl.ylines = False
+    if logo not in (False, None):
+        core.add_logo(ax=ax, **_as_kwargs(logo))
+    return image
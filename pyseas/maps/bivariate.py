@@ -163,17 +163,16 @@ def _is_log(cmap_value, norm):
         return cmap_value
 
 
-def _setup_width_and_height(width, height, aspect_ratio):
+def _setup_width_and_height(ax, width, height, aspect_ratio):
     if width is height is None:
         width = 0.2
     if aspect_ratio is None:
         aspect_ratio = 1.0
 
     if width is None or height is None:
-        if core._last_projection in projection_info:
-            scale = (
-                projection_info[core._last_projection]["aspect_ratio"] / aspect_ratio
-            )
+        projection = core.map_state(ax)["projection"]
+        if projection in projection_info:
+            scale = projection_info[projection]["aspect_ratio"] / aspect_ratio
         else:
             warnings.warn(
                 "Using non-standard projection, consider setting width and height"
@@ -263,7 +262,7 @@ def add_bivariate_colorbox(
         xnorm = Normalize(vmin=0, vmax=1, clip=True)
     if ynorm is None:
         ynorm = Normalize(vmin=0, vmax=1, clip=True)
-    width, height = _setup_width_and_height(width, height, aspect_ratio)
+    width, height = _setup_width_and_height(ax, width, height, aspect_ratio)
     if isinstance(loc, str):
         loc = _loc_finder(loc, width, height, pad=pad)
     wloc, hloc = loc
@@ -294,7 +293,7 @@ def add_bivariate_colorbox(
         shading="auto",
     )
 
-    bg_color = bg_color or plt.rcParams.get(
+    bg_color = bg_color or core.map_style(ax).get(
         "pyseas.ocean.color", props.dark.ocean.color
     )
 
@@ -313,7 +312,7 @@ def add_bivariate_colorbox(
     if yformat is not None:
         cb_ax.yaxis.set_major_formatter(yformat)
 
-    plt.sca(ax)
+    core.set_current_axes(ax)
     return cb_ax
 
 
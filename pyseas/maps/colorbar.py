@@ -58,9 +58,8 @@ def add_left_labeled_colorbar(
         else:
             width = 0.33
     if right_edge is None:
-        is_global = isinstance(
-            core._last_projection, str
-        ) and core._last_projection.startswith("global.")
+        projection = core.map_state(ax)["projection"]
+        is_global = isinstance(projection, str) and projection.startswith("global.")
         right_edge = 0.78 if is_global else 1.0
     hloc = 0.98 + hspace if (loc == "top") else -(height + hspace)
     if center:
@@ -71,7 +70,7 @@ def add_left_labeled_colorbar(
         wloc = right_edge - width
 
     cb_ax = ax.inset_axes([wloc, hloc, width, height], transform=ax.transAxes)
-    cb = plt.colorbar(
+    cb = ax.figure.colorbar(
         img,
         ax=ax,
         cax=cb_ax,
@@ -86,7 +85,7 @@ def add_left_labeled_colorbar(
         valign,
         label,
         transform=cb_ax.transAxes,
-        fontdict=plt.rcParams.get(
+        fontdict=core.map_style(ax).get(
             "pyseas.map.colorbarlabelfont", styles._colorbarlabelfont
         ),
         horizontalalignment="right",
@@ -96,7 +95,7 @@ def add_left_labeled_colorbar(
     cb_ax.minorticks_off()
     cb.outline.set_visible(False)
 
-    plt.sca(ax)
+    core.set_current_axes(ax)
     return cb_ax
 
 
@@ -149,7 +148,7 @@ def add_top_labeled_colorbar(
     wloc = 0.5 - width / 2
 
     cb_ax = ax.inset_axes([wloc, hloc, width, height], transform=ax.transAxes)
-    cb = plt.colorbar(
+    cb = ax.figure.colorbar(
         img,
         ax=ax,
         cax=cb_ax,
@@ -165,7 +164,7 @@ def add_top_labeled_colorbar(
             1.0,
             left_label,
             transform=cb_ax.transAxes,
-            fontdict=plt.rcParams.get(
+            fontdict=core.map_style(ax).get(
                 "pyseas.map.colorbarlabelfont", styles._colorbarlabelfont
             ),
             horizontalalignment="left",
@@ -178,7 +177,7 @@ def add_top_labeled_colorbar(
             1.0,
             center_label,
             transform=cb_ax.transAxes,
-            fontdict=plt.rcParams.get(
+            fontdict=core.map_style(ax).get(
                 "pyseas.map.colorbarlabelfont", styles._colorbarlabelfont
             ),
             horizontalalignment="center",
@@ -191,7 +190,7 @@ def add_top_labeled_colorbar(
             1.0,
             right_label,
             transform=cb_ax.transAxes,
-            fontdict=plt.rcParams.get(
+            fontdict=core.map_style(ax).get(
                 "pyseas.map.colorbarlabelfont", styles._colorbarlabelfont
             ),
             horizontalalignment="right",
@@ -201,5 +200,5 @@ def add_top_labeled_colorbar(
     cb_ax.minorticks_off()
     cb.outline.set_visible(False)
 
-    plt.sca(ax)
+    core.set_current_axes(ax)
     return cb_ax
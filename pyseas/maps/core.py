@@ -30,8 +30,6 @@ import uuid
 import warnings
 
 import cartopy
-import cartopy.feature as cfeature
-import geopandas as gpd
 import matplotlib.offsetbox as mplobox
 import matplotlib.pyplot as plt
 import numpy as np
@@ -40,9 +38,9 @@ from matplotlib.lines import Line2D
 from shapely.geometry import MultiLineString
 
 from .. import props, styles
-from . import colorbar, rasterize, ticks
+from . import colorbar, features, rasterize, ticks
 from ._monkey_patch_cartopy import monkey_patch_cartopy
-from .projection import ProjectionInfo, get_extent, get_projection
+from .projection import ProjectionInfo, get_extent, get_projection, make_projection
 
 monkey_patch_cartopy()
 
@@ -60,7 +58,8 @@ def add_land(
     ----------
     ax : matplotlib axes object, optional
     scale : str, optional
-        Resolution of NaturalEarth data to use ('10m’, ‘50m’, or ‘110m').
+        Resolution of NaturalEarth data to use ('10m’, ‘50m’, ‘110m’ or 'auto').
+        'auto' chooses the resolution based on the map extent and size.
     edgecolor : str or tuple, optional
         Color to use for the landmass edges.
     facecolor : str or tuple, optional
@@ -70,7 +69,7 @@ def add_land(
 
     Other Parameters
     ----------------
-    Keyword args are passed on to NaturalEarthFeature.
+    Keyword args are passed on to CachedNaturalEarthFeature.
 
     Returns
     -------
@@ -78,17 +77,20 @@ def add_land(
     """
     if ax is None:
         ax = plt.gca()
-    edgecolor = edgecolor or plt.rcParams.get(
+    style = map_style(ax)
+    edgecolor = edgecolor or style.get(
         "pyseas.border.color", props.dark.border.color
     )
-    facecolor = facecolor or plt.rcParams.get(
+    facecolor = facecolor or style.get(
         "pyseas.land.color", props.dark.land.color
     )
-    linewidth = linewidth or plt.rcParams.get("pyseas.border.linewidth", 0.4)
-    land = cfeature.NaturalEarthFeature(
+    linewidth = linewidth or style.get("pyseas.border.linewidth", 0.4)
+    land = features.CachedNaturalEarthFeature(
         "physical",
         "land",
         scale,
+        ax.projection,
+        ax=ax,
         edgecolor=edgecolor,
         facecolor=facecolor,
         linewidth=linewidth,
@@ -111,7 +113,8 @@ def add_countries(
     ----------
     ax : matplotlib axes object, optional
     scale : str, optional
-        Resolution of NaturalEarth data to use ('10m’, ‘50m’, or ‘110m').
+        Resolution of NaturalEarth data to use ('10m’, ‘50m’, ‘110m’ or 'auto').
+        'auto' chooses the resolution based on the map extent and size.
     edgecolor : str or tuple, optional
         Color to use for the landmass edges.
     facecolor : str or tuple, optional
@@ -121,7 +124,7 @@ def add_countries(
 
     Other Parameters
     ----------------
-    Keyword args are passed on to NaturalEarthFeature.
+    Keyword args are passed on to CachedNaturalEarthFeature.
 
     Returns
     -------
@@ -129,17 +132,20 @@ def add_countries(
     """
     if ax is None:
         ax = plt.gca()
-    edgecolor = edgecolor or plt.rcParams.get(
+    style = map_style(ax)
+    edgecolor = edgecolor or style.get(
         "pyseas.border.color", props.dark.border.color
     )
-    facecolor = facecolor or plt.rcParams.get(
+    facecolor = facecolor or style.get(
         "pyseas.land.color", props.dark.land.color
     )
-    linewidth = linewidth or plt.rcParams.get("pyseas.border.linewidth", 0.4)
-    land = cfeature.NaturalEarthFeature(
+    linewidth = linewidth or style.get("pyseas.border.linewidth", 0.4)
+    land = features.CachedNaturalEarthFeature(
         "cultural",
         "admin_0_boundary_lines_land",
         scale,
+        ax.projection,
+        ax=ax,
         edgecolor=edgecolor,
         facecolor=facecolor,
         linewidth=linewidth,
@@ -173,7 +179,7 @@ def add_raster(raster, ax=None, extent=None, origin="upper", **kwargs):
     if extent is None:
         extent = (-180, 180, -90, 90)
     if "cmap" in kwargs and isinstance(kwargs["cmap"], str):
-        src = plt.rcParams["pyseas.map.cmapsrc"]
+        src = map_style(ax)["pyseas.map.cmapsrc"]
         try:
             kwargs["cmap"] = getattr(src, kwargs["cmap"])
         except AttributeError:
@@ -206,7 +212,7 @@ def add_h3_data(h3_data, ax=None, **kwargs):
     if ax is None:
         ax = plt.gca()
     if "cmap" in kwargs and isinstance(kwargs["cmap"], str):
-        src = plt.rcParams["pyseas.map.cmapsrc"]
+        src = map_style(ax)["pyseas.map.cmapsrc"]
         try:
             kwargs["cmap"] = getattr(src, kwargs["cmap"])
         except AttributeError:
@@ -215,6 +221,29 @@ def add_h3_data(h3_data, ax=None, **kwargs):
     return rasterize.h3_show(ax, h3_data, **kwargs)
 
 
+def add_tiles(downloader, ax=None, **kwargs):
+    """Add imagery from a tile server to an existing map
+
+    Tiles are fetched as needed each time the map is drawn.
+
+    Parameters
+    ----------
+    downloader : imagery.tiles.TileDownloader
+    ax : matplotlib axes object, optional
+
+    Other Parameters
+    ----------------
+    Keyword args are passed on to `rasterize.tile_show`.
+
+    Returns
+    -------
+    AxesImage
+    """
+    if ax is None:
+        ax = plt.gca()
+    return rasterize.tile_show(ax, downloader, **kwargs)
+
+
 def _build_multiline_string_coords(x, y, mask, break_on_change, x_is_lon=True):
     assert len(x) == len(y) == len(mask), (len(x), len(y), len(mask))
     i = 0
@@ -311,7 +340,7 @@ def add_plot(
         assert len(kind) == len(lon)
 
     if props is None:
-        props = styles.create_props(np.unique(kind))
+        props = styles.create_props(np.unique(kind), style=map_style(ax))
 
     handles = {}
     for k1, k2 in sorted(props.keys()):
@@ -343,9 +372,6 @@ def plot(*args, **kwargs):
     return plt.plot(*args, **kwargs)
 
 
-_eezs = {}
-
-
 def add_eezs(
     ax=None,
     *,
@@ -355,6 +381,7 @@ def add_eezs(
     alpha=1,
     include=None,
     exclude=None,
+    simplify=None,
 ):
     """Add EEZs to an existing map
 
@@ -369,7 +396,8 @@ def add_eezs(
     alpha: float, optional
     included: optional, set-like: if set, filter lines to only those that are in included
     excluded: optional, set-like: if set, remove lines that are in excluded
-
+    simplify: optional, bool or float: if set, simplify lines to this many pixels
+        (half a pixel if True)
 
     Returns
     -------
@@ -377,49 +405,43 @@ def add_eezs(
     """
     if ax is None:
         ax = plt.gca()
-    path = os.path.join(root, "pyseas/data/eezs/eez_boundaries_v11.gpkg")
-    if path not in _eezs:
-        try:
-            with warnings.catch_warnings():
-                # Suppress useless RuntimeWarning from geopandas when reading EEZs
-                warnings.simplefilter("ignore")
-                _eezs[path] = gpd.read_file(path)
-        except FileNotFoundError:
-            raise FileNotFoundError(
-                "Eezs must be installed into the `pyseas/data/` directory"
-            )
-
-    eezs = _eezs[path]
-    if include is not None:
-        eezs = eezs[eezs.LINE_TYPE.isin(include)]
-    if exclude is not None:
-        eezs = eezs[~eezs.LINE_TYPE.isin(exclude)]
-    edgecolor = edgecolor or plt.rcParams.get(
+    style = map_style(ax)
+    edgecolor = edgecolor or style.get(
         "pyseas.eez.bordercolor", props.dark.eez.color
     )
-    linewidth = linewidth or plt.rcParams.get("pyseas.eez.linewidth", 0.4)
-
-    return ax.add_geometries(
-        eezs.geometry,
-        crs=identity,
+    linewidth = linewidth or style.get("pyseas.eez.linewidth", 0.4)
+
+    # Load now, so that missing data is reported here rather than when drawing
+    features.load_eezs(include=include, exclude=exclude)
+    eezs = features.CachedEEZFeature(
+        ax.projection,
+        ax=ax,
+        include=include,
+        exclude=exclude,
+        simplify=simplify,
         alpha=alpha,
         facecolor=facecolor,
         edgecolor=edgecolor,
         linewidth=linewidth,
     )
+    return ax.add_feature(eezs)
 
 
-def add_figure_background(fig=None, color=None):
+def add_figure_background(fig=None, color=None, style=None):
     """Set the figure background (area around plot)
 
     Parameters
     ----------
     fig : Figure, optional
     color : tuple or str, optional
+    style : MapStyle, optional
+        Style to take the default color from, instead of `plt.rcParams`.
     """
     if fig is None:
         fig = plt.gcf()
-    color = color or plt.rcParams.get(
+    if style is None:
+        style = plt.rcParams
+    color = color or style.get(
         "pyseas.fig.background", props.dark.background.color
     )
     fig.patch.set_facecolor(color)
@@ -451,9 +473,12 @@ def add_gridlines(ax=None, zorder=0.5, **kwargs):
         ax = plt.gca()
     for name in ["linewidth", "linestyle", "color", "alpha"]:
         if name not in kwargs:
-            kwargs[name] = plt.rcParams["grid." + name]
-    _current_gridlines = ax.gridlines(zorder=zorder, **kwargs)
-    return _current_gridlines
+            kwargs[name] = map_style(ax)["grid." + name]
+    gridlines = ax.gridlines(zorder=zorder, **kwargs)
+    _current_gridlines = gridlines
+    if hasattr(ax, "_pyseas_state"):
+        ax._pyseas_state["gridlines"] = gridlines
+    return gridlines
 
 
 def add_gridlabels(
@@ -468,6 +493,7 @@ def add_gridlabels(
     lats : sequence of float
     ax : Axes, optional
     fig : Figure, optional
+        Unused, kept for compatibility.
     lon_side : str, optional
         'top' or 'bottom (default)
     lat_side : str, optional
@@ -479,12 +505,10 @@ def add_gridlabels(
     Keyword args are passed on to ax.gridlines
 
     """
-    if gl is None:
-        gl = _current_gridlines
-    if fig is None:
-        fig = plt.gcf()
     if ax is None:
         ax = plt.gca()
+    if gl is None:
+        gl = map_state(ax)["gridlines"]
     extent = ax.get_extent(crs=identity)
     if lons is None:
         lons = gl.xlocator.tick_values(*extent[:2])
@@ -494,7 +518,8 @@ def add_gridlabels(
             lons = np.array(lons)
     if lats is None:
         lats = gl.ylocator.tick_values(*extent[2:])
-    fig.canvas.draw()
+    # Only the layout is needed to find the outline, so avoid a full draw
+    ax.apply_aspect()
     ax.xaxis.set_major_formatter(ticks.LONGITUDE_FORMATTER)
     ax.yaxis.set_major_formatter(ticks.LATITUDE_FORMATTER)
     with warnings.catch_warnings():
@@ -504,25 +529,94 @@ def add_gridlabels(
         ticks.draw_yticks(ax, lats, side=lat_side)
 
 
+# State of the most recently created map. Maps created by pyseas also keep
+# their own copy on the axes (see `map_state`), which should be preferred
+# since these globals are shared between figures and threads.
 _last_projection = None
 _last_extent = None
 _plot_cycler = None
 
 
-def _process_map_args(projection, extent):
+def map_state(ax=None):
+    """Return the state pyseas keeps for a map
+
+    Parameters
+    ----------
+    ax : Axes, optional
+        If `ax` was not created by pyseas, or is None, the state of the most
+        recently created map is returned.
+
+    Returns
+    -------
+    dict
+        With keys 'projection', 'extent', 'plot_cycler', 'gridlines' and
+        'style'.
+    """
+    state = getattr(ax, "_pyseas_state", None)
+    if state is None:
+        state = {
+            "projection": _last_projection,
+            "extent": _last_extent,
+            "plot_cycler": _plot_cycler,
+            "gridlines": _current_gridlines,
+            "style": None,
+        }
+    return state
+
+
+def map_style(ax=None):
+    """Return the style used by a map
+
+    Parameters
+    ----------
+    ax : Axes, optional
+
+    Returns
+    -------
+    MapStyle or RcParams
+        The style passed when creating `ax`, or `plt.rcParams` if there was
+        none, so that the style is read at the time each feature is added.
+    """
+    style = map_state(ax)["style"]
+    return plt.rcParams if (style is None) else style
+
+
+def set_current_axes(ax):
+    """Make `ax` the current pyplot axes if its figure is managed by pyplot
+
+    Figures built without pyplot (see `renderer`) have no manager and are
+    left alone, so this is safe to call from code that may draw on either.
+
+    Parameters
+    ----------
+    ax : Axes
+    """
+    if ax.figure.canvas.manager is not None:
+        plt.sca(ax)
+
+
+def _process_map_args(projection, extent, style):
     global _last_projection, _last_extent, _plot_cycler
+    styles.register_fonts()
     if isinstance(projection, (str, ProjectionInfo)):
         if extent is None:
             extent = get_extent(projection)
-        _last_projection = projection
+        name = projection
         projection = get_projection(projection)
     else:
-        _last_projection = projection
-    _last_extent = extent
-    _plot_cycler = plt.rcParams.get(
+        name = projection
+    plot_cycler = (plt.rcParams if (style is None) else style).get(
         "pyseas.map.trackprops", styles._dark_artist_cycler
     )()
-    return projection, extent
+    _last_projection, _last_extent, _plot_cycler = name, extent, plot_cycler
+    state = {
+        "projection": name,
+        "extent": extent,
+        "plot_cycler": plot_cycler,
+        "gridlines": None,
+        "style": style,
+    }
+    return projection, extent, state
 
 
 def _set_ax_background(ax, color):
@@ -534,8 +628,9 @@ def _set_ax_background(ax, color):
         ax.set_facecolor(color)
 
 
-def _setup_map_axes(ax, bg_color, extent, hide_axes):
-    bg_color = bg_color or plt.rcParams.get(
+def _setup_map_axes(ax, bg_color, extent, hide_axes, state):
+    ax._pyseas_state = dict(state)
+    bg_color = bg_color or map_style(ax).get(
         "pyseas.ocean.color", props.dark.ocean.color
     )
     _set_ax_background(ax, bg_color)
@@ -553,6 +648,8 @@ def create_map(
     extent=None,
     bg_color=None,
     hide_axes=True,
+    fig=None,
+    style=None,
 ):
     """Draw a GFW themed map
 
@@ -564,19 +661,29 @@ def create_map(
     bg_color : str or tuple, optional
     hide_axes : bool, optional
         if `true`, hide x and y axes
+    fig : Figure, optional
+        Figure to add the map to. If given, pyplot is not used, so the figure
+        need not be managed by pyplot (see `renderer`).
+    style : MapStyle, optional
+        Style used for this map, instead of reading `plt.rcParams` whenever
+        a feature is added. Use this to render maps with different styles
+        concurrently.
 
     Returns
     -------
     GeoAxes
     """
-    projection, extent = _process_map_args(projection, extent)
+    projection, extent, state = _process_map_args(projection, extent, style)
 
     if not isinstance(subplot, tuple):
         # Allow grridspec to be passed through
         subplot = (subplot,)
 
-    ax = plt.subplot(*subplot, projection=projection)
-    _setup_map_axes(ax, bg_color, extent, hide_axes)
+    if fig is None:
+        ax = plt.subplot(*subplot, projection=projection)
+    else:
+        ax = fig.add_subplot(*subplot, projection=projection)
+    _setup_map_axes(ax, bg_color, extent, hide_axes, state)
 
     return ax
 
@@ -589,6 +696,8 @@ def create_maps(
     extent=None,
     bg_color=None,
     hide_axes=True,
+    fig=None,
+    style=None,
     **kwargs,
 ):
     """Create multiple maps similarly to plt.subplots
@@ -602,25 +711,35 @@ def create_maps(
     bg_color : str or tuple, optional
     hide_axes : bool, optional
         if `true`, hide x and y axes
+    fig : Figure, optional
+        Figure to add the maps to. If given, pyplot is not used (see
+        `create_map`).
+    style : MapStyle, optional
+        Style used for these maps. See `create_map`.
 
     Other Parameters
     ----------------
-    Keyword args are passed on to plt.subplots.
+    Keyword args are passed on to plt.subplots, or to `Figure.subplots` if
+    `fig` is given, in which case figure keywords such as `figsize` are not
+    accepted.
 
     Returns
     -------
     fig : plt.Figure
     ax : GeoAxes or array of GeoAxes
     """
-    projection, extent = _process_map_args(projection, extent)
+    projection, extent, state = _process_map_args(projection, extent, style)
 
     if "subplot_kw" not in kwargs:
         kwargs["subplot_kw"] = {}
     kwargs["subplot_kw"]["projection"] = projection
 
-    fig, axes = plt.subplots(nrows, ncols, squeeze=False, **kwargs)
+    if fig is None:
+        fig, axes = plt.subplots(nrows, ncols, squeeze=False, **kwargs)
+    else:
+        axes = fig.subplots(nrows, ncols, squeeze=False, **kwargs)
     for ax in axes.flatten():
-        _setup_map_axes(ax, bg_color, extent, hide_axes)
+        _setup_map_axes(ax, bg_color, extent, hide_axes, state)
 
     axes = axes[0, 0] if (axes.size == 1) else np.squeeze(axes)
 
@@ -638,8 +757,9 @@ def add_logo(
 
     Parameters
     ----------
-    logo : array
-        2D or 3D array suitable for imshow
+    logo : array or str, optional
+        2D or 3D array suitable for imshow, or a path suitable for
+        `styles.get_logo`. Defaults to the value of `pyseas.logo`.
     scale : float, optional
         Additional scaling to apply to image.
     loc : str or (float, float), optional
@@ -659,14 +779,19 @@ def add_logo(
     -------
     OffsetBox
     """
+    if ax is None:
+        ax = plt.gca()
+    style = map_style(ax)
     if logo is None:
-        logo = plt.rcParams.get("pyseas.logo", styles.dark["pyseas.logo"])
-        scale_adj = plt.rcParams.get(
+        logo = style.get("pyseas.logo", styles.dark["pyseas.logo"])
+        scale_adj = style.get(
             "pyseas.logo.scale_adj", styles.dark["pyseas.logo.scale_adj"]
         )
     else:
         scale_adj = 1
-    is_global = isinstance(_last_projection, str) and _last_projection.startswith(
+    logo = styles.get_logo(logo)
+    map_projection = map_state(ax)["projection"]
+    is_global = isinstance(map_projection, str) and map_projection.startswith(
         "global."
     )
     box_alignment = (0.5, 0.5)
@@ -689,9 +814,7 @@ def add_logo(
     # set explicitly, while assuring that a scale of 1 isn't crazy. scale_adj should be two for GFW logo
     base_scale = scale_adj * 324368.0 / (logo.shape[0] * logo.shape[1])
     if alpha is None:
-        alpha = plt.rcParams.get("pyseas.logo.alpha", 1)
-    if ax is None:
-        ax = plt.gca()
+        alpha = style.get("pyseas.logo.alpha", 1)
 
     imagebox = mplobox.OffsetImage(logo, zoom=scale * base_scale, alpha=alpha)
     if isinstance(loc, str):
@@ -717,6 +840,7 @@ def add_miniglobe(
     central_marker=None,
     marker_size=16,
     marker_color=None,
+    scale="auto",
 ):
     """Add a mini globe to a corner of the maps showing where the primary map is located.
 
@@ -741,6 +865,9 @@ def add_miniglobe(
         no marker.
     marker_size : int, optional
     marker_color : matplotlib color spec, optional
+    scale : str, optional
+        Resolution of NaturalEarth land to use. By default chosen based on the
+        size of the mini globe.
 
     Returns
     -------
@@ -786,7 +913,9 @@ def add_miniglobe(
         raise ValueError('illegal `loc`: "{}"'.format(loc))
     dx = x1 - x0
     dy = y1 - y0
-    ortho = cartopy.crs.Orthographic(central_latitude=lat, central_longitude=lon)
+    ortho = make_projection(
+        cartopy.crs.Orthographic, central_latitude=lat, central_longitude=lon
+    )
     inset = ax.inset_axes(
         (
             loc_x - (loc_x - sgn_x * offset) * size * max(dy, dx) / dx,
@@ -797,17 +926,21 @@ def add_miniglobe(
         projection=ortho,
         label=uuid.uuid1().hex
     )
+    style = map_style(ax)
+    inset._pyseas_state = dict(
+        map_state(ax), projection=ortho, extent=None, gridlines=None
+    )
     # Create the mini globe, with continents
     # inset = plt.axes([0, 0, 1, 1], projection=ortho, label=uuid.uuid1().hex)
-    bg_color = plt.rcParams.get("pyseas.ocean.color", props.dark.ocean.color)
+    bg_color = style.get("pyseas.ocean.color", props.dark.ocean.color)
     _set_ax_background(inset, bg_color)
-    add_land(ax=inset, edgecolor="none"),
+    add_land(ax=inset, scale=scale, edgecolor="none"),
 
     inset.set_global()
 
     if central_marker is not None:
         if marker_color is None:
-            marker_color = plt.rcParams["axes.edgecolor"]
+            marker_color = style["axes.edgecolor"]
         inset.plot(
             lon,
             lat,
@@ -821,7 +954,7 @@ def add_miniglobe(
         add_minimap_aoi(ax, inset)
 
     # Restore primary map as current axes
-    plt.sca(ax)
+    set_current_axes(ax)
 
     return inset
 
@@ -845,8 +978,9 @@ def add_minimap_aoi(from_ax, to_ax):
 
     # Step 1: Build the primary map boundary in `proj` coordinates. It is
     # a rectangle there, so this is straightforward.
+    style = map_style(ax)
     x0, x1, y0, y1 = ax.get_extent(crs=proj)
-    n = plt.rcParams.get(
+    n = style.get(
         "pyseas.miniglobe.ptsperside", props.dark.miniglobe.pts_per_side
     )
     xs = np.r_[
@@ -909,10 +1043,10 @@ def add_minimap_aoi(from_ax, to_ax):
         np.array([y for (x, y) in inside_data_primary]),
     )[:, :2]
     poly = shapely.geometry.Polygon(outside_data, [inside_data[::-1]])
-    hlc = plt.rcParams.get(
+    hlc = style.get(
         "pyseas.miniglobe.overlaycolor", props.dark.miniglobe.overlaycolor
     )
-    inner_width = plt.rcParams.get(
+    inner_width = style.get(
         "pyseas.miniglobe.innerwidth", props.dark.miniglobe.inner_width
     )
 
@@ -924,17 +1058,17 @@ def add_minimap_aoi(from_ax, to_ax):
             ortho,
             facecolor=(0, 0, 0, 0),
             linewidth=inner_width,
-            edgecolor=plt.rcParams["axes.edgecolor"],
+            edgecolor=style["axes.edgecolor"],
         )
 
-    outer_width = plt.rcParams.get(
+    outer_width = style.get(
         "pyseas.miniglobe.outer_width", props.dark.miniglobe.outer_width
     )
     inset.spines["geo"].set_linewidth(outer_width)
-    inset.spines["geo"].set_edgecolor(plt.rcParams["axes.edgecolor"])
+    inset.spines["geo"].set_edgecolor(style["axes.edgecolor"])
 
     # Restore primary map as current axes
-    plt.sca(ax)
+    set_current_axes(ax)
 
 
 def plot_raster(
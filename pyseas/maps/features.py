@@ -0,0 +1,587 @@
+"""Cached, preprojected Natural Earth features
+
+Cartopy reprojects the full global geometry of a feature for every new axes it
+is drawn on. For the 10m land polygons that is the largest fixed cost when
+drawing many maps. The features defined here instead keep the projected,
+clipped geometries in an in-memory LRU cache keyed on
+(category, name, scale, projection, extent), and optionally on disk, so
+repeated maps with the same projection and extent skip projection entirely.
+
+The geometries are looked up when the map is drawn, using the extent the map
+has at that point, so changing the extent after adding a feature works as
+expected. Source geometries are held in an STRtree, built once per feature, so
+only geometries near the map extent are clipped and projected.
+
+Passing `scale="auto"` picks the coarsest Natural Earth scale that still
+looks right at the map's resolution; see `select_scale`.
+
+EEZ boundaries are converted once from the shipped GeoPackage to GeoParquet
+in the pyseas cache directory, which is much faster to load and allows the
+`LINE_TYPE` filtering to happen while reading; see `load_eezs`. They are
+drawn through the same projection cache as the Natural Earth features, with
+optional simplification matched to the map's resolution.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import warnings
+import weakref
+from abc import abstractmethod
+
+import cartopy.crs
+import cartopy.feature as cfeature
+import cartopy.geodesic as cgeo
+import numpy as np
+import shapely
+
+from ..util import LRUCache, cache_dir, lon_avg
+
+identity = cartopy.crs.PlateCarree()
+
+# Extents are padded by this fraction of their size before clipping so that
+# the artificial edges created by clipping fall outside of the map.
+CLIP_PADDING = 0.05
+# Additional padding, in degrees, applied to lon/lat boxes
+LONLAT_PADDING = 1.0
+# Number of points per side used to sample the map extent
+EXTENT_SAMPLES = 16
+
+# (metres per pixel, scale) pairs used by `select_scale`. The coarsest scale
+# whose threshold is exceeded is used, otherwise "10m".
+AUTO_SCALES = [(30000.0, "110m"), (6000.0, "50m")]
+
+root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+EEZ_PATH = os.path.join(root, "pyseas/data/eezs/eez_boundaries_v11.gpkg")
+
+_projected = LRUCache(64)
+_indices = LRUCache(16)
+# Held while building a spatial index, so concurrent maps build each one once
+_index_lock = threading.Lock()
+_eezs = LRUCache(8)
+_eez_indices = LRUCache(8)
+
+# Set to True to also store projected geometries under `util.cache_dir()`
+use_disk_cache = False
+
+
+def set_memory_cache_size(n):
+    """Set the number of projected geometry sets kept in memory"""
+    _projected.maxsize = n
+
+
+def _projection_key(projection):
+    return (type(projection).__name__, projection.proj4_init)
+
+
+def _extent_key(extent):
+    if extent is None:
+        return None
+    return tuple(float(x) for x in np.round(extent, 3))
+
+
+def _disk_path(key):
+    digest = hashlib.sha1(repr(key).encode("utf8")).hexdigest()
+    return cache_dir("features") / f"{digest}.npz"
+
+
+def _atomic_write(path, write):
+    """Call `write(tmp_path)` then move the result to `path`
+
+    The move is atomic, so concurrent processes never see a partial file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _save_geometries(path, geoms):
+    wkbs = shapely.to_wkb(np.asarray(geoms, dtype=object))
+    offsets = np.cumsum([0] + [len(x) for x in wkbs])
+    data = np.frombuffer(b"".join(wkbs), dtype=np.uint8)
+
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f:
+            np.savez(f, offsets=offsets, data=data)
+
+    _atomic_write(path, write)
+
+
+def _load_geometries(path):
+    with np.load(path) as npz:
+        offsets = npz["offsets"]
+        data = npz["data"].tobytes()
+    wkbs = [data[i0:i1] for (i0, i1) in zip(offsets[:-1], offsets[1:])]
+    return list(shapely.from_wkb(wkbs))
+
+
+class GeometryIndex(object):
+    """Spatial index over a set of lon/lat geometries
+
+    Parameters
+    ----------
+    geoms : sequence of shapely geometries
+    """
+
+    def __init__(self, geoms):
+        self.geoms = np.asarray(list(geoms), dtype=object)
+        self.tree = shapely.STRtree(self.geoms)
+
+    def query(self, boxes):
+        """Return indices of geometries intersecting any of `boxes`
+
+        Parameters
+        ----------
+        boxes : sequence of (lon0, lat0, lon1, lat1)
+
+        Returns
+        -------
+        array of int
+        """
+        if not boxes:
+            return np.zeros([0], dtype=int)
+        indices = [self.tree.query(shapely.box(*x)) for x in boxes]
+        return np.unique(np.concatenate(indices))
+
+    def clipped(self, boxes):
+        """Return geometries intersecting `boxes`, clipped to those boxes
+
+        Geometries that span more than one box are split into one piece per box.
+        """
+        pieces = []
+        for box in boxes:
+            geoms = self.geoms[self.tree.query(shapely.box(*box))]
+            # clip_by_rect is faster but may return invalid polygons, which
+            # leave fill artifacts once projected
+            clipped = shapely.intersection(geoms, shapely.box(*box))
+            pieces.extend(clipped[~shapely.is_empty(clipped)])
+        return pieces
+
+
+def _source_index(category, name, scale):
+    key = (category, name, scale)
+    index = _indices.get(key)
+    if index is None:
+        with _index_lock:
+            index = _indices.get(key)
+            if index is None:
+                source = cfeature.NaturalEarthFeature(category, name, scale)
+                index = GeometryIndex(source.geometries())
+                _indices[key] = index
+    return index
+
+
+def _pad(extent, frac):
+    x0, x1, y0, y1 = extent
+    dx = frac * (x1 - x0)
+    dy = frac * (y1 - y0)
+    return (x0 - dx, x1 + dx, y0 - dy, y1 + dy)
+
+
+def lonlat_boxes(projection, extent):
+    """Find lon/lat boxes covering a projected extent
+
+    Parameters
+    ----------
+    projection : cartopy.crs.Projection
+    extent : 4-tuple of float
+        (x0, x1, y0, y1) in projected coordinates.
+
+    Returns
+    -------
+    list of (lon0, lat0, lon1, lat1) or None
+        Boxes never cross the dateline, so there are two boxes when the extent
+        does. None is returned when the extent can't be bounded, for instance
+        when it extends past the edge of the projection.
+    """
+    x0, x1, y0, y1 = extent
+    xs, ys = np.meshgrid(
+        np.linspace(x0, x1, EXTENT_SAMPLES), np.linspace(y0, y1, EXTENT_SAMPLES)
+    )
+    lonlat = identity.transform_points(projection, xs.ravel(), ys.ravel())[:, :2]
+    if not np.isfinite(lonlat).all():
+        return None
+    lons, lats = lonlat.T
+    lat0 = max(lats.min() - LONLAT_PADDING, -90)
+    lat1 = min(lats.max() + LONLAT_PADDING, 90)
+
+    # Measure longitudes relative to the center of the extent so that
+    # extents crossing the dateline stay contiguous.
+    lon_c = lon_avg(lons)
+    rel = (lons - lon_c + 180) % 360 - 180
+    lon0 = lon_c + rel.min() - LONLAT_PADDING
+    lon1 = lon_c + rel.max() + LONLAT_PADDING
+
+    for pole_lat in (-90, 90):
+        px, py = projection.transform_point(0, pole_lat, identity)
+        if np.isfinite(px) and x0 <= px <= x1 and y0 <= py <= y1:
+            # A pole is visible so all longitudes are
+            lon0, lon1 = -180, 180
+            lat0, lat1 = min(lat0, pole_lat), max(lat1, pole_lat)
+
+    if lon1 - lon0 >= 360:
+        return [(-180, lat0, 180, lat1)]
+    shift = 360 * np.floor((lon0 + 180) / 360)
+    lon0 -= shift
+    lon1 -= shift
+    if lon1 <= 180:
+        return [(lon0, lat0, lon1, lat1)]
+    return [(lon0, lat0, 180, lat1), (-180, lat0, lon1 - 360, lat1)]
+
+
+def _project(index, projection, extent, tolerance=0):
+    if extent is None:
+        geoms = index.geoms
+    else:
+        extent = _pad(extent, CLIP_PADDING)
+        boxes = lonlat_boxes(projection, extent)
+        geoms = index.geoms if (boxes is None) else index.clipped(boxes)
+    projected = [projection.project_geometry(x, identity) for x in geoms]
+    projected = np.asarray([x for x in projected if not x.is_empty], dtype=object)
+    if extent is not None and len(projected):
+        x0, x1, y0, y1 = extent
+        projected = shapely.intersection(projected, shapely.box(x0, y0, x1, y1))
+        projected = projected[~shapely.is_empty(projected)]
+    if tolerance and len(projected):
+        projected = shapely.simplify(projected, tolerance, preserve_topology=True)
+    return list(projected)
+
+
+def _cached_projection(
+    source_key, get_index, projection, extent, tolerance=0, disk_source_key=None
+):
+    extent_key = _extent_key(extent)
+    key_suffix = (_projection_key(projection), extent_key, tolerance)
+    key = source_key + key_suffix
+    geoms = _projected.get(key)
+    if geoms is None:
+        path = None
+        if use_disk_cache:
+            # The disk cache may need a more expensive key, e.g. one that
+            # identifies the contents of a file, so only find it on a miss
+            if disk_source_key is not None:
+                source_key = disk_source_key()
+            path = _disk_path(source_key + key_suffix)
+        if path is not None and path.exists():
+            geoms = _load_geometries(path)
+        else:
+            geoms = _project(get_index(), projection, extent_key, tolerance)
+            if path is not None:
+                _save_geometries(path, geoms)
+        _projected[key] = geoms
+    return geoms
+
+
+def projected_geometries(category, name, scale, projection, extent=None):
+    """Return Natural Earth geometries projected to `projection`, clipped to `extent`
+
+    Parameters
+    ----------
+    category, name, scale : str
+        See `cartopy.feature.NaturalEarthFeature`.
+    projection : cartopy.crs.Projection
+    extent : 4-tuple of float or None, optional
+        (x0, x1, y0, y1) in projected coordinates. If None, the geometries
+        are not clipped.
+
+    Returns
+    -------
+    list of shapely geometries
+    """
+    return _cached_projection(
+        (category, name, scale),
+        lambda: _source_index(category, name, scale),
+        projection,
+        extent,
+    )
+
+
+def select_scale(projection, extent, width_px):
+    """Choose a Natural Earth scale appropriate for a map's resolution
+
+    Parameters
+    ----------
+    projection : cartopy.crs.Projection
+    extent : 4-tuple of float
+        (x0, x1, y0, y1) in projected coordinates.
+    width_px : float
+        Width of the map in pixels.
+
+    Returns
+    -------
+    str
+        One of '10m', '50m' or '110m'. '10m' is returned if the resolution
+        can't be determined.
+    """
+    if extent is None or not width_px > 0:
+        return "10m"
+    x0, x1, y0, y1 = extent
+    # Measure across the middle of the map, since the edges of global maps
+    # may lie outside the projection.
+    xs = np.array([0.4 * x1 + 0.6 * x0, 0.6 * x1 + 0.4 * x0])
+    ys = np.array([0.5 * (y0 + y1)] * 2)
+    lonlat = identity.transform_points(projection, xs, ys)[:, :2]
+    if not np.isfinite(lonlat).all():
+        return "10m"
+    dist = np.asarray(cgeo.Geodesic().inverse(lonlat[0], lonlat[1]))[0, 0]
+    m_per_px = dist / (0.2 * width_px)
+    for threshold, scale in AUTO_SCALES:
+        if m_per_px >= threshold:
+            return scale
+    return "10m"
+
+
+class _ProjectedFeature(cfeature.Feature):
+    """Base class for features whose geometries are cached in map coordinates
+
+    Subclasses implement `_geometries(extent)`. `cartopy.feature.Feature` is
+    an abstract base class, so subclasses that don't can't be instantiated.
+    """
+
+    def __init__(self, projection, ax=None, **kwargs):
+        super().__init__(projection, **kwargs)
+        self._axes = None if (ax is None) else weakref.ref(ax)
+
+    def _width_px(self):
+        ax = None if (self._axes is None) else self._axes()
+        return 0 if (ax is None) else ax.bbox.width
+
+    @abstractmethod
+    def _geometries(self, extent):
+        """Return the geometries clipped to `extent`, or all of them if None"""
+
+    def geometries(self):
+        return iter(self._geometries(None))
+
+    def intersecting_geometries(self, extent):
+        return iter(self._geometries(extent))
+
+
+class CachedNaturalEarthFeature(_ProjectedFeature):
+    """Natural Earth feature that is projected and clipped by pyseas
+
+    The feature is created in the projection of the map it will be drawn on,
+    so cartopy draws the cached geometries without reprojecting them.
+
+    Parameters
+    ----------
+    category, name : str
+        See `cartopy.feature.NaturalEarthFeature`.
+    scale : str
+        '10m', '50m', '110m' or 'auto'. If 'auto', `ax` is required and the
+        scale is chosen when drawing using `select_scale`.
+    projection : cartopy.crs.Projection
+        Projection of the map this feature will be added to.
+    ax : GeoAxes, optional
+        Map this feature will be added to.
+
+    Other Parameters
+    ----------------
+    Keyword args are used as styling for the feature.
+    """
+
+    def __init__(self, category, name, scale, projection, ax=None, **kwargs):
+        super().__init__(projection, ax, **kwargs)
+        if scale == "auto" and ax is None:
+            raise ValueError("`ax` must be specified when scale is 'auto'")
+        self.category = category
+        self.name = name
+        self.scale = scale
+
+    def _geometries(self, extent):
+        scale = self.scale
+        if scale == "auto":
+            scale = select_scale(self.crs, extent, self._width_px())
+        return projected_geometries(self.category, self.name, scale, self.crs, extent)
+
+
+def _filter_key(values):
+    return None if (values is None) else tuple(sorted(values))
+
+
+def _eez_cache_path(path):
+    stat = os.stat(path)
+    tag = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    digest = hashlib.sha1(tag.encode("utf8")).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(path))[0]
+    return cache_dir("eezs") / f"{name}-{digest}.parquet"
+
+
+def _read_gpkg(path, include, exclude):
+    import geopandas as gpd
+
+    clauses = []
+    for op, values in [("IN", include), ("NOT IN", exclude)]:
+        if values is not None:
+            quoted = ", ".join("'{}'".format(x.replace("'", "''")) for x in values)
+            clauses.append(f"LINE_TYPE {op} ({quoted})")
+    where = " AND ".join(clauses) if clauses else None
+    with warnings.catch_warnings():
+        # Suppress useless RuntimeWarning from geopandas when reading EEZs
+        warnings.simplefilter("ignore")
+        return gpd.read_file(path, columns=["LINE_TYPE"], where=where)
+
+
+def _read_parquet(path, include, exclude):
+    import geopandas as gpd
+
+    filters = []
+    if include is not None:
+        filters.append(("LINE_TYPE", "in", list(include)))
+    if exclude is not None:
+        filters.append(("LINE_TYPE", "not in", list(exclude)))
+    return gpd.read_parquet(path, filters=filters or None, memory_map=True)
+
+
+def load_eezs(path=EEZ_PATH, include=None, exclude=None):
+    """Load EEZ boundaries, using a GeoParquet copy from the cache directory
+
+    The first call in any process converts `path` to GeoParquet under
+    `util.cache_dir()`; later loads memory map that file. Results are also
+    kept in a small per-process cache.
+
+    Parameters
+    ----------
+    path : str, optional
+        GeoPackage containing EEZ boundaries with a `LINE_TYPE` column.
+    include : set-like, optional
+        If set, only load lines whose `LINE_TYPE` is in `include`.
+    exclude : set-like, optional
+        If set, skip lines whose `LINE_TYPE` is in `exclude`.
+
+    Returns
+    -------
+    GeoDataFrame
+        With `LINE_TYPE` and `geometry` columns.
+    """
+    key = (path, _filter_key(include), _filter_key(exclude))
+    eezs = _eezs.get(key)
+    if eezs is not None:
+        return eezs
+    try:
+        cache_path = _eez_cache_path(path)
+    except FileNotFoundError:
+        raise FileNotFoundError(
+            "Eezs must be installed into the `pyseas/data/` directory"
+        )
+    try:
+        if not cache_path.exists():
+            _atomic_write(cache_path, _read_gpkg(path, None, None).to_parquet)
+        eezs = _read_parquet(cache_path, include, exclude)
+    except ImportError:
+        # pyarrow is not available, so read directly from the GeoPackage
+        eezs = _read_gpkg(path, include, exclude)
+    _eezs[key] = eezs
+    return eezs
+
+
+def eez_index(path=EEZ_PATH, include=None, exclude=None):
+    """Return a `GeometryIndex` over EEZ boundaries
+
+    See `load_eezs` for a description of the parameters.
+    """
+    key = (path, _filter_key(include), _filter_key(exclude))
+    index = _eez_indices.get(key)
+    if index is None:
+        with _index_lock:
+            index = _eez_indices.get(key)
+            if index is None:
+                index = GeometryIndex(load_eezs(path, include, exclude).geometry)
+                _eez_indices[key] = index
+    return index
+
+
+def projected_eezs(
+    projection, extent=None, path=EEZ_PATH, include=None, exclude=None, tolerance=0
+):
+    """Return EEZ boundaries projected to `projection`, clipped to `extent`
+
+    Parameters
+    ----------
+    projection : cartopy.crs.Projection
+    extent : 4-tuple of float or None, optional
+        (x0, x1, y0, y1) in projected coordinates. If None, the boundaries
+        are not clipped.
+    path, include, exclude : optional
+        See `load_eezs`.
+    tolerance : float, optional
+        If nonzero, simplify the projected boundaries with this tolerance,
+        in projected coordinates.
+
+    Returns
+    -------
+    list of shapely geometries
+    """
+    filters = (_filter_key(include), _filter_key(exclude))
+    # Checking the file on every draw is slow, so the in-memory cache is keyed
+    # on the path and only the disk cache on the file's size and mtime
+    return _cached_projection(
+        ("eez", os.path.abspath(path)) + filters,
+        lambda: eez_index(path, include, exclude),
+        projection,
+        extent,
+        tolerance,
+        disk_source_key=lambda: ("eez", _eez_cache_path(path).name) + filters,
+    )
+
+
+class CachedEEZFeature(_ProjectedFeature):
+    """EEZ boundaries that are filtered, projected and clipped by pyseas
+
+    Parameters
+    ----------
+    projection : cartopy.crs.Projection
+        Projection of the map this feature will be added to.
+    ax : GeoAxes, optional
+        Map this feature will be added to. Required if `simplify` is set.
+    path, include, exclude : optional
+        See `load_eezs`.
+    simplify : bool or float, optional
+        If set, simplify boundaries with a tolerance of this many pixels,
+        or half a pixel if True.
+
+    Other Parameters
+    ----------------
+    Keyword args are used as styling for the feature.
+    """
+
+    def __init__(
+        self,
+        projection,
+        ax=None,
+        path=EEZ_PATH,
+        include=None,
+        exclude=None,
+        simplify=None,
+        **kwargs,
+    ):
+        super().__init__(projection, ax, **kwargs)
+        if simplify and ax is None:
+            raise ValueError("`ax` must be specified when simplifying")
+        self.path = path
+        self.include = include
+        self.exclude = exclude
+        self.simplify = 0.5 if (simplify is True) else simplify
+
+    def _tolerance(self, extent):
+        width_px = self._width_px()
+        if not self.simplify or extent is None or not width_px > 0:
+            return 0
+        tolerance = self.simplify * (extent[1] - extent[0]) / width_px
+        # Round so that nearly identical maps share cache entries
+        return float(f"{tolerance:.2g}")
+
+    def _geometries(self, extent):
+        return projected_eezs(
+            self.crs,
+            extent,
+            self.path,
+            self.include,
+            self.exclude,
+            self._tolerance(extent),
+        )
@@ -1,9 +1,14 @@
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
-import pandas as pd
-from datetime import datetime, timedelta
+import numpy as np
+from matplotlib.collections import PolyCollection
 from ..util import asarray, lon_avg, is_sorted
 from .. import props
+from . import core
+
+# Night is taken to be from 18:00 to 06:00 local solar time, in days
+NIGHT_START = 0.75
+NIGHT_LENGTH = 0.5
 
 
 def hour_offset(lons):
@@ -13,7 +18,43 @@ def hour_offset(lons):
     return (lon0 / 180) * 12
 
 
-def add_shades(timestamp, lon, ax=None, color=None, alpha=None):
+def night_spans(times, lon, t0, t1):
+    """Find the nights between two times along a track
+
+    Local solar time is UTC offset by `lon / 15` hours, with `lon` interpolated
+    along the (unwrapped) track and held constant beyond its ends.
+
+    Parameters
+    ----------
+    times : array of float
+        Times of the track positions as matplotlib date numbers.
+    lon : array of float
+    t0, t1 : float
+        Bounds of the time range as matplotlib date numbers.
+
+    Returns
+    -------
+    starts, stops : arrays of float
+        Night spans, clipped to (t0, t1), as matplotlib date numbers. Empty
+        if the track has no positions.
+    """
+    if len(times) == 0:
+        return np.empty(0), np.empty(0)
+    lon = np.degrees(np.unwrap(np.radians(lon)))
+    inside = (times > t0) & (times < t1)
+    ts = np.concatenate([[t0], times[inside], [t1]])
+    # Local solar time in days, which should only ever increase
+    local = np.maximum.accumulate(ts + np.interp(ts, times, lon) / 360)
+    first = np.floor(local[0] - NIGHT_START - NIGHT_LENGTH)
+    last = np.ceil(local[-1] - NIGHT_START)
+    local_starts = np.arange(first, last + 1) + NIGHT_START
+    starts = np.interp(local_starts, local, ts)
+    stops = np.interp(local_starts + NIGHT_LENGTH, local, ts)
+    keep = stops > starts
+    return starts[keep], stops[keep]
+
+
+def add_shades(timestamp, lon, ax=None, color=None, alpha=None, style=None):
     """Overlay colored rectangles, corresponding to night, on the current plot
 
     Overlays gray regions, corresponding to night, to the current plot,
@@ -27,50 +68,34 @@ def add_shades(timestamp, lon, ax=None, color=None, alpha=None):
         Taken from 'pyseas.nightshade.color' if not specified.
     alpha : float, optional
         Taken from 'pyseas.nightshade.alpha' if not specified.
+    style : MapStyle, optional
+        Style to take the defaults from. Defaults to the style of `ax` if it
+        was created by pyseas, otherwise `plt.rcParams`.
+
+    Returns
+    -------
+    PolyCollection
     """
     timestamp, lon = (asarray(x) for x in (timestamp, lon))
     if not is_sorted(timestamp):
         raise ValueError('inputs must be sorted by time')
     if ax is None:
         ax = plt.gca()
+    if style is None:
+        style = core.map_style(ax)
     if color is None:
-        color = plt.rcParams.get('pyseas.nightshade.color', props.chart.nightshade.color)
+        color = style.get('pyseas.nightshade.color', props.chart.nightshade.color)
     if alpha is None:
-        alpha = alpha=plt.rcParams.get('pyseas.nightshade.alpha', props.chart.nightshade.alpha)
-    min_dt, max_dt = [mdates.num2date(x).replace(tzinfo=None) for x in ax.get_xlim()]
-
-    timestamp = pd.to_datetime(asarray(timestamp)).to_pydatetime()
-    lon = asarray(lon)
-
-    mask = [(timestamp[0] <= x <= 
-            (timestamp[0] + timedelta(hours=1))) for x in timestamp]
-    
-    # (min_dt <= timestamp) & (timestamp <= min_dt + timedelta(hours=1))
-    osh = hour_offset(lon[mask])
-    os_min_dt = min_dt + timedelta(hours=osh)
-    # TODO: check this logic
-    if os_min_dt.hour < 6:
-        start = (datetime(os_min_dt.year, os_min_dt.month, os_min_dt.day, tzinfo=None)
-                     - timedelta(hours=6 + osh))
-    else:
-        start = (datetime(os_min_dt.year, os_min_dt.month, os_min_dt.day, tzinfo=None) 
-                     + timedelta(hours=18 - osh))
-    while start < max_dt:
-        stop = start + timedelta(hours=12)
-        
-        adj_start = min_dt if (start < min_dt) else start
-        if stop > max_dt:
-            stop = max_dt
-        ax.axvspan(mdates.date2num(adj_start), mdates.date2num(stop), 
-                        alpha=alpha, facecolor=color, edgecolor='none')
-        start += timedelta(hours=24)
-        mask = (start <= timestamp) & (timestamp <= start + timedelta(hours=1))
-        if mask.sum():
-            new_osh = hour_offset(lon[mask])
-            delta = new_osh - osh
-            # Chose shorter delta if possible
-            delta = (delta + 12) % 24 - 12
-            start -= timedelta(hours=delta)
-            osh = new_osh
+        alpha = style.get('pyseas.nightshade.alpha', props.chart.nightshade.alpha)
+    t0, t1 = ax.get_xlim()
+    times = mdates.date2num(timestamp)
 
-        ax.set_xlim(min_dt, max_dt)
\ No newline at end of file
+    starts, stops = night_spans(times, lon, t0, t1)
+    xs = np.stack([starts, starts, stops, stops], axis=1)
+    ys = np.broadcast_to([0, 1, 1, 0], xs.shape)
+    verts = np.stack([xs, ys], axis=-1)
+    shades = PolyCollection(verts, transform=ax.get_xaxis_transform(),
+                            facecolor=color, edgecolor='none', alpha=alpha)
+    ax.add_collection(shades, autolim=False)
+    ax.set_xlim(t0, t1)
+    return shades
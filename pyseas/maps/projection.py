@@ -1,9 +1,11 @@
+import functools
 import json
 import os
 from collections import namedtuple
 
 import cartopy.crs
 import numpy as np
+import pandas as pd
 
 from ..util import asarray, lon_avg
 
@@ -32,11 +34,44 @@ def load_projections():
 projection_info = load_projections()
 
 
+def _hashable(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(x) for x in value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+@functools.lru_cache(maxsize=128)
+def _interned_projection(cls, args):
+    return cls(**dict(args))
+
+
+def make_projection(cls, **kwargs):
+    """Create a cartopy projection, reusing an existing instance if possible
+
+    Cartopy caches boundaries and transforms on each projection instance, so
+    sharing instances between maps keeps those caches, as well as those in
+    `features`, warm.
+
+    Parameters
+    ----------
+    cls : subclass of cartopy.crs.Projection
+    kwargs : arguments used to construct `cls`
+
+    Returns
+    -------
+    cartopy.crs.Projection
+    """
+    args = tuple(sorted((k, _hashable(v)) for (k, v) in kwargs.items()))
+    return _interned_projection(cls, args)
+
+
 def get_projection(projinfo):
     if isinstance(projinfo, ProjectionInfo):
         return projinfo.projection
     info = projection_info[projinfo]
-    return info["projection"](**info["args"])
+    return make_projection(info["projection"], **info["args"])
 
 
 def get_extent(projinfo):
@@ -86,13 +121,21 @@ def find_projection_core(lons, lats, pad_rel=0.2, pad_abs=0.1, percentile=99.9):
     """
     lons, lats = (asarray(x) for x in (lons, lats))
     assert len(lons) == len(lats), (len(lons), len(lats))
-    lonm0 = lon_avg(lons)
+    bounds = _percentile_bounds(lons, lats, lon_avg(lons), percentile)
+    return _projection_info(*bounds, pad_rel, pad_abs)
+
+
+def _percentile_bounds(lons, lats, lonm0, percentile):
     lons = (lons - lonm0 + 180) % 360 + lonm0 - 180
     lon0, lonm, lon1 = np.percentile(lons, (100 - percentile, 50, percentile))
     (lon0, lon1) = [(x - lonm + 180) % 360 + lonm - 180 for x in (lon0, lon1)]
     if lon0 > lon1:
         lon0, lon1 = lon1, lon0
     lat0, latm, lat1 = np.percentile(lats, (100 - percentile, 50, percentile))
+    return lon0, lonm, lon1, lat0, latm, lat1
+
+
+def _projection_info(lon0, lonm, lon1, lat0, latm, lat1, pad_rel, pad_abs):
     lon_delta = abs(lon1 - lon0) * pad_rel + pad_abs
     lat_delta = abs(lat1 - lat0) * pad_rel + pad_abs
 
@@ -118,6 +161,22 @@ def find_projection_core(lons, lats, pad_rel=0.2, pad_abs=0.1, percentile=99.9):
     )
 
 
+def _with_projection(info):
+    if info.projection == "LambertAzimuthalEqualArea":
+        projection = make_projection(
+            cartopy.crs.LambertAzimuthalEqualArea,
+            central_longitude=info.central_longitude,
+            central_latitude=info.central_latitude,
+        )
+    elif info.projection == "EqualEarth":
+        projection = make_projection(
+            cartopy.crs.EqualEarth, central_longitude=info.central_longitude
+        )
+    else:
+        raise RuntimeError("unknown projection name")
+    return info._replace(projection=projection)
+
+
 def find_projection(lons, lats, pad_rel=0.2, pad_abs=0.1, percentile=99.9):
     """Find a suitable projection and extent for a set of lat lon points.
 
@@ -142,14 +201,108 @@ def find_projection(lons, lats, pad_rel=0.2, pad_abs=0.1, percentile=99.9):
         and `central_latitude`.
 
     """
-    info = find_projection_core(lons, lats, pad_rel, pad_abs, percentile)
-    if info.projection == "LambertAzimuthalEqualArea":
-        projection = cartopy.crs.LambertAzimuthalEqualArea(
-            central_longitude=info.central_longitude,
-            central_latitude=info.central_latitude,
-        )
-    elif info.projection == "EqualEarth":
-        projection = cartopy.crs.EqualEarth(central_longitude=info.central_longitude)
+    return _with_projection(
+        find_projection_core(lons, lats, pad_rel, pad_abs, percentile)
+    )
+
+
+def _chunks(values):
+    """Iterate over `values` as numpy arrays
+
+    `values` may be an array, a pyarrow Array or ChunkedArray, a list or tuple
+    of numbers, or an iterable of array-like chunks.
+    """
+    if hasattr(values, "iterchunks"):
+        for chunk in values.iterchunks():
+            yield chunk.to_numpy(zero_copy_only=False)
+    elif isinstance(values, (np.ndarray, pd.Series)):
+        yield asarray(values)
+    elif hasattr(values, "to_numpy"):
+        yield values.to_numpy(zero_copy_only=False)
+    elif isinstance(values, (list, tuple)) and not any(np.ndim(x) for x in values):
+        yield asarray(values, dtype=float)
     else:
-        raise RuntimeError("unknown projection name")
-    return info._replace(projection=projection)
+        for chunk in values:
+            yield asarray(chunk)
+
+
+def reservoir_size(rank_error, failure_prob):
+    """Sample size needed to estimate quantiles to within `rank_error`
+
+    From the Dvoretzky–Kiefer–Wolfowitz inequality, the empirical CDF of this
+    many random samples is within `rank_error` of the true CDF everywhere,
+    except with probability `failure_prob`.
+    """
+    return int(np.ceil(np.log(2 / failure_prob) / (2 * rank_error**2)))
+
+
+def find_projection_streaming(
+    lons,
+    lats,
+    pad_rel=0.2,
+    pad_abs=0.1,
+    percentile=99.9,
+    rank_error=0.002,
+    failure_prob=0.001,
+    seed=None,
+):
+    """Find a suitable projection for a set of points too large to hold in memory.
+
+    This is an approximate version of `find_projection` that makes a single
+    pass over the points. The central longitude is computed exactly from
+    running sums, while the percentiles are computed from a uniform random
+    sample of the points, so no more than a fixed number of points are held
+    at once. If there are fewer points than the sample size the result is the
+    same as `find_projection`.
+
+    Parameters
+    ----------
+    lons, lats : array, pyarrow Array or ChunkedArray, or iterable of arrays
+        Iterables are consumed chunk by chunk. `lons` and `lats` must have
+        the same number of chunks, and corresponding chunks must be the same
+        length.
+    pad_rel, pad_abs, percentile : see `find_projection`
+    rank_error : float, optional
+        Bound on the error of the percentiles, as a fraction of the points. For
+        example, with the defaults, the bound on the 99.9th percentile lies
+        between the 99.7th and 100th percentiles.
+    failure_prob : float, optional
+        Probability that the error exceeds `rank_error`.
+    seed : int, optional
+        Seed for the random sample.
+
+    Returns
+    -------
+    ProjectionInfo
+    """
+    size = reservoir_size(rank_error, failure_prob)
+    rng = np.random.default_rng(seed)
+    sample_keys = np.empty(0)
+    sample_lons = np.empty(0)
+    sample_lats = np.empty(0)
+    sin_sum = cos_sum = 0.0
+    n = 0
+    for lon_chunk, lat_chunk in zip(_chunks(lons), _chunks(lats), strict=True):
+        lon_chunk = np.asarray(lon_chunk, dtype=float)
+        lat_chunk = np.asarray(lat_chunk, dtype=float)
+        if len(lon_chunk) != len(lat_chunk):
+            raise ValueError("chunks of lons and lats must be the same length")
+        radians = np.radians(lon_chunk)
+        sin_sum += np.sin(radians).sum()
+        cos_sum += np.cos(radians).sum()
+        n += len(lon_chunk)
+        # Keep the points with the `size` smallest random keys, which is a
+        # uniform sample of all the points seen so far.
+        sample_keys = np.concatenate([sample_keys, rng.random(len(lon_chunk))])
+        sample_lons = np.concatenate([sample_lons, lon_chunk])
+        sample_lats = np.concatenate([sample_lats, lat_chunk])
+        if len(sample_keys) > size:
+            keep = np.argpartition(sample_keys, size)[:size]
+            sample_keys = sample_keys[keep]
+            sample_lons = sample_lons[keep]
+            sample_lats = sample_lats[keep]
+    if n == 0:
+        raise ValueError("no points to find a projection for")
+    lonm0 = np.degrees(np.arctan2(sin_sum / n, cos_sum / n))
+    bounds = _percentile_bounds(sample_lons, sample_lats, lonm0, percentile)
+    return _with_projection(_projection_info(*bounds, pad_rel, pad_abs))
@@ -8,7 +8,8 @@ H3 data to Cartopy GeoAxes with improved results.
 
 The two main entry points in the module are `raster_show` and `h3_show`.
 `raster_show` has the same interface as `imshow`. `h3_show` is similar
-except it accepts H3 Discrete Global Grid data.
+except it accepts H3 Discrete Global Grid data. `tile_show` similarly
+renders imagery from a tile server.
 
 In both cases, the strategy is to generate a raster in *display* coordinates,
 interpolating the data in the raster or DGG grid directly onto the new
@@ -22,8 +23,8 @@ Much code here repurposed from the matplotlib sources for `Axes.imshow` and
 `AxesImage`.
 """
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 
-import h3.api.memview_int as h3
 import matplotlib.artist as martist
 import matplotlib.cbook as cbook
 import numpy as np
@@ -129,6 +130,42 @@ def raster_show(
     return _finalize_show((raster, extent, origin), im, ax, alpha, url, cmap, norm)
 
 
+def tile_show(
+    ax, downloader, max_zoom=19, aspect=None, url=None, alpha=1.0, **kwargs
+):
+    """Plot imagery from a tile server in a way friendly to projected maps.
+
+    Tiles are fetched when the map is drawn, at the zoom needed to resolve
+    each part of the current view, and sampled directly into display pixels.
+
+    Parameters
+    ----------
+    ax : matplotlib Axes
+    downloader : imagery.tiles.TileDownloader
+        Used to fetch the tiles. Give it a `TileCache` so that tiles are
+        reused across sessions.
+    max_zoom : int, optional
+        Finest zoom the server provides.
+    aspect, url, alpha, kwargs : see Axes.imshow
+
+    Returns
+    -------
+    TileImage instance
+    """
+    norm = _setup_show(ax, aspect, None, None, None)
+
+    im = TileImage(
+        ax,
+        norm=norm,
+        extent=ax.get_extent(),
+        interpolation="nearest",
+        origin="lower",
+        **kwargs
+    )
+
+    return _finalize_show((downloader, max_zoom), im, ax, alpha, url, None, norm)
+
+
 def _setup_show(ax, aspect, norm, vmin, vmax):
     """Common setup code for show_raster and show_h3
 
@@ -213,6 +250,8 @@ def h3_to_raster(h3_data, row_locs, col_locs, transform, fill=0.0):
     -------
     2D array of float
     """
+    import h3.api.memview_int as h3
+
     levels = set(h3.get_resolution(x) for x in h3_data.keys())
     shapes = set(np.shape(x) for x in h3_data.values())
     if len(shapes) != 1:
@@ -244,9 +283,9 @@ def h3cnts_to_raster(*args, **kwargs):
 def raster_to_raster(raster, extent, row_locs, col_locs, transform, origin="upper"):
     """Convert raster defined in lat,lon space to raster in projected coords
 
-    Note: the extent cannot cross the dateline. If you have a raster that extends
-    across the dateline, it needs to be cut at the dateline and pieces plotted
-    separately.
+    Note: a raster that extends across the dateline must either have lon1
+    greater than 180, as for images from `TileDownloader.download`, or be cut
+    at the dateline and the pieces plotted separately.
 
     Parameters
     ----------
@@ -275,7 +314,6 @@ def raster_to_raster(raster, extent, row_locs, col_locs, transform, origin="uppe
     lon0, lon1, lat0, lat1 = extent
     if origin == "upper":
         lat0, lat1 = lat1, lat0
-    # TODO: Support second value > first, assuming rightward, but wrapped
     dlat = (lat1 - lat0) / raster.shape[0]
     dlon = (lon1 - lon0) / raster.shape[1]
 
@@ -284,6 +322,9 @@ def raster_to_raster(raster, extent, row_locs, col_locs, transform, origin="uppe
 
     for i, row in enumerate(row_locs):
         lons, lats = transform([row] * len(col_locs), col_locs)
+        if lon1 > 180:
+            # The raster continues east of the dateline
+            lons = np.where(lons < lon0, lons + 360, lons)
         rr = ((lats - lat0) // dlat + 0.5).astype(int)
         cc = ((lons - lon0) // dlon + 0.5).astype(int)
 
@@ -313,26 +354,77 @@ class InterpImage(AxesImage):
 
     Typically `_get_updated_A` must be overridden in a subclass. See
     `H3Image` and `RasterImage` for examples.
+
+    Updating the array is split into `compute_A`, which does the expensive
+    rasterization and may run on another thread, and `apply_A`. Subclasses
+    whose rasterization only depends on the source data can instead override
+    the static method `_rasterize`, which can also be run in another process.
+    See `prefetch_images`.
     """
 
-    def update_A(self):
-        """Update the array data"""
-        rr, cc, tx, dext = setup_composite_tx(self._axes)
-        A = self._get_updated_A(rr, cc, tx)
+    _rasterize = None
+
+    _pending = None
+
+    def _view_key(self):
+        # The rasterized array is only valid for the same pixel grid and view
+        ax = self._axes
+        return (tuple(ax.bbox.bounds), tuple(ax.viewLim.bounds))
+
+    def compute_A(self, composite_tx=None):
+        """Rasterize the source data for the current view
+
+        Parameters
+        ----------
+        composite_tx : tuple, optional
+            The result of `setup_composite_tx` for this image's axes.
+
+        Returns
+        -------
+        tuple
+            Suitable for passing to `apply_A`.
+        """
+        if composite_tx is None:
+            composite_tx = setup_composite_tx(self._axes)
+        rr, cc, tx, dext = composite_tx
+        return self._get_updated_A(rr, cc, tx), dext
+
+    def apply_A(self, computed):
+        """Set the array data from the result of `compute_A`"""
+        A, dext = computed
         cm.ScalarMappable.set_array(self, cbook.safe_masked_invalid(A, copy=True))
         self._scale_norm(self.norm, None, None)
         self.set_extent(dext)
 
+    def update_A(self):
+        """Update the array data"""
+        self.apply_A(self.compute_A())
+
+    def set_pending(self, future):
+        """Use the result of `future` for the next draw, if the view is unchanged
+
+        Parameters
+        ----------
+        future : concurrent.futures.Future
+            Future resolving to the result of `compute_A`.
+        """
+        self._pending = (self._view_key(), future)
+
     @martist.allow_rasterization
     def draw(self, renderer, *args, **kwargs):
         """Draw the image, updating the array data if stale"""
         if self.stale:
-            self.update_A()
+            pending, self._pending = self._pending, None
+            if pending is not None and pending[0] == self._view_key():
+                self.apply_A(pending[1].result())
+            else:
+                self.update_A()
         super().draw(renderer, *args, **kwargs)
 
     def set_data(self, source_data):
         """Set the source data for the image"""
         self._source_data = source_data
+        self._pending = None
         self.stale = True
 
     def _get_updated_A(self, row_locs, col_locs, transform):
@@ -349,7 +441,9 @@ class InterpImage(AxesImage):
         See `h3_to_raster` and `raster_to_raster` for more details on the
         the arguments.
         """
-        raise NotImplementedError()
+        if self._rasterize is None:
+            raise NotImplementedError()
+        return self._rasterize(self._source_data, row_locs, col_locs, transform)
 
 
 class H3Image(InterpImage):
@@ -358,8 +452,9 @@ class H3Image(InterpImage):
     Typically used through `h3_show`.
     """
 
-    def _get_updated_A(self, row_locs, col_locs, transform):
-        h3data, fill = self._source_data
+    @staticmethod
+    def _rasterize(source_data, row_locs, col_locs, transform):
+        h3data, fill = source_data
         return h3_to_raster(h3data, row_locs, col_locs, transform, fill=fill)
 
 
@@ -369,13 +464,33 @@ class RasterImage(InterpImage):
     Typically used through `raster_show`.
     """
 
-    def _get_updated_A(self, row_locs, col_locs, transform):
-        raster, extent, origin = self._source_data
+    @staticmethod
+    def _rasterize(source_data, row_locs, col_locs, transform):
+        raster, extent, origin = source_data
         return raster_to_raster(
             raster, extent, row_locs, col_locs, transform, origin=origin
         )
 
 
+class TileImage(InterpImage):
+    """Image that samples Web Mercator tiles and plots well on projected maps.
+
+    Only the tiles needed for the current view are fetched, so zooming or
+    panning fetches just the new tiles. Typically used through `tile_show`.
+    """
+
+    def _get_updated_A(self, row_locs, col_locs, transform):
+        # Imported here since it requires PIL
+        from ..imagery import tiles
+
+        downloader, max_zoom = self._source_data
+        rows, cols = np.meshgrid(row_locs, col_locs, indexing="ij")
+        lons, lats = transform(rows.ravel(), cols.ravel())
+        return tiles.sample_tiles(
+            downloader, lons.reshape(rows.shape), lats.reshape(rows.shape), max_zoom
+        )
+
+
 def setup_composite_tx(ax):
     """Return composite transform and auxiliary values
 
@@ -395,16 +510,156 @@ def setup_composite_tx(ax):
     i1, j1 = (np.ceil(x) for x in (i1, j1))
     col_locs = np.arange(i0, i1)
     row_locs = np.arange(j0, j1)
-    (e_i0, e_j0), (e_i1, e_j1) = ax.transData.inverted().transform([(i0, j0), (i1, j1)])
+    # Freeze the transform so that `composite_tx` can be used from other
+    # threads and doesn't change if the view does.
+    inverse = ax.transData.inverted().frozen()
+    (e_i0, e_j0), (e_i1, e_j1) = inverse.transform([(i0, j0), (i1, j1)])
     display_extent = (e_i0, e_i1, e_j0, e_j1)
+    projection = ax.projection
 
     def composite_tx(rr, cc):
         # rr, cc -> lons, lats
-        cr = list(zip(cc, rr))
-        data_crds = np.asarray(ax.transData.inverted().transform(cr))
+        cr = np.column_stack([cc, rr]).astype(float)
+        data_crds = inverse.transform(cr)
         lonlat = core.identity.transform_points(
-            ax.projection, data_crds[:, 0], data_crds[:, 1]
+            projection, data_crds[:, 0], data_crds[:, 1]
         )[:, :2]
         return np.transpose(lonlat)
 
     return row_locs, col_locs, composite_tx, display_extent
+
+
+class GridTransform:
+    """Lookup table of the lon/lat of every pixel in a composite transform grid
+
+    Behaves like the function returned by `setup_composite_tx`, but only for
+    the pixels of its grid. Evaluating the transform once and reusing it is
+    much faster when the same view is rasterized repeatedly, for example for
+    the frames of an animation, and, unlike that function, it can be pickled.
+
+    Parameters
+    ----------
+    row_locs, col_locs : array of float
+        Evenly spaced pixel locations, as returned by `setup_composite_tx`.
+    transform : function mapping (rows, columns) to (lons, lats)
+    """
+
+    def __init__(self, row_locs, col_locs, transform):
+        rows, cols = np.meshgrid(row_locs, col_locs, indexing="ij")
+        lons, lats = transform(rows.ravel(), cols.ravel())
+        self.lons = np.reshape(lons, rows.shape)
+        self.lats = np.reshape(lats, rows.shape)
+        self.row0 = row_locs[0] if len(row_locs) else 0
+        self.col0 = col_locs[0] if len(col_locs) else 0
+
+    def __call__(self, rr, cc):
+        i = np.rint(np.asarray(rr, dtype=float) - self.row0).astype(int)
+        j = np.rint(np.asarray(cc, dtype=float) - self.col0).astype(int)
+        return self.lons[i, j], self.lats[i, j]
+
+
+def cache_composite_tx(composite_tx):
+    """Replace the transform returned by `setup_composite_tx` with a `GridTransform`
+
+    Parameters
+    ----------
+    composite_tx : tuple
+        The result of `setup_composite_tx`.
+
+    Returns
+    -------
+    tuple
+        Like `composite_tx`, and suitable for `InterpImage.compute_A`.
+    """
+    row_locs, col_locs, transform, display_extent = composite_tx
+    grid = GridTransform(row_locs, col_locs, transform)
+    return row_locs, col_locs, grid, display_extent
+
+
+def _rasterize_in_worker(rasterize, source_data, composite_tx):
+    row_locs, col_locs, transform, display_extent = composite_tx
+    return rasterize(source_data, row_locs, col_locs, transform), display_extent
+
+
+def _all_axes(fig):
+    """Yield the axes of a figure and its subfigures, parents before insets"""
+    stack = list(fig.axes[::-1])
+    for subfig in getattr(fig, "subfigs", ()):
+        stack.extend(_all_axes(subfig))
+    seen = set()
+    while stack:
+        ax = stack.pop()
+        if id(ax) in seen:
+            continue
+        seen.add(id(ax))
+        yield ax
+        stack.extend(getattr(ax, "child_axes", ())[::-1])
+
+
+def prefetch_images(fig, max_workers=None, executor=None):
+    """Rasterize the stale images of every map in a figure concurrently
+
+    Images derived from `InterpImage` are normally rasterized one after the
+    other while the figure is drawn. Calling this just before `savefig`
+    rasterizes them all at once on a pool of threads, so that drawing a grid
+    of maps (see `create_maps`) takes about as long as drawing one. Most of
+    the work is done by numpy, which releases the GIL. Images on inset axes
+    are included. Each image uses its result on its next draw, if the view
+    hasn't changed by then; otherwise it is rasterized as usual. For this
+    reason the figure should be saved at its own dpi.
+
+    Parameters
+    ----------
+    fig : Figure
+    max_workers : int, optional
+        Number of threads to use.
+    executor : concurrent.futures.Executor, optional
+        If given, `RasterImage` and `H3Image` data is rasterized on this
+        executor instead, which may be a `ProcessPoolExecutor`. The source
+        data and pixel grid are then pickled for every image, so processes
+        only pay off for large maps. The executor is not shut down.
+
+    Returns
+    -------
+    int
+        The number of images rasterized.
+    """
+    images = []
+    renderer = None
+    for ax in _all_axes(fig):
+        stale = [
+            im
+            for im in ax.get_images()
+            if isinstance(im, InterpImage) and im.stale and im.get_visible()
+        ]
+        if stale:
+            # Fix the final position of the axes before finding the pixel grid.
+            # Insets are positioned by a locator when drawn, so apply it here.
+            locator = ax.get_axes_locator()
+            if locator is not None and renderer is None:
+                renderer = fig.canvas.get_renderer()
+            ax.apply_aspect(locator(ax, renderer) if locator else None)
+            composite_tx = setup_composite_tx(ax)
+            images.extend((im, composite_tx) for im in stale)
+    if not images:
+        return 0
+    if executor is None:
+        injected, local = [], images
+    else:
+        injected = [(im, tx) for (im, tx) in images if im._rasterize is not None]
+        local = [(im, tx) for (im, tx) in images if im._rasterize is None]
+    # Closures can't be sent to other processes, so send the pixel grid
+    grids = {}
+    for im, composite_tx in injected:
+        key = id(composite_tx)
+        if key not in grids:
+            grids[key] = cache_composite_tx(composite_tx)
+        future = executor.submit(
+            _rasterize_in_worker, im._rasterize, im._source_data, grids[key]
+        )
+        im.set_pending(future)
+    if local:
+        with ThreadPoolExecutor(max_workers) as pool:
+            for im, composite_tx in local:
+                im.set_pending(pool.submit(im.compute_A, composite_tx))
+    return len(images)
@@ -0,0 +1,178 @@
+"""Render maps to images without pyplot
+
+pyplot keeps a global list of open figures and a current figure and axes, so
+it is neither thread safe nor well suited to servers, where figures that are
+not closed leak memory. `MapContext` instead builds a map on a `Figure` with
+its own Agg canvas, which is never registered with pyplot, and can be
+rendered to PNG bytes or an RGBA array. Map state such as the projection
+name, gridlines and style is stored on the axes (see `core.map_state`), so
+maps built concurrently in different threads don't interfere.
+
+    renderer = MapRenderer(
+        projection="regional.european_union",
+        figsize=(8, 8),
+        style=styles.MapStyle(styles.light),
+    )
+
+    def draw(ctx):
+        maps.add_raster(raster, ax=ctx.ax)
+        maps.add_countries(ax=ctx.ax)
+
+    png = renderer.render(draw)
+
+Functions that draw on a map must be passed `ax` explicitly, since there is
+no current axes. Without a `style`, the style is read from `plt.rcParams`
+while the map is built, so pass a `styles.MapStyle` when threads render maps
+in different styles.
+"""
+import io
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from . import core
+
+
+class MapContext:
+    """A single map on an offscreen figure
+
+    Parameters
+    ----------
+    projection : str or cartopy.crs.Projection, optional
+    extent : 4-tuple of float or None, optional
+    figsize : tuple of float, optional
+    dpi : float, optional
+    bg_color : str or tuple, optional
+        Color of the ocean.
+    hide_axes : bool, optional
+        if `true`, hide x and y axes
+    facecolor : str or tuple, optional
+        Color of the area around the map. Defaults to the style's figure
+        background.
+    style : MapStyle, optional
+        See `core.create_map`.
+
+    Attributes
+    ----------
+    figure : Figure
+    ax : GeoAxes
+    """
+
+    def __init__(
+        self,
+        projection="global.default",
+        extent=None,
+        figsize=(10, 6),
+        dpi=100,
+        bg_color=None,
+        hide_axes=True,
+        facecolor=None,
+        style=None,
+    ):
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        core.add_figure_background(fig=self.figure, color=facecolor, style=style)
+        self.ax = core.create_map(
+            projection=projection,
+            extent=extent,
+            bg_color=bg_color,
+            hide_axes=hide_axes,
+            fig=self.figure,
+            style=style,
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Release the artists held by the figure"""
+        self.figure.clear()
+
+    def to_array(self):
+        """Draw the map and return it as an RGBA array
+
+        Returns
+        -------
+        array of uint8
+            Has shape (rows, columns, 4).
+        """
+        self.canvas.draw()
+        return np.asarray(self.canvas.buffer_rgba()).copy()
+
+    def to_png(self, **kwargs):
+        """Draw the map and return it as PNG bytes
+
+        Parameters
+        ----------
+        **kwargs : passed to `Figure.savefig`
+
+        Returns
+        -------
+        bytes
+        """
+        kwargs.setdefault("facecolor", self.figure.get_facecolor())
+        buffer = io.BytesIO()
+        self.figure.savefig(buffer, format="png", **kwargs)
+        return buffer.getvalue()
+
+
+class MapRenderer:
+    """Render maps sharing the same settings
+
+    A renderer holds no figures between calls, so a single renderer can be
+    used from several threads.
+
+    Parameters
+    ----------
+    **map_kwargs : passed to `MapContext`
+    """
+
+    def __init__(self, **map_kwargs):
+        self.map_kwargs = map_kwargs
+
+    def context(self, **overrides):
+        """Create a `MapContext`, overriding some of the renderer's settings
+
+        Returns
+        -------
+        MapContext
+        """
+        return MapContext(**{**self.map_kwargs, **overrides})
+
+    def render(self, draw, **savefig_kwargs):
+        """Render a map to PNG bytes
+
+        Parameters
+        ----------
+        draw : callable
+            Called with a `MapContext` to add content to the map.
+        **savefig_kwargs : passed to `Figure.savefig`
+
+        Returns
+        -------
+        bytes
+        """
+        with self.context() as ctx:
+            draw(ctx)
+            return ctx.to_png(**savefig_kwargs)
+
+    def render_array(self, draw):
+        """Render a map to an RGBA array
+
+        Parameters
+        ----------
+        draw : callable
+            Called with a `MapContext` to add content to the map.
+
+        Returns
+        -------
+        array of uint8
+            Has shape (rows, columns, 4).
+        """
+        with self.context() as ctx:
+            draw(ctx)
+            return ctx.to_array()
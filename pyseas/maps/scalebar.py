@@ -8,91 +8,79 @@ import numpy as np
 from . import core
 
 
-def _axes_to_lonlat(ax, coords):
-    """(lon, lat) from axes coordinates."""
-    display = ax.transAxes.transform(coords)
-    data = ax.transData.inverted().transform(display)
-    lonlat = ccrs.PlateCarree().transform_point(*data, ax.projection)
+identity = ccrs.PlateCarree()
+_geodesic = cgeo.Geodesic()
 
-    return lonlat
+# Maximum number of Newton steps used to refine the end of the bar, before
+# falling back to bisection
+MAX_NEWTON_STEPS = 4
+MAX_BISECTION_STEPS = 60
 
 
-def _upper_bound(start, direction, distance, dist_func):
-    """A point farther than distance from start, in the given direction.
-    It doesn't matter which coordinate system start is given in, as long
-    as dist_func takes points in that coordinate system.
-    Args:
-        start:     Starting point for the line.
-        direction  Nonzero (2, 1)-shaped array, a direction vector.
-        distance:  Positive distance to go past.
-        dist_func: A two-argument function which returns distance.
-    Returns:
-        Coordinates of a point (a (2, 1)-shaped NumPy array).
-    """
-    if distance <= 0:
-        raise ValueError(f"Minimum distance is not positive: {distance}")
-
-    if np.linalg.norm(direction) == 0:
-        raise ValueError("Direction vector must not be zero.")
+def _axes_to_lonlat(ax, coords):
+    """(lon, lat) from axes coordinates.
 
-    # Exponential search until the distance between start and end is
-    # greater than the given limit.
-    length = 0.1
-    end = start + length * direction
+    `coords` may be a single point or an (n, 2) array of points.
+    """
+    coords = np.asarray(coords, dtype=float)
+    display = ax.transAxes.transform(coords.reshape(-1, 2))
+    data = ax.transData.inverted().transform(display)
+    lonlat = identity.transform_points(ax.projection, data[:, 0], data[:, 1])[:, :2]
+    return lonlat.reshape(coords.shape)
 
-    while dist_func(start, end) < distance:
-        length *= 2
-        end = start + length * direction
 
-    return end
+def _lonlat_to_axes(ax, lonlat):
+    """Axes coordinates from (lon, lat)."""
+    lonlat = np.asarray(lonlat, dtype=float).reshape(-1, 2)
+    data = ax.projection.transform_points(identity, lonlat[:, 0], lonlat[:, 1])
+    display = ax.transData.transform(data[:, :2])
+    return ax.transAxes.inverted().transform(display)
 
 
-def _distance_along_line(start, end, distance, dist_func, tol):
-    """Point at a distance from start on the segment  from start to end.
-    It doesn't matter which coordinate system start is given in, as long
-    as dist_func takes points in that coordinate system.
-    Args:
-        start:     Starting point for the line.
-        end:       Outer bound on point's location.
-        distance:  Positive distance to travel.
-        dist_func: Two-argument function which returns distance.
-        tol:       Relative error in distance to allow.
-    Returns:
-        Coordinates of a point (a (2, 1)-shaped NumPy array).
-    """
-    initial_distance = dist_func(start, end)
-    if initial_distance < distance:
+def _distances(start, ends):
+    """Geodesic distances in metres from `start` to each of `ends`, in lon/lat."""
+    starts = np.broadcast_to(start, np.shape(ends))
+    distances = np.asarray(_geodesic.inverse(starts, ends))[:, 0]
+    if not np.isfinite(distances).all():
         raise ValueError(
-            f"End is closer to start ({initial_distance}) than "
-            f"given distance ({distance})."
+            "NaN encountered when calculating scalebar length. `extent` may be too large"
         )
-
-    if tol <= 0:
-        raise ValueError(f"Tolerance is not positive: {tol}")
-
-    # Binary search for a point at the given distance.
-    left = start
-    right = end
-
-    while not np.isclose(dist_func(start, right), distance, rtol=tol):
-        midpoint = (left + right) / 2
-        # If midpoint is too close, search in second half.
-        current_distance = dist_func(start, midpoint)
-        if np.isnan(current_distance):
-            raise ValueError(
-                "NaN encountered when calculating scalebar length. `extent` may be too large"
-            )
-        if current_distance < distance:
-            left = midpoint
-        # Otherwise the midpoint is too far, so search in first half.
+    return distances
+
+
+def _bisect(distance_at, distance, t, tol):
+    """Find where `distance_at` is within `tol` of `distance`, starting from `t`"""
+    lo, hi = 0.0, t
+    for _ in range(MAX_BISECTION_STEPS):
+        d = distance_at(hi)
+        if abs(d - distance) <= tol * distance:
+            return hi
+        if d > distance:
+            break
+        lo, hi = hi, 2 * hi
+    else:
+        raise ValueError("could not find the end of the scalebar")
+    for _ in range(MAX_BISECTION_STEPS):
+        t = 0.5 * (lo + hi)
+        d = distance_at(t)
+        if abs(d - distance) <= tol * distance:
+            return t
+        if d < distance:
+            lo = t
         else:
-            right = midpoint
-
-    return right
+            hi = t
+    raise ValueError("could not find the end of the scalebar")
 
 
 def _point_along_line(ax, start, distance, angle=0, tol=0.01):
     """Point at a given distance from start at a given angle.
+
+    The end point is first estimated by travelling `distance` along a geodesic
+    from `start`, with the bearing that matches `angle` on the map. Since a
+    geodesic is generally curved on the map, that estimate is projected onto
+    the line at `angle` and refined with a few Newton steps. If those don't
+    converge, the end is found by bisection.
+
     Args:
         ax:       CartoPy axes.
         start:    Starting point for the line in axes coordinates.
@@ -102,28 +90,42 @@ def _point_along_line(ax, start, distance, angle=0, tol=0.01):
     Returns:
         Coordinates of a point (a (2, 1)-shaped NumPy array).
     """
+    if distance <= 0:
+        raise ValueError(f"Minimum distance is not positive: {distance}")
+    if tol <= 0:
+        raise ValueError(f"Tolerance is not positive: {tol}")
+
     # Direction vector of the line in axes coordinates.
     direction = np.array([np.cos(angle), np.sin(angle)])
 
-    geodesic = cgeo.Geodesic()
+    # Bearing of the line, from a short step along it
+    step = 1e-3
+    start_ll, step_ll = _axes_to_lonlat(ax, [start, start + step * direction])
+    bearing = np.asarray(_geodesic.inverse(start_ll, step_ll))[0, 1]
 
-    # Physical distance between points.
-    def dist_func(a_axes, b_axes):
-        a_phys = _axes_to_lonlat(ax, a_axes)
-        b_phys = _axes_to_lonlat(ax, b_axes)
+    end_ll = np.asarray(_geodesic.direct(start_ll, bearing, distance))[0, :2]
+    t = np.dot(_lonlat_to_axes(ax, end_ll)[0] - start, direction)
+    if not np.isfinite(t) or t <= 0:
+        # Fall back to a linear estimate from the short step
+        t = step * distance / _distances(start_ll, step_ll[np.newaxis])[0]
 
-        # Geodesic().inverse returns a NumPy MemoryView like [[distance,
-        # start azimuth, end azimuth]].
-        try:
-            # Older versions of cartopy require this version
-            return geodesic.inverse(a_phys, b_phys).base[0, 0]
-        except TypeError:
-            # But in newer versions inverse.base is None this simpler version is required
-            return geodesic.inverse(a_phys, b_phys)[0, 0]
+    def distances_at(ts):
+        ends = _axes_to_lonlat(ax, start + np.asarray(ts)[:, np.newaxis] * direction)
+        return _distances(start_ll, ends)
 
-    end = _upper_bound(start, direction, distance, dist_func)
+    for _ in range(MAX_NEWTON_STEPS):
+        # Distance at t and slightly beyond, from a single batched transform
+        d, d_beyond = distances_at([t, t * (1 + step)])
+        if abs(d - distance) <= tol * distance:
+            return start + t * direction
+        slope = (d_beyond - d) / (t * step)
+        t_next = t - (d - distance) / slope
+        if not (slope > 0 and np.isfinite(t_next) and t_next > 0):
+            break
+        t = t_next
 
-    return _distance_along_line(start, end, distance, dist_func, tol)
+    t = _bisect(lambda t: distances_at([t])[0], distance, t, tol)
+    return start + t * direction
 
 
 def scale_bar(
@@ -232,7 +234,7 @@ def add_scalebar(
     if ax is None:
         ax = plt.gca()
     if extent is NoValue:
-        extent = core._last_extent
+        extent = core.map_state(ax)["extent"]
     if extent is None:
         if skip_when_extent_large:
             return ax
@@ -270,7 +272,7 @@ def add_scalebar(
             unit_name = "m"
 
         if color is None:
-            color = plt.rcParams["axes.labelcolor"]
+            color = core.map_style(ax)["axes.labelcolor"]
 
         # if location == 'lower right':
         #     location = ()
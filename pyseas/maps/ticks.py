@@ -1,26 +1,27 @@
 # Based on this stackoverflow post:
 # https://stackoverflow.com/questions/27962953/cartopy-axis-label-workaround
 import cartopy.crs as ccrs
-import matplotlib.pyplot as plt
 import numpy as np
-import shapely.geometry as sgeom
 from cartopy.mpl.gridliner import LATITUDE_FORMATTER, LONGITUDE_FORMATTER
 
+identity = ccrs.PlateCarree()
+geodetic = ccrs.Geodetic()
 
-def find_side(ls, side):
-    """
-    Given a shapely LineString which is assumed to be rectangular, return the
-    line corresponding to a given side of the rectangle.
 
+def outline_bounds(ax):
+    """Bounds of the map outline as (minx, miny, maxx, maxy) in projected coordinates
+
+    The outline is the intersection of the view limits with the projection's
+    domain, so it can be found without drawing the figure.
     """
-    minx, miny, maxx, maxy = ls.bounds
-    points = {
-        "left": [(minx, miny), (minx, maxy)],
-        "right": [(maxx, miny), (maxx, maxy)],
-        "bottom": [(minx, miny), (maxx, miny)],
-        "top": [(minx, maxy), (maxx, maxy)],
-    }
-    return sgeom.LineString(points[side])
+    x0, x1, y0, y1 = ax.get_extent()
+    (px0, px1), (py0, py1) = ax.projection.x_limits, ax.projection.y_limits
+    return (
+        max(min(x0, x1), px0),
+        max(min(y0, y1), py0),
+        min(max(x0, x1), px1),
+        min(max(y0, y1), py1),
+    )
 
 
 # Pad the lines we use to compute intersections with the outside of the
@@ -31,11 +32,10 @@ EPS = 1  # degrees
 def draw_xticks(ax, ticks, side="bottom"):
     """Draw ticks on the bottom x-axis of a cartopy map."""
     assert side in ["bottom", "top"]
-    te = lambda xy: xy[0]
     lc = lambda t, n, b: np.vstack(
         (np.zeros(n) + t, np.linspace(b[2] - EPS, b[3] + EPS, n))
     ).T
-    xticks, xticklabels = _ticks(ax, ticks, side, lc, te)
+    xticks, xticklabels = _ticks(ax, ticks, side, lc)
     if side == "bottom":
         ax.xaxis.tick_bottom()
     else:
@@ -47,11 +47,10 @@ def draw_xticks(ax, ticks, side="bottom"):
 def draw_yticks(ax, ticks, side="left"):
     """Draw ticks on the left y-axis of a Lamber Conformal projection."""
     assert side in ["left", "right"]
-    te = lambda xy: xy[1]
     lc = lambda t, n, b: np.vstack(
         (np.linspace(b[0] - EPS, b[1] + EPS, n), np.zeros(n) + t)
     ).T
-    yticks, yticklabels = _ticks(ax, ticks, side, lc, te)
+    yticks, yticklabels = _ticks(ax, ticks, side, lc)
     if side == "left":
         ax.yaxis.tick_left()
     else:
@@ -60,37 +59,62 @@ def draw_yticks(ax, ticks, side="left"):
     ax.set_yticklabels([ax.yaxis.get_major_formatter()(ytick) for ytick in yticklabels])
 
 
-def _ticks(ax, ticks, tick_location, line_constructor, tick_extractor):
+def _first_crossings(lines, side, bounds):
+    """Where each projected line first crosses one side of a rectangle
+
+    Parameters
+    ----------
+    lines : array of float
+        Shape (n_lines, n_points, 2) in projected coordinates.
+    side : str
+        'left', 'right', 'bottom' or 'top'
+    bounds : tuple of float
+        (minx, miny, maxx, maxy) of the rectangle.
+
+    Returns
+    -------
+    array of float
+        Coordinate along the side of each crossing, NaN where a line doesn't
+        cross the side.
+    """
+    minx, miny, maxx, maxy = bounds
+    # Index of the coordinate that is constant along the side, its value there
+    # and the range of the other coordinate
+    fixed, value, lo, hi = {
+        "left": (0, minx, miny, maxy),
+        "right": (0, maxx, miny, maxy),
+        "bottom": (1, miny, minx, maxx),
+        "top": (1, maxy, minx, maxx),
+    }[side]
+    along = 1 - fixed
+    offset = lines[..., fixed] - value
+    a, b = offset[:, :-1], offset[:, 1:]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        crosses = (a * b <= 0) & (a != b)
+        frac = np.where(crosses, a / (a - b), np.nan)
+    pos = lines[:, :-1, along] + frac * (lines[:, 1:, along] - lines[:, :-1, along])
+    valid = crosses & (pos >= lo) & (pos <= hi)
+    first = np.argmax(valid, axis=1)
+    found = valid[np.arange(len(lines)), first]
+    return np.where(found, pos[np.arange(len(lines)), first], np.nan)
+
+
+def _ticks(ax, ticks, tick_location, line_constructor):
     """Get the tick locations and labels for an axis of a Lambert Conformal projection."""
-    try:
-        patch = ax.outline_patch
-    except AttributeError:
-        patch = ax.patch
-    outline_patch = sgeom.LineString(patch.get_path().vertices.tolist())
-    axis = find_side(outline_patch, tick_location)
+    ticks = list(ticks)
+    if not ticks:
+        return [], []
     n_steps = 30
-    extent = ax.get_extent(ccrs.PlateCarree())
-    _ticks = []
-    for t in ticks:
-        xy = line_constructor(t, n_steps, extent)
-        proj_xyz = ax.projection.transform_points(ccrs.Geodetic(), xy[:, 0], xy[:, 1])
-        xyt = proj_xyz[..., :2]
-        ls = sgeom.LineString(xyt.tolist())
-        locs = axis.intersection(ls)
-        if not locs:
-            tick = [None]
-        else:
-            if isinstance(locs, sgeom.MultiPoint):
-                locs = locs.geoms[0]
-            tick = tick_extractor(locs.xy)
-        _ticks.append(tick[0])
+    extent = ax.get_extent(identity)
+    lonlat = np.stack([line_constructor(t, n_steps, extent) for t in ticks])
+    # Project every tick line at once
+    projected = ax.projection.transform_points(
+        geodetic, lonlat[..., 0].ravel(), lonlat[..., 1].ravel()
+    )[:, :2].reshape(lonlat.shape)
+    locs = _first_crossings(projected, tick_location, outline_bounds(ax))
     # Remove ticks that aren't visible:
-    ticklabels = list(ticks)
-    while True:
-        try:
-            index = _ticks.index(None)
-        except ValueError:
-            break
-        _ticks.pop(index)
-        ticklabels.pop(index)
-    return _ticks, ticklabels
+    visible = np.isfinite(locs)
+    return (
+        locs[visible].tolist(),
+        [t for (t, v) in zip(ticks, visible) if v],
+    )
@@ -1,9 +1,10 @@
 import os
+import threading
+from collections.abc import Mapping as _Mapping
 from pathlib import Path
+from types import MappingProxyType as _MappingProxyType
 
-import gcsfs
 import numpy as np
-import skimage.io as skio
 from cycler import Cycler as _Cycler
 from cycler import cycler as _cycler
 from matplotlib import font_manager
@@ -17,9 +18,25 @@ from . import props as _props
 root = Path(__file__).parents[1]
 data = Path(__file__).parents[0] / "data"
 
-font_dirs = [x for x in (data / "fonts").iterdir() if x.is_dir()]
-for font_file in font_manager.findSystemFonts(fontpaths=font_dirs):
-    font_manager.fontManager.addfont(font_file)
+_fonts_registered = False
+_fonts_lock = threading.Lock()
+
+
+def register_fonts():
+    """Make the fonts shipped with pyseas, such as Roboto, available to matplotlib
+
+    Loading the font files is slow, so it is done the first time a map or a
+    `MapStyle` is created rather than on import. Call this directly before
+    using `light`, `dark` or `chart_style` with plain matplotlib figures.
+    """
+    global _fonts_registered
+    with _fonts_lock:
+        if _fonts_registered:
+            return
+        for font_file in sorted((data / "fonts").glob("*/*.[ot]tf")):
+            font_manager.fontManager.addfont(str(font_file))
+        _fonts_registered = True
+
 
 """
 This chart style was developed on a 10 by 6 figure size. 
@@ -77,7 +94,7 @@ _chart_cycler = _cycler(color=_chart_colors, linewidth=[2] * len(_chart_colors))
 del _chart_colors, clr
 
 
-def create_props(kinds, colors=None, interstitial_color=(0.5, 0.5, 0.5, 1)):
+def create_props(kinds, colors=None, interstitial_color=(0.5, 0.5, 0.5, 1), style=None):
     """Create props suitable for track plots.
 
     Parameters
@@ -91,13 +108,17 @@ def create_props(kinds, colors=None, interstitial_color=(0.5, 0.5, 0.5, 1)):
         should be transparent). By default, pulls the cycler from trackprops.
     interstitial_color : matplotlib color value, optional
         Color to apply to segments between points with different kind values.
+    style : MapStyle, optional
+        Style to take the default trackprops from, instead of `plt.rcParams`.
 
     Returns
     -------
     dict mapping (k1, k2) to props
     """
+    if style is None:
+        style = _plt.rcParams
     if colors is None:
-        prop_cycle = _plt.rcParams.get("pyseas.map.trackprops", _dark_artist_cycler)
+        prop_cycle = style.get("pyseas.map.trackprops", _dark_artist_cycler)
     elif isinstance(colors, (list, int)):
         prop_cycle = _cycler(edgecolor=colors, facecolor=[(0, 0, 0, 0)] * len(colors))
     elif isinstance(colors, _Cycler):
@@ -178,10 +199,15 @@ _colorbarlabelfont = {"fontsize": 12}
 
 logo_dir = data / "logos"
 
+# Decoded logos, keyed by the name or path they were loaded from
+_logos = {}
+
 
 def get_logo(img_or_path):
     """Retrieve a logo from a local or GCS path
 
+    Logos are decoded the first time they are requested and then reused.
+
     Parameters
     ----------
     img_or_path : array or str
@@ -192,21 +218,46 @@ def get_logo(img_or_path):
     """
     if not isinstance(img_or_path, str):
         return np.asarray(img_or_path)
-    path = img_or_path
+    if img_or_path not in _logos:
+        _logos[img_or_path] = _load_logo(img_or_path)
+    return _logos[img_or_path]
+
+
+def _load_logo(path):
+    import skimage.io as skio
+
     if path.startswith("gs://") or path.startswith("gcs://"):
         _, path = path.split("//", 1)
         local_path = logo_dir / os.path.basename(path)
         if not local_path.exists():
+            import gcsfs
+
             fs = gcsfs.GCSFileSystem()
             local_path.parent.mkdir(parents=True, exist_ok=True)
             fs.get_file(path, local_path)
     else:
-        local_path = Path(path)
-        if not local_path.is_absolute():
-            local_path = logo_dir / path
+        local_path = _local_logo_path(path)
     return skio.imread(local_path)
 
 
+def _local_logo_path(path):
+    local_path = Path(path)
+    if not local_path.is_absolute():
+        local_path = logo_dir / path
+    return local_path
+
+
+def _check_logo(img_or_path):
+    # Logos are decoded when first drawn, so catch bad paths when they are set
+    if not isinstance(img_or_path, (str, Path)):
+        return
+    path = str(img_or_path)
+    if path.startswith("gs://") or path.startswith("gcs://"):
+        return
+    if not os.path.exists(_local_logo_path(path)):
+        raise FileNotFoundError(f"logo not found: {path}")
+
+
 dark = {
     "figure.facecolor": _props.dark.background.color,
     "text.usetex": False,
@@ -244,7 +295,8 @@ dark = {
     "pyseas.map.annotationplotprops": _annotationplotprops,
     "pyseas.map.projlabelsize": _props.dark.projection_label.size,
     "pyseas.map.colorbarlabelfont": _colorbarlabelfont,
-    "pyseas.logo": get_logo(_props.dark.logo.name),
+    # Logos are stored by name and decoded on first use by `get_logo`
+    "pyseas.logo": _props.dark.logo.name,
     "pyseas.logo.scale_adj": _props.dark.logo.scale_adj,
     "pyseas.logo.alpha": _props.dark.logo.alpha,
     "pyseas.miniglobe.overlaycolor": _props.dark.miniglobe.overlaycolor,
@@ -290,7 +342,7 @@ light = {
     "pyseas.map.annotationplotprops": _annotationplotprops,
     "pyseas.map.projlabelsize": _props.dark.projection_label.size,
     "pyseas.map.colorbarlabelfont": _colorbarlabelfont,
-    "pyseas.logo": get_logo(_props.light.logo.name),
+    "pyseas.logo": _props.light.logo.name,
     "pyseas.logo.scale_adj": _props.light.logo.scale_adj,
     "pyseas.logo.alpha": _props.light.logo.alpha,
     "pyseas.miniglobe.overlaycolor": _props.light.miniglobe.overlaycolor,
@@ -315,6 +367,59 @@ for k in panel:
 del k
 
 
+class MapStyle(_Mapping):
+    """An immutable set of style parameters for a map
+
+    `pyseas.context` and `matplotlib.style.context` modify the global
+    `plt.rcParams`, so maps rendered concurrently in different threads would
+    see each other's styles. A `MapStyle` is resolved once, when it is created,
+    and then passed to `maps.create_map`, so that features added to that map
+    use it rather than `plt.rcParams`:
+
+        dark_style = styles.MapStyle(styles.dark)
+        ax = maps.create_map(style=dark_style)
+
+    Parameters
+    ----------
+    params : dict, optional
+        Parameters such as `styles.dark` or `styles.light`. These override the
+        values in `base`.
+    base : mapping, optional
+        Defaults to a copy of the current `plt.rcParams`.
+    """
+
+    def __init__(self, params=None, base=None):
+        register_fonts()
+        values = dict(_plt.rcParams if (base is None) else base)
+        values.update(params or {})
+        self._params = _MappingProxyType(values)
+
+    def __getitem__(self, key):
+        return self._params[key]
+
+    def __iter__(self):
+        return iter(self._params)
+
+    def __len__(self):
+        return len(self._params)
+
+    def __repr__(self):
+        return f"MapStyle({len(self)} parameters)"
+
+    def updated(self, params):
+        """Return a copy of this style with some parameters replaced
+
+        Parameters
+        ----------
+        params : dict
+
+        Returns
+        -------
+        MapStyle
+        """
+        return MapStyle(params, base=self)
+
+
 def set_default_logos(light_logo=None, dark_logo=None, scale_adj=1, alpha=None):
     """Set the default logos to use with add_logo
 
@@ -324,21 +429,30 @@ def set_default_logos(light_logo=None, dark_logo=None, scale_adj=1, alpha=None):
 
     Parameters
     ----------
-    light_logo, dark_logo : array, optional
-        Must be in a format that matplotlib understands.
+    light_logo, dark_logo : array or str, optional
+        Either an array in a format that matplotlib understands or a path
+        suitable for `get_logo`.
     scale_adj : float, optional
         The default image scale is multiplied by this amount.
     alpha : float or None, optional
         Set the image alpha. If not specified, the image alpha is inherited from previous
         logos.
+
+    Raises
+    ------
+    FileNotFoundError
+        If a logo is given as a local path that does not exist.
     """
+    for logo in (light_logo, dark_logo):
+        if logo is not None:
+            _check_logo(logo)
     if light_logo is not None:
-        light["pyseas.logo"] = get_logo(light_logo)
+        light["pyseas.logo"] = light_logo
         light["pyseas.logo.scale_adj"] = scale_adj
         if alpha is not None:
             light["pyseas.logo.alpha"] = alpha
     if dark_logo is not None:
-        dark["pyseas.logo"] = get_logo(dark_logo)
+        dark["pyseas.logo"] = dark_logo
         dark["pyseas.logo.scale_adj"] = scale_adj
         if alpha is not None:
             dark["pyseas.logo.alpha"] = alpha
@@ -1,3 +1,8 @@
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
 import numpy as np
 import pandas as pd
 
@@ -27,11 +32,74 @@ def lon_avg(lons):
 
 def is_sorted(values):
     """Returns True if sequence is sorted else False"""
-    is_first = True
-    for x in values:
-        if is_first:
-            is_first = False
-        elif x < last:
-            return False
-        last = x
-    return True
+    if not hasattr(values, "__len__"):
+        # Iterators and generators
+        values = list(values)
+    values = asarray(values)
+    return not (values[1:] < values[:-1]).any()
+
+
+def cache_dir(*parts):
+    """Return a directory for persistent pyseas caches, creating it if needed
+
+    The root is taken from the `PYSEAS_CACHE_DIR` environment variable if set,
+    otherwise `~/.cache/pyseas`.
+
+    Parameters
+    ----------
+    *parts : str
+        Subdirectories below the cache root.
+
+    Returns
+    -------
+    Path
+    """
+    root = os.environ.get("PYSEAS_CACHE_DIR") or Path.home() / ".cache" / "pyseas"
+    path = Path(root).joinpath(*parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+class LRUCache(object):
+    """Small thread safe dict-like cache that evicts the least recently used entries
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of entries to keep.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def __getitem__(self, key):
+        with self._lock:
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
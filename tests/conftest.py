@@ -0,0 +1,15 @@
+import pytest
+
+
+@pytest.fixture
+def offscreen_figure():
+    """Make figures drawn with Agg, without registering them with pyplot"""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    def make(figsize=(2, 1), dpi=50):
+        fig = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(fig)
+        return fig
+
+    return make
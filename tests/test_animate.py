@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cartopy")
+from PIL import Image
+
+from pyseas.maps import animate, core
+
+
+def test_animate_png_sequence(offscreen_figure, tmp_path):
+    ax = core.create_map(fig=offscreen_figure())
+    rasters = (np.full((18, 36), float(i)) for i in range(3))
+    pattern = str(tmp_path / "{:03d}.png")
+    n_frames = animate.animate(pattern, rasters, ax=ax, vmin=0, vmax=2)
+    assert n_frames == 3
+    frames = [np.asarray(Image.open(pattern.format(i))) for i in range(3)]
+    assert frames[0].shape[:2] == (50, 100)
+    assert not np.array_equal(frames[0], frames[2])
+    # Only the data layer is added to the map
+    assert len(ax.get_images()) == 1
+
+
+def test_grid_follows_writer_resize(offscreen_figure, tmp_path, monkeypatch):
+    class ResizingWriter(animate.PNGSequenceWriter):
+        # Like FFMpegWriter, which rounds the frame size to even pixels
+        def setup(self, fig, outfile, dpi=None):
+            fig.set_size_inches(2.2, 1.2)
+            super().setup(fig, outfile, dpi=dpi)
+
+    recomputed = []
+    update_A = animate.rasterize.InterpImage.update_A
+    monkeypatch.setattr(
+        animate.rasterize.InterpImage,
+        "update_A",
+        lambda self: recomputed.append(1) or update_A(self),
+    )
+    ax = core.create_map(fig=offscreen_figure())
+    rasters = (np.full((18, 36), float(i)) for i in range(3))
+    pattern = str(tmp_path / "{:03d}.png")
+    writer = ResizingWriter(fps=10)
+    assert animate.animate(pattern, rasters, ax=ax, writer=writer, vmin=0, vmax=2) == 3
+    assert Image.open(pattern.format(0)).size == (110, 60)
+    # Every frame used the precomputed grid rather than rasterizing again
+    assert not recomputed
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cartopy")
+from pyseas.maps import basemap, core
+from pyseas.util import LRUCache
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    calls = []
+
+    def render_template(ax, options):
+        calls.append(options)
+        return np.zeros([10, 10, 4], dtype=np.uint8)
+
+    monkeypatch.setattr(basemap, "render_template", render_template)
+    monkeypatch.setattr(basemap, "_templates", LRUCache(16))
+    return calls
+
+
+@pytest.fixture
+def new_map(offscreen_figure):
+    def make():
+        fig = offscreen_figure()
+        return core.create_map(projection="regional.mediterranean", fig=fig)
+
+    return make
+
+
+def test_templates_are_reused(renders, new_map):
+    first = basemap.add_basemap(ax=new_map(), countries=True)
+    second = basemap.add_basemap(ax=new_map(), countries=True)
+    assert len(renders) == 1
+    assert first.get_array() is second.get_array()
+    basemap.add_basemap(ax=new_map(), countries=False)
+    assert len(renders) == 2
+
+
+def test_set_valued_options(renders, new_map):
+    eezs = {"exclude": {"a", "b"}, "linewidth": 1}
+    basemap.add_basemap(ax=new_map(), eezs=eezs)
+    basemap.add_basemap(ax=new_map(), eezs={"linewidth": 1, "exclude": {"b", "a"}})
+    assert len(renders) == 1
+    assert renders[0]["eezs"] == eezs
+
+
+def test_gridlines_can_be_labeled(renders, new_map):
+    ax = new_map()
+    basemap.add_basemap(ax=ax, gridlines=True)
+    gl = core.map_state(ax)["gridlines"]
+    assert gl is not None and not gl.xlines and not gl.ylines
+    core.add_gridlabels(ax=ax)
+    assert len(ax.get_xticks()) > 0 and len(ax.get_yticks()) > 0
+
+
+def test_style_keys_are_stable():
+    from cycler import cycler
+
+    from pyseas import styles
+
+    # Equal styles built from distinct objects give equal keys
+    first = styles.MapStyle(styles.dark)
+    second = styles.MapStyle(
+        {
+            "pyseas.map.trackprops": cycler(color=["red", "blue"]),
+            "pyseas.land.color": "white",
+        },
+        base=first,
+    )
+    third = styles.MapStyle(
+        {
+            "pyseas.map.trackprops": cycler(color=["#ff0000", (0, 0, 1)]),
+            "pyseas.land.color": (1, 1, 1, 1),
+        },
+        base=first,
+    )
+    assert basemap._style_key(first) == basemap._style_key(styles.MapStyle(styles.dark))
+    assert basemap._style_key(second) == basemap._style_key(third)
+    assert basemap._style_key(second) != basemap._style_key(first)
+    with pytest.raises(TypeError):
+        basemap._style_key({"pyseas.land.color": bytearray(b"red")})
@@ -0,0 +1,177 @@
+import pytest
+
+pytest.importorskip("cartopy")
+import cartopy.crs as ccrs
+import shapely
+
+from pyseas.maps import features
+from pyseas.util import LRUCache
+
+
+@pytest.fixture
+def caches(monkeypatch):
+    monkeypatch.setattr(features, "_projected", LRUCache(64))
+    monkeypatch.setattr(features, "_indices", LRUCache(16))
+    monkeypatch.setattr(features, "_eezs", LRUCache(8))
+    monkeypatch.setattr(features, "_eez_indices", LRUCache(8))
+    monkeypatch.setattr(features, "use_disk_cache", False)
+
+
+def _squares():
+    # 10 degree squares along the equator
+    return [shapely.box(lon, -5, lon + 10, 5) for lon in range(-180, 180, 10)]
+
+
+def test_cached_natural_earth_feature(caches):
+    # Stand in for the Natural Earth data so nothing is downloaded
+    index = features.GeometryIndex(_squares())
+    features._indices["physical", "land", "110m"] = index
+    projection = ccrs.PlateCarree()
+    feature = features.CachedNaturalEarthFeature(
+        "physical", "land", "110m", projection
+    )
+    extent = (0, 30, -10, 10)
+    geoms = list(feature.intersecting_geometries(extent))
+    # Clipped to the extent, padded by CLIP_PADDING
+    bounds = shapely.union_all(geoms).bounds
+    assert bounds == pytest.approx((-1.5, -5, 31.5, 5))
+    # The projected geometries are cached
+    key = ("physical", "land", "110m", projection, extent)
+    assert features.projected_geometries(*key) is features.projected_geometries(*key)
+
+
+def test_geometry_index_query():
+    index = features.GeometryIndex(_squares())
+    assert index.query([]).tolist() == []
+    found = index.query([(12, -1, 18, 1), (-179, -1, -175, 1)])
+    assert sorted(found.tolist()) == [0, 19]
+    assert index.query([(0, 20, 10, 30)]).tolist() == []
+    clipped = index.clipped([(12, -1, 18, 1)])
+    assert len(clipped) == 1
+    assert clipped[0].bounds == (12, -1, 18, 1)
+
+
+def test_lonlat_boxes():
+    projection = ccrs.PlateCarree()
+    (box,) = features.lonlat_boxes(projection, (10, 20, 0, 10))
+    assert box == pytest.approx((9, -1, 21, 11))
+    # Extents crossing the dateline are split in two
+    projection = ccrs.PlateCarree(central_longitude=180)
+    boxes = features.lonlat_boxes(projection, (-10, 10, 0, 10))
+    assert len(boxes) == 2
+    assert boxes[0][2] == 180 and boxes[1][0] == -180
+    assert boxes[0][0] == pytest.approx(169)
+    assert boxes[1][2] == pytest.approx(-169)
+    # All longitudes are visible when a pole is
+    projection = ccrs.NorthPolarStereo()
+    (box,) = features.lonlat_boxes(projection, (-1e6, 1e6, -1e6, 1e6))
+    assert (box[0], box[2], box[3]) == (-180, 180, 90)
+
+
+def test_source_index_is_built_once(caches, monkeypatch):
+    import threading
+
+    built = []
+
+    class FakeNaturalEarthFeature:
+        def __init__(self, category, name, scale):
+            built.append((category, name, scale))
+
+        def geometries(self):
+            return _squares()
+
+    monkeypatch.setattr(
+        features.cfeature, "NaturalEarthFeature", FakeNaturalEarthFeature
+    )
+    threads = [
+        threading.Thread(target=features._source_index, args=("a", "b", "110m"))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert built == [("a", "b", "110m")]
+
+
+def test_projected_feature_is_abstract():
+    with pytest.raises(TypeError):
+        features._ProjectedFeature(ccrs.PlateCarree())
+
+
+def test_select_scale():
+    projection = ccrs.PlateCarree()
+    world = (-180, 180, -90, 90)
+    assert features.select_scale(projection, world, 400) == "110m"
+    assert features.select_scale(projection, world, 2000) == "50m"
+    assert features.select_scale(projection, (0, 1, 0, 1), 400) == "10m"
+    assert features.select_scale(projection, world, 0) == "10m"
+    assert features.select_scale(projection, None, 400) == "10m"
+    with pytest.raises(ValueError):
+        features.CachedNaturalEarthFeature(
+            "physical", "land", "auto", ccrs.PlateCarree()
+        )
+
+
+def test_clipped_geometries_are_valid():
+    # A U shape whose arms leave the box, so clipping splits it in two
+    shape = shapely.Polygon(
+        [(0, 0), (3, 0), (3, 8), (7, 8), (7, 0), (10, 0), (10, 10), (0, 10)]
+    )
+    index = features.GeometryIndex([shape])
+    clipped = index.clipped([(-1, -1, 11, 5)])
+    assert all(shapely.is_valid(clipped))
+    assert sum(shapely.area(clipped)) == pytest.approx(2 * 3 * 5)
+
+
+def _eez_file(tmp_path):
+    # EEZ lines at 0, 10 and 20 degrees east
+    gpd = pytest.importorskip("geopandas")
+    path = str(tmp_path / "eezs.gpkg")
+    lines = [shapely.LineString([(lon, -5), (lon, 5)]) for lon in (0, 10, 20)]
+    gpd.GeoDataFrame(
+        {"LINE_TYPE": ["Treaty", "200 NM", "Unsettled"]}, geometry=lines, crs=4326
+    ).to_file(path, driver="GPKG")
+    return path
+
+
+def test_load_eezs(caches, tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    monkeypatch.setenv("PYSEAS_CACHE_DIR", str(tmp_path / "cache"))
+    path = _eez_file(tmp_path)
+
+    eezs = features.load_eezs(path, exclude={"Unsettled"})
+    assert sorted(eezs.LINE_TYPE) == ["200 NM", "Treaty"]
+    assert list((tmp_path / "cache" / "eezs").glob("*.parquet"))
+    assert features.load_eezs(path, exclude=["Unsettled"]) is eezs
+    with pytest.raises(FileNotFoundError):
+        features.load_eezs(str(tmp_path / "missing.gpkg"))
+
+
+def test_projected_eezs_only_stat_on_miss(caches, tmp_path, monkeypatch):
+    monkeypatch.setenv("PYSEAS_CACHE_DIR", str(tmp_path / "cache"))
+    path = _eez_file(tmp_path)
+    projection = ccrs.PlateCarree()
+    first = features.projected_eezs(projection, (-5, 15, -10, 10), path)
+
+    def stat(path):
+        raise AssertionError("the EEZ file was checked on a cache hit")
+
+    monkeypatch.setattr(features, "_eez_cache_path", stat)
+    monkeypatch.setattr(features, "use_disk_cache", True)
+    assert features.projected_eezs(projection, (-5, 15, -10, 10), path) is first
+
+
+def test_eez_feature_is_subset_by_extent(caches, tmp_path, monkeypatch):
+    monkeypatch.setenv("PYSEAS_CACHE_DIR", str(tmp_path / "cache"))
+    path = _eez_file(tmp_path)
+    feature = features.CachedEEZFeature(
+        ccrs.PlateCarree(), path=path, include={"Treaty", "Unsettled"}
+    )
+    # Only the Treaty line at 0E is near the extent
+    geoms = list(feature.intersecting_geometries((-5, 15, -10, 10)))
+    assert len(geoms) == 1
+    assert geoms[0].bounds == pytest.approx((0, -5, 0, 5))
+    assert len(list(feature.geometries())) == 2
+    with pytest.raises(ValueError):
+        features.CachedEEZFeature(ccrs.PlateCarree(), path=path, simplify=True)
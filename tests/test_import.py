@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("cartopy")
+
+# Optional dependencies that should only be imported when first used
+LAZY_MODULES = ["gcsfs", "geopandas", "h3", "skimage", "pyseas.imagery.tiles"]
+
+# Generous, since CI machines vary; override to tighten locally
+IMPORT_BUDGET = float(os.environ.get("PYSEAS_IMPORT_BUDGET", "10"))
+
+SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+import pyseas.maps
+elapsed = time.perf_counter() - t0
+fonts = pyseas.styles._fonts_registered
+print(json.dumps({"elapsed": elapsed, "modules": sorted(sys.modules), "fonts": fonts}))
+"""
+
+
+@pytest.fixture(scope="module")
+def fresh_import():
+    # Import in a separate interpreter so that other tests don't interfere
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT], check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def test_optional_dependencies_are_lazy(fresh_import):
+    modules = fresh_import["modules"]
+    for name in LAZY_MODULES:
+        assert name not in modules
+
+
+def test_fonts_are_registered_on_first_use(fresh_import):
+    from pyseas import styles
+
+    assert not fresh_import["fonts"]
+    styles.MapStyle()
+    assert styles._fonts_registered
+
+
+def test_bad_logo_path_fails_early():
+    from pyseas import styles
+
+    with pytest.raises(FileNotFoundError):
+        styles.set_default_logos(light_logo="no_such_logo.png")
+
+
+def test_import_time(fresh_import):
+    assert fresh_import["elapsed"] < IMPORT_BUDGET
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cartopy")
+from pyseas.maps import overlays
+from pyseas.util import is_sorted
+
+
+def test_night_spans():
+    times = np.linspace(0, 3, 100)
+    starts, stops = overlays.night_spans(times, np.zeros_like(times), 0, 3)
+    np.testing.assert_allclose(starts, [0, 0.75, 1.75, 2.75])
+    np.testing.assert_allclose(stops, [0.25, 1.25, 2.25, 3])
+    # Night falls 6 hours earlier in UTC at 90E
+    starts, stops = overlays.night_spans(times, np.full_like(times, 90), 0, 3)
+    np.testing.assert_allclose(starts, [0.5, 1.5, 2.5])
+    # Crossing the dateline doesn't produce spurious nights
+    lon = np.where(times < 1.5, 179.0, -179.0)
+    starts, stops = overlays.night_spans(times, lon, 0, 3)
+    assert len(starts) == 3
+    assert (np.diff(starts) > 0.9).all()
+
+
+def test_is_sorted():
+    assert is_sorted([1, 2, 2, 3])
+    assert not is_sorted(np.array([1, 3, 2]))
+    assert is_sorted([])
+    assert is_sorted(x for x in [1, 2, 3])
+    assert not is_sorted(iter([2, 1]))
+
+
+def test_night_spans_without_positions():
+    starts, stops = overlays.night_spans(np.empty(0), np.empty(0), 0, 3)
+    assert len(starts) == len(stops) == 0
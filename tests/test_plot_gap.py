@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("cartopy")
+from pyseas.contrib import plot_gap
+
+
+def test_hourly_index_matches_scan():
+    times = pd.date_range("2020-01-01", "2020-01-20", freq="h")
+    hourly = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "ssvid": ssvid,
+                    "gap_id": gap_id,
+                    "date": times.normalize(),
+                    "hour": times.hour,
+                    "sat_positions": np.arange(len(times)),
+                }
+            )
+            for ssvid, gap_id in [("1", "a"), ("1", "b"), ("2", "c")]
+        ]
+    ).sample(frac=1, random_state=0)
+    gaps = pd.DataFrame(
+        {
+            "gap_id": ["a", "b", "c"],
+            "ssvid": ["1", "1", "2"],
+            "gap_start": pd.to_datetime(
+                ["2020-01-05 10:30", "2020-01-01 00:00", "2020-01-18 23:10"], utc=True
+            ),
+            "gap_end": pd.to_datetime(
+                ["2020-01-06 03:15", "2020-01-02 00:00", "2020-01-19 01:00"], utc=True
+            ),
+        }
+    )
+    index = plot_gap.HourlyIndex(hourly)
+    for gap_id in gaps.gap_id:
+        scanned = plot_gap.get_hourly_positions(gap_id, gaps, hourly)
+        indexed = plot_gap.get_hourly_positions(gap_id, gaps, index)
+        pd.testing.assert_frame_equal(scanned, indexed)
+    window = plot_gap.get_hourly_positions("a", gaps, index)
+    assert len(window) == 4 * 24 + 17 + 1
+    first = (window.date.iloc[0], window.hour.iloc[0])
+    assert first == (pd.Timestamp("2020-01-03"), 10)
+
+
+def test_empty_hourly_index():
+    hourly = pd.DataFrame(
+        {
+            "ssvid": pd.Series(dtype=str),
+            "gap_id": pd.Series(dtype=str),
+            "date": pd.Series(dtype="datetime64[ns]"),
+            "hour": pd.Series(dtype=int),
+            "sat_positions": pd.Series(dtype=int),
+        }
+    )
+    index = plot_gap.HourlyIndex(hourly)
+    window = index.window(
+        "1", "a", pd.Timestamp("2020-01-01"), pd.Timestamp("2020-01-02")
+    )
+    assert window.empty
+    assert list(window.columns) == list(hourly.columns)
+
+
+def test_plot_gaps_skips_gaps_without_data(tmp_path):
+    times = pd.date_range("2020-01-01", "2020-01-05", freq="h", tz="UTC")
+    gaps = pd.DataFrame(
+        {
+            "gap_id": ["a", "b"],
+            "ssvid": ["1", "2"],
+            "gap_start": pd.to_datetime(["2020-01-02 10:00"] * 2, utc=True),
+            "gap_end": pd.to_datetime(["2020-01-03 04:00"] * 2, utc=True),
+            "off_lon": [0.5, 0.5],
+            "off_lat": [0.5, 0.5],
+            "on_lon": [1.5, 1.5],
+            "on_lat": [1.0, 1.0],
+            "gap_hours": [18.0, 18.0],
+            "off_class": ["A", "A"],
+            "on_class": ["B", "B"],
+            "gap_implied_speed_knots": [3.0, 3.0],
+            "positions_per_day_off": [10.0, 10.0],
+            "positions_per_day_on": [12.0, 12.0],
+            "vessel_class": ["trawlers"] * 2,
+            "flag": ["ESP"] * 2,
+        }
+    )
+    # Gap 'b' has no positions
+    positions = pd.DataFrame(
+        {
+            "gap_id": "a",
+            "ssvid": "1",
+            "timestamp": times,
+            "lon": np.linspace(0, 2, len(times)),
+            "lat": np.linspace(0, 1, len(times)),
+            "receiver_type": "satellite",
+        }
+    )
+    hourly = pd.DataFrame(
+        {
+            "ssvid": "1",
+            "gap_id": "a",
+            "date": times.tz_localize(None).normalize(),
+            "hour": times.hour,
+            "sat_positions": 1,
+            "ter_positions": 0,
+        }
+    )
+    # Vessel '1' has no performance data
+    performance = pd.DataFrame({"ssvid": ["3"], "actual_class": ["A"]})
+
+    paths = plot_gap.plot_gaps(
+        ["a", "b"],
+        gaps,
+        positions,
+        hourly,
+        tmp_path,
+        performance_data=performance,
+        max_workers=1,
+    )
+    assert list(paths) == ["a"]
+    assert paths["a"] == str(tmp_path / "a.png")
+    assert (tmp_path / "a.png").stat().st_size > 0
+    assert not (tmp_path / "b.png").exists()
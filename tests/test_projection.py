@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cartopy")
+from pyseas.maps import projection
+
+
+def test_named_projections_are_interned():
+    a = projection.get_projection("regional.mediterranean")
+    b = projection.get_projection("regional.mediterranean")
+    assert a is b
+    assert a is not projection.get_projection("global.default")
+
+
+def test_found_projections_are_interned():
+    lons = np.array([10.0, 12.0, 14.0])
+    lats = np.array([40.0, 41.0, 42.0])
+    a = projection.find_projection(lons, lats)
+    b = projection.find_projection(lons.copy(), lats.copy())
+    assert a.projection is b.projection
+
+
+def _positions(n, seed=0):
+    rng = np.random.default_rng(seed)
+    # Straddle the dateline to exercise the circular mean
+    lons = (175 + 5 * rng.standard_normal(n) + 180) % 360 - 180
+    lats = 30 + 3 * rng.standard_normal(n)
+    return lons, lats
+
+
+def _assert_same_projection(a, b):
+    assert type(a) is type(b)
+    a_params, b_params = a.proj4_params, b.proj4_params
+    assert a_params.keys() == b_params.keys()
+    for key, value in a_params.items():
+        if isinstance(value, (int, float)):
+            assert value == pytest.approx(b_params[key], abs=1e-9), key
+        else:
+            assert value == b_params[key], key
+
+
+def test_streaming_matches_exact_for_small_inputs():
+    lons, lats = _positions(1000)
+    exact = projection.find_projection(lons, lats)
+    chunks = zip(*[np.array_split(x, 7) for x in (lons, lats)])
+    lon_chunks, lat_chunks = zip(*chunks)
+    approx = projection.find_projection_streaming(lon_chunks, lat_chunks)
+    assert approx.extent == pytest.approx(exact.extent)
+    assert approx.central_longitude == pytest.approx(exact.central_longitude)
+    # Running sums and a single mean can differ in the last bits
+    _assert_same_projection(approx.projection, exact.projection)
+
+
+def test_streaming_accepts_lists():
+    lons, lats = _positions(100)
+    exact = projection.find_projection(lons, lats)
+    approx = projection.find_projection_streaming(list(lons), list(lats))
+    assert approx.extent == pytest.approx(exact.extent)
+    _assert_same_projection(approx.projection, exact.projection)
+    with pytest.raises(ValueError):
+        # The same chunk lengths, but one more chunk of lats
+        projection.find_projection_streaming(
+            [lons[:50], lons[50:]], [lats[:50], lats[50:], lats[:0]]
+        )
+
+
+def test_streaming_error_is_bounded():
+    lons, lats = _positions(200_000)
+    exact = projection.find_projection(lons, lats, percentile=99)
+    rank_error = 0.005
+    approx = projection.find_projection_streaming(
+        np.array_split(lons, 20),
+        np.array_split(lats, 20),
+        percentile=99,
+        rank_error=rank_error,
+        seed=1,
+    )
+    assert projection.reservoir_size(rank_error, 0.001) < len(lons)
+    # The estimated bounds should lie between the exact bounds for a wider and
+    # a narrower percentile
+    lat1 = approx.extent[3]
+    wide = projection.find_projection(lons, lats, percentile=99.5).extent[3]
+    narrow = projection.find_projection(lons, lats, percentile=98.5).extent[3]
+    assert narrow <= lat1 <= wide
+    assert approx.central_longitude == pytest.approx(
+        exact.central_longitude, abs=0.05
+    )
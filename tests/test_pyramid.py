@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("PIL")
+from pyseas.imagery import pyramid
+
+
+def test_occupied_tiles():
+    boxes = [np.array([v]) for v in (20, 21, 10, 11)]
+    assert pyramid.occupied_tiles(*boxes, 0).tolist() == [[0, 0]]
+    assert pyramid.occupied_tiles(*boxes, 3).tolist() == [[4, 3]]
+    # A box that straddles a tile boundary
+    boxes = [np.array([v]) for v in (-1, 1, -1, 1)]
+    assert len(pyramid.occupied_tiles(*boxes, 3)) == 4
+
+
+def test_export_pyramid(tmp_path):
+    raster = np.zeros([180, 360])
+    raster[75:80, 200:205] = 5
+    n_written = pyramid.export_pyramid(
+        raster, tmp_path, 3, vmin=0, vmax=10, max_workers=1
+    )
+    paths = sorted(p.relative_to(tmp_path).as_posix() for p in tmp_path.rglob("*.png"))
+    assert n_written == len(paths) == 4
+    assert paths == ["0/0/0.png", "1/1/0.png", "2/2/1.png", "3/4/3.png"]
+    assert pyramid.export_pyramid(raster, tmp_path, 3, skip_existing=True) == 0
+    # Updating a region where the data was removed deletes its tiles
+    raster[:] = 0
+    pyramid.export_pyramid(raster, tmp_path, 3, vmin=0, vmax=10, bounds=(0, 45, 0, 45))
+    assert not list(tmp_path.rglob("*.png"))
+
+
+def test_update_pyramid_across_the_dateline(tmp_path):
+    raster = np.zeros([180, 360])
+    raster[80:85, :3] = raster[80:85, -3:] = 5
+    pyramid.export_pyramid(raster, tmp_path, 3, vmin=0, vmax=10, max_workers=1)
+    assert (tmp_path / "3/0/3.png").exists() and (tmp_path / "3/7/3.png").exists()
+    # Both sides of the dateline are updated
+    raster[:] = 0
+    pyramid.export_pyramid(
+        raster, tmp_path, 3, vmin=0, vmax=10, bounds=(170, -170, 0, 20)
+    )
+    assert not list(tmp_path.rglob("*.png"))
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cartopy")
+
+from pyseas.maps import core, rasterize
+
+
+@pytest.fixture
+def new_figure(offscreen_figure):
+    # Four maps, each showing a different random raster
+    def make():
+        fig = offscreen_figure((4, 2))
+        images = []
+        for i in range(4):
+            ax = core.create_map((2, 2, i + 1), fig=fig)
+            raster = np.random.default_rng(i).random((90, 180))
+            images.append(rasterize.raster_show(ax, raster, (-180, 180, -90, 90)))
+        return fig, images
+
+    return make
+
+
+def test_prefetch_matches_draw(new_figure):
+    fig, images = new_figure()
+    fig.canvas.draw()
+    expected = [im.get_array() for im in images]
+
+    fig, images = new_figure()
+    assert rasterize.prefetch_images(fig, max_workers=2) == 4
+    assert all(im._pending is not None for im in images)
+    fig.canvas.draw()
+    for im, A in zip(images, expected):
+        assert im._pending is None
+        np.testing.assert_array_equal(im.get_array(), A)
+    # Nothing is stale after drawing
+    assert rasterize.prefetch_images(fig) == 0
+
+
+def test_prefetch_includes_insets(new_figure):
+    fig, images = new_figure()
+    inset = fig.axes[0].inset_axes(
+        [0.6, 0.6, 0.4, 0.4], projection=fig.axes[0].projection
+    )
+    inset_image = rasterize.raster_show(
+        inset, np.ones((90, 180)), (-180, 180, -90, 90)
+    )
+    assert rasterize.prefetch_images(fig, max_workers=2) == 5
+    assert inset_image._pending is not None
+    fig.canvas.draw()
+    assert inset_image._pending is None
+    assert inset_image.get_array().shape[0] > 0
+
+
+def test_prefetch_on_injected_executor(new_figure):
+    from concurrent.futures import ThreadPoolExecutor
+
+    fig, images = new_figure()
+    fig.canvas.draw()
+    expected = [im.get_array() for im in images]
+
+    fig, images = new_figure()
+    with ThreadPoolExecutor(2) as executor:
+        assert rasterize.prefetch_images(fig, executor=executor) == 4
+        fig.canvas.draw()
+    for im, A in zip(images, expected):
+        np.testing.assert_array_equal(im.get_array(), A)
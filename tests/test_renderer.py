@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("cartopy")
+import matplotlib.pyplot as plt
+
+from pyseas.maps import core
+from pyseas.maps.renderer import MapRenderer
+
+
+def test_render_without_pyplot():
+    renderer = MapRenderer(figsize=(2, 1), dpi=50)
+    extents = [(-10, 10, -5, 5), (100, 120, 0, 10), None]
+
+    def render(extent):
+        with renderer.context(extent=extent) as ctx:
+            core.add_gridlines(ax=ctx.ax)
+            state = core.map_state(ctx.ax)
+            assert state["extent"] == extent
+            assert state["gridlines"] is not None
+            return ctx.to_array(), ctx.to_png()
+
+    n_figures = len(plt.get_fignums())
+    with ThreadPoolExecutor(3) as executor:
+        results = list(executor.map(render, extents * 2))
+    assert len(plt.get_fignums()) == n_figures
+    for array, png in results:
+        assert array.shape == (50, 100, 4)
+        assert png.startswith(b"\x89PNG")
+
+
+def test_styles_are_per_map():
+    from pyseas import styles
+
+    light, dark = styles.MapStyle(styles.light), styles.MapStyle(styles.dark)
+    renderer = MapRenderer(figsize=(2, 1), dpi=50)
+
+    def ocean_color(style):
+        with renderer.context(style=style) as ctx:
+            assert core.map_style(ctx.ax) is style
+            return tuple(ctx.to_array()[25, 50, :3])
+
+    with ThreadPoolExecutor(4) as executor:
+        colors = list(executor.map(ocean_color, [light, dark] * 4))
+    assert len(set(colors[::2])) == len(set(colors[1::2])) == 1
+    assert colors[0] != colors[1]
+    with pytest.raises(TypeError):
+        light["pyseas.ocean.color"] = "red"
+
+
+def test_track_and_shade_props_follow_map_style():
+    import numpy as np
+    from matplotlib.colors import to_rgba
+
+    from pyseas import styles
+    from pyseas.maps import overlays
+
+    light, dark = styles.MapStyle(styles.light), styles.MapStyle(styles.dark)
+    renderer = MapRenderer(figsize=(2, 1), dpi=50)
+    with renderer.context(style=light) as a, renderer.context(style=dark) as b:
+        lons, lats = np.array([0.0, 10.0]), np.array([0.0, 10.0])
+        (line_a,) = core.add_plot(lons, lats, ax=a.ax).values()
+        (line_b,) = core.add_plot(lons, lats, ax=b.ax).values()
+        assert line_a.get_color() == next(light["pyseas.map.trackprops"]())["edgecolor"]
+        assert line_b.get_color() == next(dark["pyseas.map.trackprops"]())["edgecolor"]
+
+    fig = plt.figure()
+    try:
+        ax = fig.add_subplot()
+        times = np.arange("2020-01-01", "2020-01-03", dtype="datetime64[h]")
+        ax.set_xlim(times[0], times[-1])
+        red = styles.MapStyle({"pyseas.nightshade.color": "red"}, base=light)
+        shades = overlays.add_shades(times, np.zeros(len(times)), ax=ax, style=red)
+        assert tuple(shades.get_facecolor()[0][:3]) == to_rgba("red")[:3]
+    finally:
+        plt.close(fig)
+
+
+def test_create_maps_on_given_figure(offscreen_figure):
+    fig = offscreen_figure()
+    n_figures = len(plt.get_fignums())
+    result, axes = core.create_maps(1, 2, fig=fig, extent=(-10, 10, -5, 5))
+    assert result is fig and list(fig.axes) == list(axes)
+    assert core.map_state(axes[0])["extent"] == (-10, 10, -5, 5)
+    # Not registered with pyplot, so this leaves the current figure alone
+    core.set_current_axes(axes[1])
+    assert len(plt.get_fignums()) == n_figures
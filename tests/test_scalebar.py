@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cartopy")
+import cartopy.crs as ccrs
+
+from pyseas.maps import scalebar
+
+
+def _ax(fig, projection, extent):
+    ax = fig.add_subplot(projection=projection)
+    ax.set_extent(extent, crs=ccrs.PlateCarree())
+    ax.apply_aspect()
+    return ax
+
+
+def _length(ax, start, end):
+    start_ll, end_ll = scalebar._axes_to_lonlat(ax, [start, end])
+    return scalebar._distances(start_ll, end_ll[np.newaxis])[0]
+
+
+@pytest.mark.parametrize(
+    "projection, extent, distance",
+    [
+        # High latitude, where Plate Carree is strongly stretched
+        (ccrs.PlateCarree(), (-60, 60, 70, 88), 200e3),
+        (ccrs.NorthPolarStereo(), (-180, 180, 80, 90), 300e3),
+        # Long bars, where the geodesic is far from straight on the map
+        (ccrs.PlateCarree(), (-170, 170, -80, 80), 8000e3),
+        (ccrs.Robinson(), (-170, 170, -80, 80), 10000e3),
+    ],
+)
+def test_point_along_line(offscreen_figure, projection, extent, distance):
+    ax = _ax(offscreen_figure((4, 4)), projection, extent)
+    start = np.array([0.05, 0.05])
+    end = scalebar._point_along_line(ax, start, distance, tol=0.01)
+    assert end[1] == pytest.approx(start[1])
+    assert _length(ax, start, end) == pytest.approx(distance, rel=0.01)
+
+
+def test_falls_back_to_bisection(offscreen_figure, monkeypatch):
+    monkeypatch.setattr(scalebar, "MAX_NEWTON_STEPS", 0)
+    ax = _ax(offscreen_figure((4, 4)), ccrs.PlateCarree(), (-60, 60, 70, 88))
+    start = np.array([0.05, 0.05])
+    end = scalebar._point_along_line(ax, start, 200e3, tol=0.001)
+    assert _length(ax, start, end) == pytest.approx(200e3, rel=0.001)
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cartopy")
+from pyseas.maps import ticks
+
+
+def test_first_crossings():
+    bounds = (0, 0, 10, 10)
+    t = np.linspace(-5, 15, 21)
+    lines = np.stack(
+        [
+            np.stack([np.full_like(t, 3.0), t], axis=1),  # vertical at x = 3
+            np.stack([t, 0.5 * t + 2], axis=1),  # slanted
+            np.stack([np.full_like(t, 20.0), t], axis=1),  # outside the box
+        ]
+    )
+    bottom = ticks._first_crossings(lines, "bottom", bounds)
+    assert bottom[0] == pytest.approx(3)
+    assert np.isnan(bottom[1])  # Crosses y = 0 at x = -4, outside the box
+    assert np.isnan(bottom[2])
+    left = ticks._first_crossings(lines, "left", bounds)
+    assert np.isnan(left[0])
+    assert left[1] == pytest.approx(2)
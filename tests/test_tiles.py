@@ -0,0 +1,309 @@
+import io
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+from pyseas.imagery import tiles
+
+
+class TileHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.clients.add(self.client_address)
+            fail = server.failures.get(self.path, 0)
+            if fail:
+                server.failures[self.path] = fail - 1
+        _, z, x, y = self.path.split("/")
+        headers = {}
+        if fail:
+            status, body = 503, b""
+            if server.retry_after is not None:
+                headers["Retry-After"] = str(server.retry_after)
+        elif int(x) < 0:
+            status, body = 404, b""
+        else:
+            status, body = 200, f"tile-{z}-{x}-{y}".encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def tile_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TileHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.clients = set()
+    server.failures = {}
+    server.retry_after = None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _downloader(server, **kwargs):
+    host, port = server.server_address
+    return tiles.TileDownloader(f"http://{host}:{port}/{{z}}/{{x}}/{{y}}", **kwargs)
+
+
+def test_fetch_tiles_concurrently(tile_server):
+    downloader = _downloader(tile_server, max_workers=4)
+    requested = [(x, y, 3) for x in range(-1, 4) for y in range(4)]
+    fetched = downloader.fetch_tiles(requested)
+    downloader.close()
+    assert set(fetched) == set(requested)
+    for (x, y, z), data in fetched.items():
+        if x < 0:
+            assert data is None
+        else:
+            assert data == f"tile-{z}-{x}-{y}".encode()
+    # Connections are kept alive, so there is at most one per worker
+    assert len(tile_server.clients) <= 4
+
+
+def test_close_closes_connections(tile_server):
+    downloader = _downloader(tile_server, max_workers=2)
+    downloader.fetch_tiles([(x, 0, 2) for x in range(4)])
+    downloader.fetch_tile(0, 1, 2)
+    connections = list(downloader._connections)
+    assert connections
+    downloader.close()
+    assert downloader._connections == []
+    assert all(c.sock is None for c in connections)
+
+
+def test_fetch_tile_retries(tile_server):
+    tile_server.failures["/2/1/1"] = 2
+    downloader = _downloader(tile_server, retries=2, backoff=0.01)
+    assert downloader.fetch_tile(1, 1, 2) == b"tile-2-1-1"
+    assert tile_server.requests.count("/2/1/1") == 3
+
+
+def test_retry_after_is_capped(tile_server):
+    tile_server.failures["/2/1/1"] = 1
+    tile_server.retry_after = 3600
+    downloader = _downloader(tile_server, backoff=0.01, max_backoff=0.05)
+    start = tiles.time.monotonic()
+    assert downloader.fetch_tile(1, 1, 2) == b"tile-2-1-1"
+    assert tiles.time.monotonic() - start < 10
+
+
+def test_fetch_tile_gives_up(tile_server):
+    tile_server.failures["/2/1/1"] = 5
+    downloader = _downloader(tile_server, retries=1, backoff=0.01)
+    with pytest.raises(tiles.urllib.error.HTTPError):
+        downloader.fetch_tile(1, 1, 2)
+
+
+def test_cache_serves_repeat_requests(tile_server, tmp_path):
+    cache = tiles.TileCache(tmp_path)
+    downloader = _downloader(tile_server, cache=cache)
+    requested = [(0, 0, 1), (-1, 0, 1)]
+    first = downloader.fetch_tiles(requested)
+    n_requests = len(tile_server.requests)
+    second = _downloader(tile_server, cache=cache).fetch_tiles(requested)
+    assert first == second
+    assert len(tile_server.requests) == n_requests
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = tiles.TileCache(tmp_path, max_bytes=1000)
+    keys = [("template", 0, i, 0) for i in range(6)]
+    for i, key in enumerate(keys[:4]):
+        cache.put(key, b"x" * 200)
+        os.utime(cache._path(key), (i + 1, i + 1))
+    for key in keys[4:]:
+        cache.put(key, b"x" * 200)
+    assert cache.get(keys[0]) is None
+    header, data = cache.get(keys[-1])
+    assert data == b"x" * 200
+    assert sum(x[2] for x in cache._entries()) <= 1000
+
+
+def test_cache_overwrite_replaces_size(tmp_path):
+    cache = tiles.TileCache(tmp_path, max_bytes=1000)
+    other = ("template", 0, 1, 0)
+    cache.put(other, b"x" * 200)
+    for _ in range(10):
+        cache.put(("template", 0, 0, 0), b"x" * 200)
+    assert cache._size == sum(x[2] for x in cache._entries())
+    # Rewriting one entry never pushes the cache over its limit
+    assert cache.get(other) is not None
+
+
+def _png(color):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGBA", (256, 256), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_mosaic_tiles():
+    fetched = {
+        (0, 0, 1): _png((255, 0, 0, 255)),
+        (1, 0, 1): _png((0, 255, 0, 255)),
+        (0, 1, 1): _png((0, 0, 255, 255)),
+        (1, 1, 1): None,
+    }
+    data, extent = tiles.mosaic_tiles(fetched, 0, 1, 0, 1, 1)
+    assert data.shape == (512, 512, 4)
+    assert extent[:2] == (-180, 180)
+    assert extent[2] == pytest.approx(-85.0511, abs=1e-4)
+    assert tuple(data[0, 0]) == (255, 0, 0, 255)
+    assert tuple(data[0, -1]) == (0, 255, 0, 255)
+    assert tuple(data[-1, 0]) == (0, 0, 255, 255)
+    assert tuple(data[-1, -1]) == (0, 0, 0, 0)
+    # Rows are evenly spaced in latitude, so the equator is in the middle
+    assert tuple(data[255, 0]) == (255, 0, 0, 255)
+    assert tuple(data[256, 0]) == (0, 0, 255, 255)
+
+
+def test_mosaic_tiles_respects_max_pixels():
+    # A coarse tile mixed with finer ones, as planned by download_for_display
+    fetched = {
+        (0, 0, 0): _png((255, 0, 0, 255)),
+        (2, 0, 2): _png((0, 255, 0, 255)),
+    }
+    full, extent = tiles.mosaic_tiles(fetched, 0, 3, 0, 3, 2, reproject=False)
+    assert full.shape == (1024, 1024, 4)
+    data, capped_extent = tiles.mosaic_tiles(
+        fetched, 0, 3, 0, 3, 2, reproject=False, max_pixels=300**2
+    )
+    assert data.shape == (256, 256, 4)
+    assert capped_extent == extent
+    np.testing.assert_array_equal(data, full[::4, ::4])
+
+
+def test_tile_math_is_vectorized():
+    xs = np.array([0, 1, 2, 3])
+    ys = np.array([3, 2, 1, 0])
+    lon1, lat1, lon2, lat2 = tiles.tile_edges(xs, ys, 2)
+    for i, (x, y) in enumerate(zip(xs, ys)):
+        assert [lon1[i], lat1[i], lon2[i], lat2[i]] == tiles.tile_edges(x, y, 2)
+    x, y = tiles.latlonzoom_to_xy((lat1 + lat2) / 2, (lon1 + lon2) / 2, 2)
+    assert (np.floor(x) == xs).all() and (np.floor(y) == ys).all()
+
+
+def test_tiles_covering_extent():
+    covering = tiles.tiles_covering((-10, 10, -10, 10), 3)
+    assert covering.tolist() == [[3, 3], [3, 4], [4, 3], [4, 4]]
+    # Crossing the dateline
+    covering = tiles.tiles_covering((170, -170, 1, 10), 3)
+    assert covering.tolist() == [[0, 3], [7, 3]]
+
+
+def test_tiles_covering_geometry():
+    shapely = pytest.importorskip("shapely")
+    track = shapely.LineString([(170, 1), (190, 1)])
+    covering = tiles.tiles_covering(track, 4)
+    assert covering.tolist() == [[0, 7], [15, 7]]
+    # Only tiles along the diagonal, not its whole bounding box
+    diagonal = shapely.LineString([(-170, -80), (170, 80)])
+    covering = tiles.tiles_covering(diagonal, 6)
+    assert len(covering) < 4 * 64
+
+
+def test_select_zoom():
+    assert tiles.select_zoom((0, 90, 0, 45), 200, 100) == 2
+    # Away from the equator Mercator tiles have more pixels per degree of latitude
+    assert tiles.select_zoom((0, 10, 60, 70), 10, 200) < tiles.select_zoom(
+        (0, 10, -5, 5), 10, 200
+    )
+
+
+def test_plan_tiles_mixes_zooms():
+    extent = (0, 90, 1, 45)
+    plan, zoom = tiles.plan_tiles(extent, 1)
+    assert plan == [(1, 0, 1)] and zoom == 1
+    # A sample needing zoom 3 refines only the tile containing it
+    extent = (-90, 90, 1, 45)
+    lons, lats, zooms = np.array([-80, 80]), np.array([10, 10]), np.array([1, 3])
+    plan, zoom = tiles.plan_tiles(extent, 1, lons, lats, zooms)
+    assert zoom == 3
+    assert (0, 0, 1) in plan
+    assert sorted(p for p in plan if p[2] == 3) == [
+        (x, y, 3) for x in range(4, 6) for y in range(2, 4)
+    ]
+    plan, zoom = tiles.plan_tiles(extent, 1, lons, lats, zooms, max_zoom=2)
+    assert plan == [(0, 0, 1), (2, 1, 2)] and zoom == 2
+
+
+def test_plan_tiles_across_the_dateline():
+    plan, zoom = tiles.plan_tiles((170, -170, 1, 10), 3)
+    assert plan == [(7, 3, 3), (8, 3, 3)] and zoom == 3
+    assert tiles.select_zoom((170, -170, 1, 10), 200, 100) == tiles.select_zoom(
+        (-10, 10, 1, 10), 200, 100
+    )
+
+
+def test_download_across_the_dateline(tile_server, monkeypatch):
+    def decode(data):
+        x = int(data.decode().split("-")[2])
+        return np.full([256, 256, 4], (x, 0, 0, 255), dtype=np.uint8)
+
+    monkeypatch.setattr(tiles, "decode_tile", decode)
+    downloader = _downloader(tile_server)
+    image, extent = downloader.download((170, -170, 1, 10), 3, reproject=False)
+    downloader.close()
+    assert sorted(tile_server.requests) == ["/3/0/3", "/3/7/3"]
+    # The image is contiguous, running from west to east of the dateline
+    assert extent[:2] == (135, 225)
+    assert image.shape == (256, 512, 4)
+    assert image[0, 0, 0] == 7 and image[0, -1, 0] == 0
+
+
+def test_sample_tiles_fetches_each_tile_once(tile_server, monkeypatch):
+    colors = {}
+
+    def decode(data):
+        color = colors.setdefault(data, (len(colors) + 1, 0, 0, 255))
+        return np.full([256, 256, 4], color, dtype=np.uint8)
+
+    monkeypatch.setattr(tiles, "decode_tile", decode)
+    monkeypatch.setattr(tiles, "_decoded", tiles.LRUCache(16))
+    downloader = _downloader(tile_server)
+    # Closely spaced around (0, 0), so zoom 2 is needed and 4 tiles are sampled
+    lons, lats = np.meshgrid(np.linspace(-1, 1, 8), np.linspace(-1, 1, 6))
+    image = tiles.sample_tiles(downloader, lons, lats, max_zoom=2)
+    assert image.shape == (6, 8, 4)
+    assert (image[..., 3] == 255).all()
+    assert len(colors) == 4
+    assert image[0, 0, 0] != image[0, -1, 0]
+    n_requests = len(tile_server.requests)
+    tiles.sample_tiles(downloader, lons, lats, max_zoom=2)
+    assert len(tile_server.requests) == n_requests
+
+
+def test_sample_tiles_resamples_retina_tiles(tile_server, monkeypatch):
+    # A 512 pixel tile with a different color in each quadrant
+    quadrants = np.zeros([512, 512, 4], dtype=np.uint8)
+    quadrants[:256, :256] = (255, 0, 0, 255)
+    quadrants[:256, 256:] = (0, 255, 0, 255)
+    quadrants[256:, :256] = (0, 0, 255, 255)
+    quadrants[256:, 256:] = (255, 255, 255, 255)
+    monkeypatch.setattr(tiles, "decode_tile", lambda data: quadrants)
+    monkeypatch.setattr(tiles, "_decoded", tiles.LRUCache(16))
+    downloader = _downloader(tile_server)
+    lons = np.array([[-90.0, 90.0], [-90.0, 90.0]])
+    lats = np.array([[45.0, 45.0], [-45.0, -45.0]])
+    image = tiles.sample_tiles(downloader, lons, lats, max_zoom=0)
+    assert tuple(image[0, 0]) == (255, 0, 0, 255)
+    assert tuple(image[0, 1]) == (0, 255, 0, 255)
+    assert tuple(image[1, 0]) == (0, 0, 255, 255)
+    assert tuple(image[1, 1]) == (255, 255, 255, 255)